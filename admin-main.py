@@ -1,31 +1,38 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import csv
+import io
+import json
+import os
 import pandas as pd
+import plotly.express as px
 import streamlit as st
 import bcrypt
+from datetime import timedelta
+
+from dailytask import sessions
+from dailytask.analytics import get_rollup, rates
+from dailytask.config import ROLES
+from dailytask.export import (
+    APP_MAX_DAYS as EXPORT_MAX_DAYS, FORMATS as EXPORT_FORMATS, SHEETS as EXPORT_SHEETS, export_file, parquet_available,
+)
+from dailytask.metrics import get_metrics, load_dumps, timed
+from dailytask.shifts import get_shift_date, hot_from_date
+from dailytask.sites import get_router
+from dailytask.storage import get_storage
+from dailytask.storage.base import TemplateConflict
+from dailytask.templates import diff_template, get_template_registry
 
 st.set_page_config(page_title="Daily Task Admin",layout='wide')
 
-def load_data(defined_sheet):
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    # Directly access Streamlit secrets and parse them as JSON
-    credentials_dict = st.secrets["thunder"] 
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(credentials_dict, scope)
-    client = gspread.authorize(creds)
-    sheet = client.open("dailytaskDB").worksheet(defined_sheet)
-    
-    return sheet
-
-def load_users_sheet(defined_sheet):
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    # Directly access Streamlit secrets and parse them as JSON
-    credentials_dict = st.secrets["thunder"] 
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(credentials_dict, scope)
-    client = gspread.authorize(creds)
-    sheet = client.open("dailytaskDB").worksheet(defined_sheet)
-    data = sheet.get_all_records()
-    df = pd.DataFrame(data)
-    return df
+metrics = get_metrics()
+metrics.maybe_dump("admin")
+metrics.begin_rerun("admin")
+
+# Each admin logs in against their own site's shard and can switch to, or roll up, the others
+router = get_router()
+storage = get_storage()
+
+def load_users_sheet():
+    return storage.users()
 
 
 # Session state
@@ -34,37 +41,77 @@ if 'authenticated' not in st.session_state:
 if 'user_role' not in st.session_state:
     st.session_state.user_role = None
 
-# Load Users
-users_df = load_users_sheet("Users")
+# A signed session cookie restores the login after a reload, if the admin's Users row still matches it
+token_email = sessions.restore("admin", lambda email: get_storage(router.site_for(email)).users())
+if not st.session_state.authenticated and token_email:
+    st.session_state.authenticated = True
+    st.session_state.user_role = "admin"
+    st.session_state.user_email = token_email
+    st.session_state.admin_site = router.site_for(token_email)
+if st.session_state.get("admin_site"):
+    storage = get_storage(st.session_state.admin_site)
 
 def login(email, password):
     user = users_df[users_df['Email'] == email]
     if user.empty:
         return False, None
     stored_hash = user.iloc[0]['Password'].encode('utf-8')
-    if bcrypt.checkpw(password.encode('utf-8'), stored_hash):
+    if check_password(password, stored_hash):
         return True, user.iloc[0]
     return False, None
 
+def check_password(password, stored_hash):
+    if isinstance(stored_hash, str):
+        stored_hash = stored_hash.encode()
+    with timed("bcrypt", "checkpw"):
+        try:
+            return bcrypt.checkpw(password.encode(), stored_hash)
+        except ValueError:
+            # A malformed stored hash fails the login rather than the page
+            return False
+
+def parse_user_import(text, default_role, default_status):
+    # One user per line: email[,role[,status]]; a header row starting with 'Email' is skipped
+    users, problems, seen = [], [], set()
+    for line_number, parts in enumerate(csv.reader(io.StringIO(text)), start=1):
+        parts = [p.strip() for p in parts]
+        if not parts or not parts[0]:
+            continue
+        if line_number == 1 and parts[0].lower() == "email":
+            continue
+        email = parts[0].lower()
+        role = (parts[1] if len(parts) > 1 and parts[1] else default_role).lower()
+        status = (parts[2] if len(parts) > 2 and parts[2] else default_status).lower()
+        if "@" not in email:
+            problems.append(f"line {line_number}: '{parts[0]}' is not an email")
+        elif role not in ("user", "admin"):
+            problems.append(f"line {line_number}: unknown role '{role}'")
+        elif email not in seen:
+            seen.add(email)
+            users.append((email, role, status))
+    return users, problems
+
 def logout():
     st.session_state.authenticated = False
     st.session_state.user_role = None
+    sessions.forget("admin")
 
 # --- ADMIN LOGIN LOGIC ---
 if not st.session_state.get("authenticated", False):
-    st.cache_data.clear()
-
     if "first_time_email" not in st.session_state:
         login_column_1, login_column_2, login_column_3 = st.columns(3)
         with login_column_2:
             st.title("Admin Login")
 
-            with st.form("login_form"):
+            with timed("render", "login"), st.form("login_form"):
                 email = st.text_input("Email").lower()
                 password = st.text_input("Password", type="password")
                 submitted = st.form_submit_button("Login")
 
                 if submitted:
+                    storage = get_storage(router.site_for(email))
+                    st.session_state.admin_site = storage.site
+                    users_df = load_users_sheet()
                     user_row = users_df[
                         (users_df["Email"] == email) &
                         (users_df["Role"].str.lower() == "admin") &
@@ -78,10 +125,11 @@ if not st.session_state.get("authenticated", False):
                             # First-time login detected
                             st.session_state["first_time_email"] = email
                             st.rerun()
-                        elif bcrypt.checkpw(password.encode(), stored_password.encode()):
+                        elif check_password(password, stored_password):
                             st.session_state.authenticated = True
                             st.session_state.user_role = "admin"
                             st.session_state.user_email = email
+                            sessions.remember(email, "admin", stored_password)
                             st.toast("Login successful!")
                             st.rerun()
                         else:
@@ -102,33 +150,37 @@ if not st.session_state.get("authenticated", False):
                 elif len(new_pass) < 6:
                     st.error("Password too short. Minimum 6 characters.")
                 else:
-                    hashed_pw = bcrypt.hashpw(new_pass.encode(), bcrypt.gensalt()).decode()
+                    with timed("bcrypt", "hashpw"):
+                        hashed_pw = bcrypt.hashpw(new_pass.encode(), bcrypt.gensalt()).decode()
 
                     try:
                         # Update Google Sheet
-                        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-                        # Directly access Streamlit secrets and parse them as JSON
-                        credentials_dict = st.secrets["thunder"] 
-                        creds = ServiceAccountCredentials.from_json_keyfile_dict(credentials_dict, scope)
-                        client = gspread.authorize(creds)
-                        sheet = client.open("dailytaskDB").worksheet("Users")
-
-                        user_list = sheet.get_all_records()
-                        for idx, row in enumerate(user_list, start=2):  # start at 2 to skip header
-                            if row["Email"].lower() == st.session_state["first_time_email"]:
-                                sheet.update_cell(idx, 2, hashed_pw)  # Update password (col 2)
-                                st.success("Password set successfully. Please log in again.")
-                                del st.session_state["first_time_email"]
-                                st.cache_data.clear()
-                                st.rerun()
+                        if storage.set_password(st.session_state["first_time_email"], hashed_pw):
+                            st.success("Password set successfully. Please log in again.")
+                            del st.session_state["first_time_email"]
+                            st.rerun()
                     except Exception as e:
                         st.error(f"Error updating password: {e}")
 
     st.stop()
 
+if not sessions.valid(storage.users()):
+    # Deleted, demoted, set inactive or given a new password since this session began
+    logout()
+    st.rerun()
+sessions.remember(st.session_state.user_email, "admin")
+
+if len(router.sites) > 1:
+    # Every tab below works on the chosen site's shard
+    site_choice = st.sidebar.selectbox("Site", router.sites, index=router.sites.index(storage.site), key="selected_site")
+    storage = get_storage(site_choice)
+templates = get_template_registry(storage, storage.site)
+
+# Load Users
+users_df = load_users_sheet()
 
 # Main dashboard
-st.info('Test phase for project @LCY3. Page is under active changes!. Do not share access!. Access is granted only by admin @kmicalex. Reach out to @kmicalex for feedbacks, suggestions and comments.',icon="ℹ️")
+st.info(f'Test phase for project @{storage.site}. Page is under active changes!. Do not share access!. Access is granted only by admin @kmicalex. Reach out to @kmicalex for feedbacks, suggestions and comments.',icon="ℹ️")
 column_header_1,column_header_2 = st.columns([0.9,0.1])
 with column_header_1:
     st.title("Admin Analytics Dashboard")
@@ -136,11 +188,10 @@ with column_header_2:
     # Logout option
     if st.button("Logout"):
         logout()
-        st.cache_data.clear()
         st.rerun()
 
-tab_1,tab_2,tab_3 = st.tabs(['User Summary','User Details','Task Details'])
-with tab_1:
+tab_1,tab_2,tab_3,tab_4,tab_5 = st.tabs(['User Summary','User Details','Task Details','Task History','Performance'])
+with tab_1, timed("render", "user summary"):
     st.subheader("User Summary")
     # Example analytics
     cols1,cols2,cols3,cols4 = st.columns(4)
@@ -159,8 +210,79 @@ with tab_1:
     # shift_start_counts = users_df['Start Time'].value_counts().sort_index()
     # st.line_chart(shift_start_counts)
 
+    st.subheader("Task Completion")
+    completion_sites = [storage.site]
+    if len(router.sites) > 1 and st.toggle("All sites", key="completion_all_sites"):
+        completion_sites = router.sites
+    completion_breakdowns = ["Role", "Shift date", "User"] + (["Site"] if len(completion_sites) > 1 else [])
+
+    completion_col1, completion_col2, completion_col3 = st.columns([0.2, 0.2, 0.6])
+    with completion_col1:
+        completion_start = st.date_input("From", value=get_shift_date() - timedelta(days=14), key="completion_start")
+    with completion_col2:
+        completion_end = st.date_input("To", value=get_shift_date(), key="completion_end")
+    with completion_col3:
+        completion_by = st.radio("Break down by", completion_breakdowns, horizontal=True, key="completion_by")
+
+    rollups = {code: get_rollup(code) for code in completion_sites}
+
+    def site_completion(shard):
+        # Whole history once per process, then only the shift dates still changing
+        rollups[shard.site].update(shard)
+        return rollups[shard.site].frame(completion_start, completion_end).assign(site=shard.site)
+
+    # Every site's shard at once
+    with timed("dataframe", "completion rollup"):
+        completion_frames, completion_errors = router.fan_out(site_completion, completion_sites)
+    for code, error in completion_errors.items():
+        st.warning(f"{code}: completion data unavailable ({error})")
+    completion_df = pd.concat(completion_frames.values(), ignore_index=True) if completion_frames else pd.DataFrame()
+    if completion_df.empty:
+        st.info("No tasks in this date range.")
+    else:
+        overall = rates(completion_df.assign(period="all"), ["period"]).iloc[0]
+        rate_col1, rate_col2, rate_col3, rate_col4 = st.columns(4)
+        with rate_col1:
+            st.metric(label='Done', value=f"{overall['done %']}%", border=True)
+        with rate_col2:
+            st.metric(label='Exempt', value=f"{overall['exempt %']}%", border=True)
+        with rate_col3:
+            st.metric(label='Missed', value=f"{overall['missed %']}%", border=True)
+        with rate_col4:
+            st.metric(label='Done on time', value=f"{overall['on time %']}%", border=True)
+
+        trend_df = rates(completion_df, ["task create Date", "role"])
+        trend_metric = st.selectbox("Trend", ["done %", "missed %", "exempt %", "on time %"], key="completion_trend")
+        trend_fig = px.line(
+            trend_df, x="task create Date", y=trend_metric, color="role", markers=True,
+            labels={"task create Date": "Shift date"}, title=f"{trend_metric} by shift date and role",
+        )
+        st.plotly_chart(trend_fig, use_container_width=True)
+
+        by_column = {"Role": "role", "Shift date": "task create Date", "User": "Email", "Site": "site"}[completion_by]
+        breakdown_df = rates(completion_df, [by_column])
+        breakdown_fig = px.bar(
+            breakdown_df, x=by_column, y=["done %", "exempt %", "missed %"],
+            title=f"Outcome by {completion_by.lower()}",
+        )
+        st.plotly_chart(breakdown_fig, use_container_width=True)
+        st.dataframe(breakdown_df, use_container_width=True, hide_index=True)
+
+    if st.button("Rebuild from full history", key="completion_rebuild"):
+        for rollup in rollups.values():
+            rollup.reset()
+        st.rerun()
+
+    with st.expander("Storage"):
+        st.json(storage.stats())
+        st.json({
+            "role_templates": templates.stats(),
+            "completion_rollup": {code: rollup.stats() for code, rollup in rollups.items()},
+            "sites": router.stats(),
+        })
 
-with tab_2:
+
+with tab_2, timed("render", "user details"):
     tab1,tab2,tab3 = st.tabs(['create user','Modify User','Delete Users'])
     with tab1:
         tab1_col1, tab1_col2, tab1_col3 = st.columns(3)
@@ -180,15 +302,43 @@ with tab_2:
                     else:
                         try:
                             # Add the new user to the sheet with empty password
-                            new_user = [new_email, "", new_role]
-                            sheet = load_data('Users')
-                            sheet.append_row(new_user)
+                            storage.add_user(new_email, new_role)
                             st.success(f"User {new_email} created successfully!")
                             st.rerun()
 
                         except Exception as e:
                             st.error(f"Failed to create user: {e}")
 
+        with tab1_col3:
+            st.subheader("Bulk Import")
+
+            with st.form("bulk_import_form"):
+                import_text = st.text_area("Paste users, one per line", placeholder="email,role,status\nname@site.com,user,active")
+                import_file = st.file_uploader("...or upload a CSV", type=["csv"])
+                import_role = st.selectbox("Default role", options=["user", "admin"], key="import_role")
+                import_status = st.selectbox("Default status", options=["active", "inactive"], key="import_status")
+                import_button = st.form_submit_button("Import Users")
+
+                if import_button:
+                    text = import_file.getvalue().decode("utf-8-sig") if import_file is not None else import_text
+                    new_users, problems = parse_user_import(text, import_role, import_status)
+                    for problem in problems:
+                        st.warning(problem)
+                    known = set(users_df["Email"].str.lower())
+                    skipped = [email for email, _, _ in new_users if email in known]
+                    new_users = [u for u in new_users if u[0] not in known]
+                    if skipped:
+                        st.info(f"Already in the DB, skipped: {', '.join(skipped)}")
+                    if not new_users:
+                        st.warning("No new users to import.")
+                    else:
+                        try:
+                            added = storage.add_users(new_users)
+                            st.success(f"Imported {added} users.")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Failed to import users: {e}")
+
     with tab2:
         tab2_col1, tab2_col2, tab2_col3 = st.columns(3)
 
@@ -201,13 +351,9 @@ with tab_2:
 
                 if reset_button:
                     try:
-                        sheet = load_data('Users')
-                        user_list = sheet.get_all_records()
-                        for idx, row in enumerate(user_list, start=2):  # Google Sheets rows start at 2 (1 is header)
-                            if row["Email"] == email_to_reset:
-                                sheet.update_cell(idx, 2, "")  # Reset Password (Column 2)
-                                st.success(f"Password for {email_to_reset} has been reset.")
-                                st.rerun()
+                        if storage.set_password(email_to_reset, ""):
+                            st.success(f"Password for {email_to_reset} has been reset.")
+                            st.rerun()
                     except Exception as e:
                         st.error(f"Failed to reset password: {e}")
 
@@ -221,16 +367,46 @@ with tab_2:
 
                 if update_status_button:
                     try:
-                        sheet = load_data('Users')
-                        user_list = sheet.get_all_records()
-                        for idx, row in enumerate(user_list, start=2):  # Google Sheets rows start at 2 (1 is header)
-                            if row["Email"] == email_to_update:
-                                sheet.update_cell(idx, 4, new_status)  # Assuming Status is column 3
-                                st.success(f"Status for {email_to_update} updated to {new_status}.")
-                                st.rerun()
+                        if storage.set_status(email_to_update, new_status):
+                            st.success(f"Status for {email_to_update} updated to {new_status}.")
+                            st.rerun()
                     except Exception as e:
                         st.error(f"Failed to update status: {e}")
 
+        with tab2_col3:
+            st.subheader("Bulk Changes")
+
+            with st.form("bulk_status_form"):
+                emails_to_update = st.multiselect("Users", users_df["Email"].values, key="bulk_status_users")
+                bulk_status = st.selectbox("Set status", ["active", "inactive"], key="bulk_status")
+                bulk_status_button = st.form_submit_button("Update Status")
+
+                if bulk_status_button:
+                    if not emails_to_update:
+                        st.warning("Select at least one user.")
+                    else:
+                        try:
+                            updated = storage.set_statuses(emails_to_update, bulk_status)
+                            st.success(f"Status set to {bulk_status} for {updated} users.")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Failed to update status: {e}")
+
+            with st.form("bulk_reset_form"):
+                emails_to_reset = st.multiselect("Users", users_df["Email"].values, key="bulk_reset_users")
+                bulk_reset_button = st.form_submit_button("Reset Passwords")
+
+                if bulk_reset_button:
+                    if not emails_to_reset:
+                        st.warning("Select at least one user.")
+                    else:
+                        try:
+                            reset = storage.set_passwords(emails_to_reset, "")
+                            st.success(f"Passwords reset for {reset} users.")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Failed to reset passwords: {e}")
+
 
     with tab3:
         tab3_col1, tab3_col2, tab3_col3 = st.columns(3)
@@ -243,31 +419,39 @@ with tab_2:
 
                 if delete_button:
                     try:
-                        sheet = load_data('Users')
-                        user_list = sheet.get_all_records()
-                        for idx, row in enumerate(user_list, start=2):  # Start from row 2 (after header)
-                            if row["Email"] == email_to_delete:
-                                sheet.delete_rows(idx)
-                                st.success(f"User {email_to_delete} deleted.")
-                                st.rerun()
+                        if storage.delete_user(email_to_delete):
+                            st.success(f"User {email_to_delete} deleted.")
+                            st.rerun()
                     except Exception as e:
                         st.error(f"Failed to delete user: {e}")
 
-with tab_3:
+        with tab3_col3:
+            st.subheader("Delete Several Users")
+
+            with st.form("bulk_delete_form"):
+                emails_to_delete = st.multiselect("Users", users_df["Email"].values, key="bulk_delete_users")
+                confirm_delete = st.checkbox("I understand these accounts will be removed", key="bulk_delete_confirm")
+                bulk_delete_button = st.form_submit_button("Delete Users")
+
+                if bulk_delete_button:
+                    if not emails_to_delete:
+                        st.warning("Select at least one user.")
+                    elif not confirm_delete:
+                        st.warning("Tick the confirmation box first.")
+                    else:
+                        try:
+                            deleted = storage.delete_users(emails_to_delete)
+                            st.success(f"Deleted {deleted} users.")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Failed to delete users: {e}")
+
+with tab_3, timed("render", "task details"):
     tab3_col1, tab3_col2, tab3_col3 = st.columns(3)
     with tab3_col2:
         st.subheader("View Role-Based Task Sheet")
 
-        roles = {
-            "Operations Manager Inbound Night Shift": "OM-IB-NS",
-            "Operations Manager Inbound Day Shift": "OM-IB-DS",
-            "Operations Manager Outbound Night Shift": "OM-OB-NS",
-            "Operations Manager Outbound Day Shift": "OM-OB-DS",
-            "Area Manager Inbound Night Shift": "AM-IB-NS",
-            "Area Manager Inbound Day Shift": "AM-IB-DS",
-            "Area Manager Outbound Night Shift": "AM-OB-NS",
-            "Area Manager Outbound Day Shift": "AM-OB-DS",
-        }
+        roles = ROLES
 
 
         with st.form("role_data_form"):
@@ -277,46 +461,49 @@ with tab_3:
 
         if submit:
             sheet_name = roles[selected_role_display]
-            sheet = load_data(sheet_name)
 
             if st.session_state.form_action == "Fetch":
-                data = sheet.get_all_records()
-                if not data:
+                template = templates.get(sheet_name)
+                df = template.frame
+                for problem in template.problems:
+                    st.warning(problem)
+                if df.empty:
                     st.warning("The selected sheet is currently empty.")
                 else:
-                    df = pd.DataFrame(data)
-                    st.session_state.df_original = df.copy()
-                    
                     # Keep task and time columns
-                    st.session_state.df_edited = df[["task", "time"]].copy()
+                    st.session_state.df_original = pd.DataFrame(template.rows, columns=["task", "time"])
+                    st.session_state.df_edited = st.session_state.df_original
+                    # Save checks the sheet still holds what was fetched
+                    st.session_state.template_sheet = sheet_name
+                    st.session_state.template_version = template.version
+                    # Part of the editor's key: fetching again, even the same version, drops unsaved edits
+                    st.session_state.template_fetches = st.session_state.get("template_fetches", 0) + 1
                     st.success("Data fetched. You can now edit and then choose 'Save' to store changes.")
 
 
             # Action: Save
             elif st.session_state.form_action == "Save":
                 if "df_original" in st.session_state and "df_edited" in st.session_state:
-                    original_df = st.session_state.df_original
-                    edited_df = st.session_state.df_edited
-                    updates_made = False
-
-                    for idx in range(len(edited_df)):
-                        new_task = edited_df.loc[idx, "task"]
-                        new_time = edited_df.loc[idx, "time"]
-                        old_task = original_df.loc[idx, "task"]
-                        old_time = original_df.loc[idx, "time"]
-
-                        # Update task if changed
-                        if new_task != old_task:
-                            sheet.update_cell(idx + 2, original_df.columns.get_loc("task") + 1, new_task)
-                            updates_made = True
-
-                        # Update time if changed
-                        if new_time != old_time:
-                            sheet.update_cell(idx + 2, original_df.columns.get_loc("time") + 1, new_time)
-                            updates_made = True
-
-                    if updates_made:
-                        st.success("Tasks and/or time updated successfully in the sheet.")
+                    sheet_name = st.session_state.template_sheet
+                    edit = diff_template(st.session_state.df_original, st.session_state.df_edited)
+
+                    if edit.inserted or edit.deleted or edit.modified:
+                        try:
+                            version = storage.save_role_template(
+                                sheet_name, edit.rows, st.session_state.template_version
+                            )
+                        except TemplateConflict:
+                            # Next Fetch reads the sheet again
+                            templates.refresh(sheet_name)
+                            st.error(f"{sheet_name} was saved by someone else after you fetched it. "
+                                     "Fetch it again and redo your edits.")
+                        else:
+                            templates.saved(sheet_name, edit.rows)
+                            st.session_state.df_original = pd.DataFrame(edit.rows, columns=["task", "time"])
+                            st.session_state.df_edited = st.session_state.df_original
+                            st.session_state.template_version = version
+                            st.success(f"{sheet_name} saved: {edit.inserted} added, {edit.deleted} removed, "
+                                       f"{edit.modified} changed.")
                     else:
                         st.info("No changes detected.")
                 else:
@@ -326,11 +513,133 @@ with tab_3:
         # Always show editor if data is available
         if "df_edited" in st.session_state:
             st.write("🛠️ Edit the **Task** column below. After editing, choose 'Save' and click Submit.")
+            # Always edits the fetched frame, keyed by its version and fetch so each fetch or save starts afresh
             edited_df = st.data_editor(
-                st.session_state.df_edited,
+                st.session_state.df_original,
                 num_rows="dynamic",
                 use_container_width=True,
-                key="task_editor"
+                key=(f"task_editor_{st.session_state.template_sheet}_{st.session_state.template_version}"
+                     f"_{st.session_state.get('template_fetches', 0)}"),
             )
             st.session_state.df_edited = edited_df  # Persist changes
 
+with tab_4, timed("render", "task history"):
+    st.subheader("Task History")
+    st.caption("Searches the live user-daily-task sheet and the monthly archive.")
+
+    with st.form("history_form"):
+        hist_col1, hist_col2, hist_col3, hist_col4 = st.columns(4)
+        with hist_col1:
+            history_start = st.date_input("From", value=get_shift_date() - timedelta(days=7))
+        with hist_col2:
+            history_end = st.date_input("To", value=get_shift_date())
+        with hist_col3:
+            history_email = st.selectbox("User", ["All"] + list(users_df["Email"].values))
+        with hist_col4:
+            history_role = st.selectbox("Role", ["All"] + list(ROLES.values()))
+        history_submit = st.form_submit_button("Search")
+
+    if history_submit:
+        try:
+            history_df = storage.daily_task_history(
+                start=history_start,
+                end=history_end,
+                email=None if history_email == "All" else history_email,
+                role=None if history_role == "All" else history_role,
+            )
+            st.write(f"{len(history_df)} rows")
+            st.dataframe(history_df, use_container_width=True)
+        except Exception as e:
+            st.error(f"Failed to load history: {e}")
+
+    with st.expander("Archive closed shifts"):
+        archive_before = hot_from_date()
+        st.write(f"Moves every row with a shift date before **{archive_before}** out of user-daily-task into the monthly archive.")
+        if st.button("Archive now"):
+            try:
+                moved = storage.archive_daily_tasks(archive_before)
+                st.success(f"Archived {moved} rows.")
+            except Exception as e:
+                st.error(f"Failed to archive: {e}")
+
+    with st.expander("Export"):
+        st.caption(f"Up to {EXPORT_MAX_DAYS} days at a time here. For longer ranges, "
+                   "`python -m dailytask.export --from ... --to ... -o report.csv.gz` streams the rows from a shell.")
+        export_col1, export_col2, export_col3 = st.columns(3)
+        with export_col1:
+            export_sheet = st.selectbox("Sheet", list(EXPORT_SHEETS), key="export_sheet")
+            export_format = st.selectbox("Format", EXPORT_FORMATS if parquet_available() else ["csv", "csv.gz"],
+                                         key="export_format")
+        with export_col2:
+            export_start = st.date_input("From", value=get_shift_date() - timedelta(days=30), key="export_start")
+            export_end = st.date_input("To", value=get_shift_date(), key="export_end")
+        with export_col3:
+            export_email = st.selectbox("User", ["All"] + list(users_df["Email"].values), key="export_user")
+            export_role = st.selectbox("Role", ["All"] + list(ROLES.values()), key="export_role")
+        if (export_end - export_start).days + 1 > EXPORT_MAX_DAYS:
+            # The download is served from memory; the CLI is not
+            st.warning(f"That is more than {EXPORT_MAX_DAYS} days. Choose a shorter range, or export it from a shell: "
+                       f"`python -m dailytask.export --from {export_start} --to {export_end} -o report.csv.gz`")
+        else:
+            # Read only when the button is clicked
+            st.download_button(
+                "Download export",
+                data=lambda: export_file(
+                    storage, export_format, sheet=export_sheet, start=export_start, end=export_end,
+                    user=None if export_email == "All" else export_email,
+                    role=None if export_role == "All" else export_role,
+                ),
+                file_name=f"{export_sheet}-{storage.site}-{export_start}-{export_end}.{export_format}",
+                mime="application/octet-stream",
+            )
+
+with tab_5:
+    st.subheader("Performance")
+    st.caption("Sheets calls, bcrypt checks, DataFrame builds and render sections of recent reruns. "
+               "Set DAILYTASK_METRICS_DIR on both apps to see the user app here too.")
+
+    quota = storage.stats().get("quota")
+    if quota:
+        quota_col1, quota_col2, quota_col3 = st.columns(3)
+        with quota_col1:
+            st.metric("Read quota used (last minute)", f"{quota['read']['used_last_minute']}/{quota['read']['per_minute']}", border=True)
+        with quota_col2:
+            st.metric("Write quota used (last minute)", f"{quota['write']['used_last_minute']}/{quota['write']['per_minute']}", border=True)
+        with quota_col3:
+            st.metric("Retried after 429/5xx", quota["retries"], border=True)
+
+    snapshots = {"admin (this process)": metrics.snapshot()}
+    snapshots.update({name: dump for name, dump in load_dumps().items() if dump.get("pid") != os.getpid()})
+    snapshot_name = st.selectbox("Process", list(snapshots))
+    snapshot = snapshots[snapshot_name]
+
+    operations_df = pd.DataFrame(snapshot["operations"])
+    if operations_df.empty:
+        st.info("Nothing recorded yet.")
+    else:
+        st.dataframe(operations_df.drop(columns=["buckets"]), use_container_width=True, hide_index=True)
+
+        perf_col1, perf_col2 = st.columns(2)
+        with perf_col1:
+            st.write("API calls per worksheet")
+            if snapshot["worksheet_calls"]:
+                st.bar_chart(pd.Series(snapshot["worksheet_calls"], name="calls"))
+        with perf_col2:
+            st.write("Recent reruns")
+            reruns_df = pd.DataFrame(snapshot["reruns"])
+            if not reruns_df.empty:
+                reruns_df["started"] = pd.to_datetime(reruns_df["started"], unit="s")
+                st.dataframe(reruns_df.iloc[::-1].head(50), use_container_width=True, hide_index=True)
+
+    perf_button_col1, perf_button_col2 = st.columns([0.2, 0.8])
+    with perf_button_col1:
+        st.download_button(
+            "Download JSON",
+            json.dumps(snapshot, indent=2),
+            file_name=f"dailytask-metrics-{snapshot_name.split(' ')[0]}.json",
+            mime="application/json",
+        )
+    with perf_button_col2:
+        if st.button("Reset timings"):
+            metrics.reset()
+            st.rerun()
@@ -0,0 +1,319 @@
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+import gspread
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range
+from oauth2client.service_account import ServiceAccountCredentials
+
+from dailytask.config import ROLES
+from dailytask.storage.base import DAILY_TASK_COLUMNS, USER_TASK_COLUMNS, USERS_COLUMNS
+
+
+class _Response:
+    def __init__(self, code, message):
+        self.status_code = code
+        self.text = message
+        self._body = {"error": {"code": code, "message": message, "status": "RESOURCE_EXHAUSTED"}}
+
+    def json(self):
+        return self._body
+
+
+class CallRecorder:
+    """Counts API calls per method and worksheet, sleeps for latency and injects 429s."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.errors = 0
+
+    def __call__(self, method, worksheet=None):
+        with self._lock:
+            self.calls[(method, worksheet)] += 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise APIError(_Response(429, "Quota exceeded for quota metric 'Read requests'"))
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors = 0
+
+    def total(self):
+        return sum(self.calls.values())
+
+    def by_method(self):
+        counts = Counter()
+        for (method, _), n in self.calls.items():
+            counts[method] += n
+        return dict(counts)
+
+    def by_worksheet(self):
+        counts = Counter()
+        for (_, worksheet), n in self.calls.items():
+            counts[worksheet or "-"] += n
+        return dict(counts)
+
+
+def _cell(value):
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    return "" if value is None else str(value)
+
+
+def _numericise(value):
+    # What get_all_records does to numeric-looking strings
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, sheet_id, rows):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.rows = [list(map(_cell, r)) for r in rows]
+        self._lock = threading.RLock()
+
+    def _record(self, method):
+        self.spreadsheet.recorder(method, self.title)
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def _ensure(self, row, col):
+        while len(self.rows) < row:
+            self.rows.append([])
+        r = self.rows[row - 1]
+        while len(r) < col:
+            r.append("")
+
+    def _set(self, row, col, value):
+        self._ensure(row, col)
+        self.rows[row - 1][col - 1] = _cell(value)
+
+    def _write_range(self, range_name, values):
+        grid = a1_range_to_grid_range(range_name.split("!")[-1])
+        start_row = grid.get("startRowIndex", 0) + 1
+        start_col = grid.get("startColumnIndex", 0) + 1
+        for r, row_values in enumerate(values):
+            for c, value in enumerate(row_values):
+                self._set(start_row + r, start_col + c, value)
+
+    # --- reads ---
+    def get_all_values(self, *args, **kwargs):
+        self._record("get_all_values")
+        with self._lock:
+            width = max((len(r) for r in self.rows), default=0)
+            return [r + [""] * (width - len(r)) for r in self.rows]
+
+    def get_all_records(self, *args, **kwargs):
+        self._record("get_all_records")
+        with self._lock:
+            if not self.rows:
+                return []
+            header = self.rows[0]
+            return [
+                {h: _numericise(r[i]) if i < len(r) else "" for i, h in enumerate(header)}
+                for r in self.rows[1:]
+            ]
+
+    def col_values(self, col, *args, **kwargs):
+        self._record("col_values")
+        with self._lock:
+            values = [r[col - 1] if len(r) >= col else "" for r in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def get(self, range_name=None, *args, **kwargs):
+        self._record("get")
+        with self._lock:
+            grid = a1_range_to_grid_range(range_name.split("!")[-1])
+            start = grid.get("startRowIndex", 0)
+            end = grid.get("endRowIndex", len(self.rows))
+            col_start = grid.get("startColumnIndex", 0)
+            col_end = grid.get("endColumnIndex")
+            return [list(r[col_start:col_end]) for r in self.rows[start:end]]
+
+    # --- writes ---
+    def append_row(self, values, *args, **kwargs):
+        return self.append_rows([values], *args, **kwargs)
+
+    def append_rows(self, values, *args, **kwargs):
+        self._record("append_rows")
+        with self._lock:
+            start = len(self.rows) + 1
+            self.rows.extend([list(map(_cell, r)) for r in values])
+            end = len(self.rows)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:Z{end}", "updatedRows": len(values)}}
+
+    def update(self, range_name=None, values=None, *args, **kwargs):
+        self._record("update")
+        with self._lock:
+            self._write_range(range_name, values)
+        return {"updatedRange": range_name}
+
+    def update_cell(self, row, col, value):
+        self._record("update_cell")
+        with self._lock:
+            self._set(row, col, value)
+        return {}
+
+    def batch_update(self, data, *args, **kwargs):
+        self._record("batch_update")
+        with self._lock:
+            for item in data:
+                self._write_range(item["range"], item["values"])
+        return {"totalUpdatedCells": sum(len(v) for item in data for v in item["values"])}
+
+    def delete_rows(self, start_index, end_index=None):
+        self._record("delete_rows")
+        with self._lock:
+            del self.rows[start_index - 1:(end_index or start_index)]
+        return {}
+
+    def clear(self):
+        self._record("clear")
+        with self._lock:
+            self.rows = []
+
+
+class FakeSpreadsheet:
+    def __init__(self, title, recorder):
+        self.title = title
+        self.id = "fake-" + title
+        self.recorder = recorder
+        self._sheets = {}
+        self._next_id = 1
+
+    def seed(self, title, rows):
+        ws = FakeWorksheet(self, title, self._next_id, rows)
+        self._next_id += 1
+        self._sheets[title] = ws
+        return ws
+
+    def worksheets(self, *args, **kwargs):
+        self.recorder("fetch_sheet_metadata")
+        return list(self._sheets.values())
+
+    def worksheet(self, title):
+        self.recorder("fetch_sheet_metadata")
+        if title not in self._sheets:
+            raise WorksheetNotFound(title)
+        return self._sheets[title]
+
+    def add_worksheet(self, title, rows=1, cols=1, *args, **kwargs):
+        self.recorder("add_worksheet")
+        return self.seed(title, [])
+
+    def values_batch_get(self, ranges, *args, **kwargs):
+        self.recorder("values_batch_get")
+        value_ranges = []
+        for range_name in ranges:
+            title, _, cells = range_name.rpartition("!") if "!" in range_name else (range_name, "", "")
+            ws = self._sheets[title.strip("'")]
+            with ws._lock:
+                if cells:
+                    grid = a1_range_to_grid_range(cells)
+                    rows = ws.rows[grid.get("startRowIndex", 0):grid.get("endRowIndex", len(ws.rows))]
+                    col_start, col_end = grid.get("startColumnIndex", 0), grid.get("endColumnIndex")
+                    values = [list(r[col_start:col_end]) for r in rows]
+                else:
+                    values = [list(r) for r in ws.rows]
+            value_ranges.append({"range": range_name, "values": values})
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def batch_update(self, body):
+        self.recorder("spreadsheet_batch_update")
+        by_id = {ws.id: ws for ws in self._sheets.values()}
+        for request in body.get("requests", []):
+            delete = request.get("deleteDimension")
+            if delete and delete["range"]["dimension"] == "ROWS":
+                ws = by_id[delete["range"]["sheetId"]]
+                with ws._lock:
+                    del ws.rows[delete["range"]["startIndex"]:delete["range"]["endIndex"]]
+        return {}
+
+
+class FakeClient:
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open(self, title, *args, **kwargs):
+        self.spreadsheet.recorder("open")
+        return self.spreadsheet
+
+    def open_by_key(self, key):
+        self.spreadsheet.recorder("open_by_key")
+        return self.spreadsheet
+
+
+def template_rows(tasks_per_role=12):
+    # Tasks spread over the day so some are always still open
+    times = []
+    for i in range(tasks_per_role):
+        hour = (7 + i * 24 // tasks_per_role) % 24
+        times.append(f"{(hour % 12) or 12}.{(i * 7) % 60:02d}{'AM' if hour < 12 else 'PM'}")
+    return [["task", "time"]] + [[f"Task {i + 1}", t] for i, t in enumerate(times)]
+
+
+def seed_spreadsheet(recorder, users=20, days=30, tasks_per_role=12, today=None, password_hash=""):
+    """A dailytaskDB with `users` managers, one admin and `days` days of user-daily-task history."""
+    from dailytask.shifts import get_shift_date
+
+    today = today or get_shift_date()
+    book = FakeSpreadsheet("dailytaskDB", recorder)
+    role_codes = list(ROLES.values())
+    templates = {code: template_rows(tasks_per_role) for code in role_codes}
+
+    user_rows = [USERS_COLUMNS, ["admin@site.com", password_hash, "admin", "active"]]
+    user_task_rows = [USER_TASK_COLUMNS]
+    daily_rows = [DAILY_TASK_COLUMNS]
+    for u in range(users):
+        email = f"manager{u}@site.com"
+        login = f"manager{u}"
+        user_rows.append([email, password_hash, "user", "active"])
+        user_task_rows.append([login, str(today)] + [""] + [f"todo {n}" for n in range(1, 17)] + [""] * 16)
+        role = role_codes[u % len(role_codes)]
+        for d in range(days, 0, -1):
+            shift_date = today - timedelta(days=d)
+            for task, due in templates[role][1:]:
+                daily_rows.append([
+                    email, login.capitalize(), str(shift_date), f"{shift_date} 12:00:00", role, task,
+                    d % 3 != 0, False, "", True, d % 3 == 0, due,
+                ])
+
+    book.seed("Users", user_rows)
+    book.seed("user-task", user_task_rows)
+    book.seed("user-daily-task", daily_rows)
+    for code, rows in templates.items():
+        book.seed(code, rows)
+    return book
+
+
+@contextmanager
+def patched_gspread(spreadsheet):
+    """Route gspread.authorize to the fake spreadsheet for the duration of the block."""
+    with mock.patch.object(gspread, "authorize", lambda *args, **kwargs: FakeClient(spreadsheet)), \
+            mock.patch.object(ServiceAccountCredentials, "from_json_keyfile_dict", lambda *args, **kwargs: object()):
+        yield spreadsheet
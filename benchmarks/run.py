@@ -0,0 +1,169 @@
+"""Drive user-main.py and admin-main.py through Streamlit's AppTest against a fake dailytaskDB.
+
+    python -m benchmarks.run --users 60 --days 90 --latency-ms 150 --json bench.json
+
+Reports wall time and Sheets API calls per scenario; no service account needed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The background sweeper would add its own calls to every scenario
+os.environ.setdefault("DAILYTASK_SWEEP_SECONDS", "0")
+# Journaled saves would reach the fake sheet after their scenario, in whichever one runs next
+os.environ.setdefault("DAILYTASK_JOURNAL_DIR", "")
+
+import bcrypt  # noqa: E402
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from benchmarks.fake_gspread import CallRecorder, patched_gspread, seed_spreadsheet  # noqa: E402
+
+USER_APP = os.path.join(ROOT, "user-main.py")
+ADMIN_APP = os.path.join(ROOT, "admin-main.py")
+PASSWORD = "benchmark"
+
+
+def _app(path, timeout):
+    at = AppTest.from_file(path, default_timeout=timeout)
+    at.secrets["thunder"] = {"type": "service_account"}
+    return at
+
+
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def _checkbox(at, label):
+    return next((c for c in at.checkbox if c.label == label), None)
+
+
+class Runner:
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.results = []
+
+    def measure(self, name, action):
+        self.recorder.reset()
+        start = time.perf_counter()
+        at = action()
+        elapsed = time.perf_counter() - start
+        failed = bool(at.exception) if at is not None else False
+        self.results.append({
+            "scenario": name,
+            "wall_ms": round(elapsed * 1000, 1),
+            "api_calls": self.recorder.total(),
+            "errors_injected": self.recorder.errors,
+            "by_method": self.recorder.by_method(),
+            "by_worksheet": self.recorder.by_worksheet(),
+            "failed": failed,
+        })
+        return at
+
+
+def run_user_scenarios(runner, timeout, email):
+    at = _app(USER_APP, timeout)
+    runner.measure("user: login page", lambda: at.run())
+
+    def login():
+        at.text_input[0].input(email)
+        at.text_input[1].input(PASSWORD)
+        return _button(at, "Login as User").click().run()
+    runner.measure("user: login", login)
+
+    def pick_role():
+        at.selectbox(key="selected_temp_role_form").select("Operations Manager Inbound Day Shift")
+        return _button(at, "✅ Confirm Role").click().run()
+    runner.measure("user: first dashboard (role pick + task instantiation)", pick_role)
+
+    runner.measure("user: dashboard rerun", lambda: at.run())
+
+    def eisenhower():
+        at.text_input(key="ab").input("benchmark task")
+        return _button(at, "Update Task").click().run()
+    runner.measure("user: eisenhower submit", eisenhower)
+
+    done = _checkbox(at, "Done")
+    if done is not None:
+        done.check().run()
+
+        def save():
+            return _button(at, "Save").click().run()
+        runner.measure("user: task save", save)
+    return at
+
+
+def run_admin_scenarios(runner, timeout):
+    at = _app(ADMIN_APP, timeout)
+    runner.measure("admin: login page", lambda: at.run())
+
+    def login():
+        at.text_input[0].input("admin@site.com")
+        at.text_input[1].input(PASSWORD)
+        return _button(at, "Login").click().run()
+    runner.measure("admin: login", login)
+
+    runner.measure("admin: dashboard rerun", lambda: at.run())
+
+    def fetch():
+        at.radio(key="form_action").set_value("Fetch")
+        return _button(at, "Submit").click().run()
+    runner.measure("admin: template fetch", fetch)
+
+    def save():
+        edited = at.session_state["df_edited"].copy()
+        edited["task"] = edited["task"].astype(str) + " (edited)"
+        at.session_state["df_edited"] = edited
+        at.radio(key="form_action").set_value("Save")
+        return _button(at, "Submit").click().run()
+    runner.measure("admin: template save (every row changed)", save)
+    return at
+
+
+def print_table(results):
+    width = max(len(r["scenario"]) for r in results)
+    print(f"{'scenario':<{width}}  {'wall ms':>9}  {'calls':>5}  breakdown")
+    for r in results:
+        breakdown = ", ".join(f"{m}={n}" for m, n in sorted(r["by_method"].items()))
+        flag = "  FAILED" if r["failed"] else ""
+        print(f"{r['scenario']:<{width}}  {r['wall_ms']:>9.1f}  {r['api_calls']:>5}  {breakdown}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of both apps against a fake Google Sheets backend.")
+    parser.add_argument("--users", type=int, default=20, help="managers seeded in Users")
+    parser.add_argument("--days", type=int, default=30, help="days of user-daily-task history per manager")
+    parser.add_argument("--tasks-per-role", type=int, default=12)
+    parser.add_argument("--latency-ms", type=float, default=0, help="simulated latency per API call")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of API calls answered with a 429")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--timeout", type=float, default=120, help="AppTest timeout per rerun, seconds")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    recorder = CallRecorder(latency=args.latency_ms / 1000, error_rate=args.error_rate)
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(args.bcrypt_rounds)).decode()
+    book = seed_spreadsheet(recorder, args.users, args.days, args.tasks_per_role, password_hash=password_hash)
+    print(f"Seeded {args.users} users, {book._sheets['user-daily-task'].row_count - 1} user-daily-task rows")
+
+    runner = Runner(recorder)
+    with patched_gspread(book):
+        st.cache_resource.clear()
+        run_user_scenarios(runner, args.timeout, "manager0@site.com")
+        # The admin app runs in its own process in production
+        st.cache_resource.clear()
+        run_admin_scenarios(runner, args.timeout)
+
+    print_table(runner.results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": runner.results}, f, indent=2)
+    return runner.results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+import streamlit as st
+
+from dailytask.config import TIMEZONE
+from dailytask.scheduling import NIGHT_ROLLOVER_MINUTES
+from dailytask.schema import date_strings
+from dailytask.shifts import hot_from_date
+
+COUNTS = ["total", "done", "exempt", "missed", "open", "on_time"]
+GROUP_COLUMNS = ["task create Date", "role", "Email"]
+
+
+def contributions(df):
+    """Per task row: its natural key, its (date, role, email) group and its counts as a tuple.
+
+    Expects a typed user-daily-task frame (dailytask.schema).
+    """
+    if df.empty:
+        return []
+    done = df["done"].to_numpy()
+    exempt = df["exempt"].to_numpy() & ~done
+    locked = df["locked"].to_numpy()
+    missed = locked & ~done & ~exempt
+    open_ = ~locked & ~done & ~exempt
+
+    # On time: marked done no later than its due time on the shift's calendar
+    minutes = df["due minutes"].astype("float64").to_numpy()
+    night = df["role"].astype(str).str.contains("NS").to_numpy()
+    offset = np.where(night & (minutes < NIGHT_ROLLOVER_MINUTES), 1, 0)
+    shift_day = df["task create Date"]
+    due_at = shift_day + pd.to_timedelta(offset, unit="D") + pd.to_timedelta(minutes, unit="m")
+    on_time = done & (df["task closed Date"] <= due_at).to_numpy()
+
+    emails = df["Email"].astype(str).tolist()
+    dates = date_strings(df["task create Date"]).tolist()
+    roles = df["role"].astype(str).tolist()
+    tasks = df["task"].astype(str).tolist()
+    seen = {}
+    result = []
+    for i in range(len(df)):
+        # The same task twice in one template is told apart by its occurrence
+        task_key = (emails[i], dates[i], roles[i], tasks[i])
+        occurrence = seen.get(task_key, 0)
+        seen[task_key] = occurrence + 1
+        counts = (1, int(done[i]), int(exempt[i]), int(missed[i]), int(open_[i]), int(on_time[i]))
+        result.append((task_key + (occurrence,), (dates[i], roles[i], emails[i]), counts))
+    return result
+
+
+class CompletionRollup:
+    """Done/exempt/missed/on-time counts per shift date, role and user, folded in row by row.
+
+    Each task row is remembered by its natural key with what it last
+    contributed, so folding a frame again only touches rows that changed.
+    Rows that leave the hot sheet (archived) keep their contribution.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Held across a whole update: the first sessions after a start wait for one seed instead of
+        # each reading the full history, and a reset cannot land between a fold and `seeded`
+        self._update_lock = threading.Lock()
+        self._groups = {}   # (date, role, email) -> [total, done, exempt, missed, open, on_time]
+        self._rows = {}     # natural key -> (group, counts)
+        self.seeded = False
+        self.folded_rows = 0
+        self.changed_rows = 0
+
+    def fold(self, df):
+        changed = 0
+        with self._lock:
+            for key, group, counts in contributions(df):
+                previous = self._rows.get(key)
+                if previous == (group, counts):
+                    continue
+                if previous is not None:
+                    old = self._groups[previous[0]]
+                    for i, n in enumerate(previous[1]):
+                        old[i] -= n
+                totals = self._groups.setdefault(group, [0] * len(COUNTS))
+                for i, n in enumerate(counts):
+                    totals[i] += n
+                self._rows[key] = (group, counts)
+                changed += 1
+            self.folded_rows += len(df)
+            self.changed_rows += changed
+        return changed
+
+    def update(self, storage, today=None):
+        # First call folds the whole history once; later calls only the shift dates still changing
+        with self._update_lock:
+            if not self.seeded:
+                self.fold(storage.daily_task_history())
+                self.seeded = True
+                return
+            today = today or datetime.now(pytz.timezone(TIMEZONE)).date()
+            start = hot_from_date(today)
+            self.fold(storage.daily_tasks_on([start + timedelta(days=n) for n in range((today - start).days + 1)]))
+
+    def reset(self):
+        with self._update_lock, self._lock:
+            self._groups, self._rows = {}, {}
+            self.seeded = False
+
+    def frame(self, start=None, end=None):
+        with self._lock:
+            records = [group + tuple(counts) for group, counts in self._groups.items() if counts[0]]
+        df = pd.DataFrame(records, columns=GROUP_COLUMNS + COUNTS)
+        if start:
+            df = df[df["task create Date"] >= str(start)]
+        if end:
+            df = df[df["task create Date"] <= str(end)]
+        return df
+
+    def stats(self):
+        with self._lock:
+            return {
+                "groups": len(self._groups),
+                "rows": len(self._rows),
+                "folded_rows": self.folded_rows,
+                "changed_rows": self.changed_rows,
+            }
+
+
+def rates(df, by):
+    """Sum the counts by `by` and add done/exempt/missed rates and the on-time share of done tasks, in %."""
+    if df.empty:
+        return pd.DataFrame(columns=list(by) + COUNTS + ["done %", "exempt %", "missed %", "on time %"])
+    summary = df.groupby(list(by), as_index=False)[COUNTS].sum()
+    total = summary["total"].where(summary["total"] > 0)
+    summary["done %"] = (100 * summary["done"] / total).round(1)
+    summary["exempt %"] = (100 * summary["exempt"] / total).round(1)
+    summary["missed %"] = (100 * summary["missed"] / total).round(1)
+    summary["on time %"] = (100 * summary["on_time"] / summary["done"].where(summary["done"] > 0)).round(1)
+    return summary
+
+
+@st.cache_resource(show_spinner=False)
+def get_rollup(site=None):
+    return CompletionRollup()
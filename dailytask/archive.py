@@ -0,0 +1,209 @@
+import argparse
+import csv
+import gzip
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import rowcol_to_a1
+
+from dailytask.shifts import hot_from_date
+
+DATE_COLUMN = "task create Date"
+PARTITION_PREFIX = "user-daily-task "
+# Set to archive into gzip files in this directory instead of monthly worksheets
+ARCHIVE_DIR_ENV = "DAILYTASK_ARCHIVE_DIR"
+
+
+def archivable(cell, before):
+    # Only well-formed shift dates move; a malformed one stays in the hot sheet, where it can be seen
+    try:
+        datetime.strptime(str(cell), "%Y-%m-%d")
+    except ValueError:
+        return False
+    return str(cell) < str(before)
+
+
+def month_of(date_str):
+    # '2024-05-17' -> '2024-05'
+    return str(date_str)[:7]
+
+
+def _months_between(months, start=None, end=None):
+    start_month = month_of(start) if start else None
+    end_month = month_of(end) if end else None
+    return [
+        m for m in sorted(months)
+        if (start_month is None or m >= start_month) and (end_month is None or m <= end_month)
+    ]
+
+
+def _group_by_month(header, rows):
+    date_col = header.index(DATE_COLUMN)
+    partitions = {}
+    for row in rows:
+        partitions.setdefault(month_of(row[date_col]), []).append(row)
+    return partitions
+
+
+def worksheet_chunks(worksheet, chunk_rows):
+    """The worksheet as string frames of at most `chunk_rows` rows, one row-range read each."""
+    header = (worksheet.get("1:1") or [[]])[0]
+    if not header:
+        return
+    width = len(header)
+    last_col = rowcol_to_a1(1, width).rstrip("0123456789")
+    first = 2
+    while True:
+        rows = worksheet.get(f"A{first}:{last_col}{first + chunk_rows - 1}")
+        if rows:
+            yield pd.DataFrame([row[:width] + [""] * (width - len(row)) for row in rows], columns=header)
+        if len(rows) < chunk_rows:
+            return
+        first += chunk_rows
+
+
+def filter_history(df, start=None, end=None, email=None, role=None):
+    # Archived partitions come as strings, hot frames typed: dates compare as datetimes either way
+    if df.empty:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if start or end:
+        dates = df[DATE_COLUMN]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates.astype(str), format="%Y-%m-%d", errors="coerce")
+        if start:
+            mask &= dates >= pd.Timestamp(start)
+        if end:
+            mask &= dates <= pd.Timestamp(end)
+    if email:
+        mask &= df["Email"] == email
+    if role:
+        mask &= df["role"] == role
+    return df[mask]
+
+
+class _MonthlyArchive:
+    def months(self):
+        raise NotImplementedError
+
+    def read_month(self, month):
+        raise NotImplementedError
+
+    def read(self, start=None, end=None, email=None, role=None):
+        # Only the partitions overlapping [start, end] are opened
+        frames = [
+            filter_history(self.read_month(month), start, end, email, role)
+            for month in _months_between(self.months(), start, end)
+        ]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def month_chunks(self, month, chunk_rows):
+        raise NotImplementedError
+
+    def iter_chunks(self, start=None, end=None, chunk_rows=5000):
+        # The partitions overlapping [start, end], a chunk at a time and oldest first
+        for month in _months_between(self.months(), start, end):
+            yield from self.month_chunks(month, chunk_rows)
+
+
+class LocalArchive(_MonthlyArchive):
+    """One gzip CSV per month: <directory>/user-daily-task-YYYY-MM.csv.gz."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, month):
+        return os.path.join(self.directory, f"user-daily-task-{month}.csv.gz")
+
+    def months(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[len("user-daily-task-"):-len(".csv.gz")]
+            for name in os.listdir(self.directory)
+            if name.startswith("user-daily-task-") and name.endswith(".csv.gz")
+        )
+
+    def append(self, header, rows):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            for month, month_rows in _group_by_month(header, rows).items():
+                path = self._path(month)
+                new_file = not os.path.exists(path)
+                # Appending a gzip member keeps the file readable as one stream
+                with gzip.open(path, "at", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(header)
+                    writer.writerows(month_rows)
+        return len(rows)
+
+    def read_month(self, month):
+        return pd.read_csv(self._path(month), dtype=str, keep_default_na=False)
+
+    def month_chunks(self, month, chunk_rows):
+        with pd.read_csv(self._path(month), dtype=str, keep_default_na=False, chunksize=chunk_rows) as reader:
+            yield from reader
+
+
+class SheetArchive(_MonthlyArchive):
+    """One worksheet per month in the same spreadsheet: 'user-daily-task YYYY-MM'."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def months(self):
+        return sorted(
+            ws.title[len(PARTITION_PREFIX):]
+            for ws in self.pool.spreadsheet.worksheets()
+            if ws.title.startswith(PARTITION_PREFIX)
+        )
+
+    def _partition(self, month, header):
+        title = PARTITION_PREFIX + month
+        try:
+            return self.pool.worksheet(title)
+        except WorksheetNotFound:
+            ws = self.pool.spreadsheet.add_worksheet(title=title, rows=1, cols=len(header))
+            ws.update(range_name="A1", values=[header])
+            self.pool.forget(title)
+            return ws
+
+    def append(self, header, rows):
+        for month, month_rows in _group_by_month(header, rows).items():
+            self._partition(month, header).append_rows(month_rows)
+        return len(rows)
+
+    def read_month(self, month):
+        values = self.pool.worksheet(PARTITION_PREFIX + month).get_all_values()
+        return pd.DataFrame(values[1:], columns=values[0]) if values else pd.DataFrame()
+
+    def month_chunks(self, month, chunk_rows):
+        return worksheet_chunks(self.pool.worksheet(PARTITION_PREFIX + month), chunk_rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Move closed shift dates out of user-daily-task into monthly archive partitions. "
+                    "Run it between shifts: archived rows are deleted from the hot worksheet."
+    )
+    parser.add_argument("--before", help="archive shift dates before this YYYY-MM-DD "
+                                         "(default: keep the current and previous shift dates)")
+    parser.add_argument("--site", action="append", help="site code to archive, repeatable (default: every site)")
+    args = parser.parse_args(argv)
+
+    from dailytask.sites import site_codes
+    from dailytask.storage import create_storage
+
+    before = args.before or str(hot_from_date())
+    for code in site_codes(args.site):
+        moved = create_storage(site=code).archive_daily_tasks(before)
+        print(f"{code}: archived {moved} rows with shift date before {before}.")
+
+
+if __name__ == "__main__":
+    main()
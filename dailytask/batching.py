@@ -0,0 +1,125 @@
+import threading
+import time
+
+import streamlit as st
+from gspread.utils import ValueInputOption, rowcol_to_a1
+
+# How long the first writer waits for other sessions' edits to the same worksheet
+COALESCE_WINDOW = 0.2
+
+
+class WriteBatch:
+    """Collects cell and range edits for one worksheet and sends them as one batch_update.
+
+    Values go in RAW by default, as typed: free text such as an exempt
+    reason never becomes a formula or a date. Pass user_entered for a
+    batch that wants the sheet to parse what it writes.
+    """
+
+    def __init__(self, worksheet, value_input_option=ValueInputOption.raw):
+        self.worksheet = worksheet
+        self.value_input_option = value_input_option
+        self._cells = {}     # (row, col) -> value, later edits win
+        self._ranges = []    # {"range": a1, "values": [[...]]}
+
+    def update_cell(self, row, col, value):
+        self._cells[(row, col)] = value
+        return self
+
+    def update(self, range_name, values):
+        self._ranges.append({"range": range_name, "values": values})
+        return self
+
+    def __len__(self):
+        return len(self._cells) + len(self._ranges)
+
+    def data(self):
+        # Neighbouring cells in a row go out as a single range
+        data = list(self._ranges)
+        run = []
+        for row, col in sorted(self._cells):
+            if run and (row != run[0][0] or col != run[-1][1] + 1):
+                data.append(self._run_range(run))
+                run = []
+            run.append((row, col))
+        if run:
+            data.append(self._run_range(run))
+        return data
+
+    def _run_range(self, run):
+        start, end = rowcol_to_a1(*run[0]), rowcol_to_a1(*run[-1])
+        return {
+            "range": start if start == end else f"{start}:{end}",
+            "values": [[self._cells[cell] for cell in run]],
+        }
+
+    def flush(self, coalescer=None):
+        if not len(self):
+            return None
+        data = self.data()
+        self._cells, self._ranges = {}, []
+        if coalescer is not None:
+            return coalescer.submit(self.worksheet, data, self.value_input_option)
+        return self.worksheet.batch_update(data, value_input_option=self.value_input_option)
+
+
+class _Pending:
+    def __init__(self, worksheet, value_input_option):
+        self.worksheet = worksheet
+        self.value_input_option = value_input_option
+        self.data = []
+        self.sessions = 0
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class WriteCoalescer:
+    """Merges batches from several sessions that hit the same worksheet within a short window."""
+
+    def __init__(self, window=COALESCE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stats = {"batches": 0, "requests": 0, "ranges": 0}
+
+    def submit(self, worksheet, data, value_input_option=ValueInputOption.raw):
+        # Only batches sent with the same value input option can share a request
+        key = (worksheet.title, value_input_option)
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending(worksheet, value_input_option)
+            pending.data.extend(data)
+            pending.sessions += 1
+            self._stats["batches"] += 1
+
+        if not leader:
+            pending.done.wait()
+        else:
+            time.sleep(self.window)
+            with self._lock:
+                del self._pending[key]
+                self._stats["requests"] += 1
+                self._stats["ranges"] += len(pending.data)
+            try:
+                pending.response = worksheet.batch_update(pending.data, value_input_option=value_input_option)
+            except Exception as e:
+                pending.error = e
+            finally:
+                pending.done.set()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+@st.cache_resource(show_spinner=False)
+def get_coalescer(spreadsheet_name=None):
+    # Worksheets are told apart by title, so each spreadsheet gets its own
+    return WriteCoalescer()
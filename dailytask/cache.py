@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from dailytask.config import ROLES, SPREADSHEET_NAME
+from dailytask.connection import get_pool
+from dailytask.delta import get_delta_snapshot
+from dailytask.metrics import timed
+from dailytask.schema import check_header, typed
+
+# Per worksheet: (ttl seconds, max cached entries)
+DEFAULT_POLICY = (60, 8)
+POLICIES = {
+    "Users": (30, 1),
+    # One entry per login, all built from one delta-synced copy of the sheet
+    "user-task": (60, 512),
+    "user-daily-task": (30, 1),
+}
+# Role templates: an admin save invalidates only the admin process, other processes see it within the TTL
+POLICIES.update({sheet_name: (60, 1) for sheet_name in ROLES.values()})
+# Grow by appends, so a reload after the TTL fetches only the new rows
+DELTA_SHEETS = {"user-task"}
+
+
+class SnapshotCache:
+    """Worksheet snapshots with a TTL and LRU bound per worksheet and targeted invalidation."""
+
+    def __init__(self, policies=None, default_policy=DEFAULT_POLICY):
+        self.policies = dict(POLICIES if policies is None else policies)
+        self.default_policy = default_policy
+        self._lock = threading.Lock()
+        self._entries = {}    # worksheet -> OrderedDict(key -> (stored_at, value))
+        self._loading = {}    # (worksheet, key) -> lock so only one session reloads a snapshot
+        self._generation = {}  # bumped on invalidate so a read racing a write is not stored
+        self._stats = {}
+
+    def _policy(self, worksheet):
+        return self.policies.get(worksheet, self.default_policy)
+
+    def _count(self, worksheet, field):
+        counts = self._stats.setdefault(worksheet, {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+        counts[field] += 1
+
+    def _lookup(self, worksheet, key):
+        ttl, _ = self._policy(worksheet)
+        entries = self._entries.get(worksheet)
+        if not entries or key not in entries:
+            return False, None
+        stored_at, value = entries[key]
+        if time.monotonic() - stored_at > ttl:
+            del entries[key]
+            self._count(worksheet, "evictions")
+            return False, None
+        entries.move_to_end(key)
+        return True, value
+
+    def get(self, worksheet, loader, key=None):
+        with self._lock:
+            found, value = self._lookup(worksheet, key)
+            if found:
+                self._count(worksheet, "hits")
+                return value
+            load_lock = self._loading.setdefault((worksheet, key), threading.Lock())
+
+        with load_lock:
+            # Another session may have loaded it while we waited
+            with self._lock:
+                found, value = self._lookup(worksheet, key)
+                if found:
+                    self._count(worksheet, "hits")
+                    return value
+                self._count(worksheet, "misses")
+                generation = self._generation.get(worksheet, 0)
+
+            value = loader()
+
+            with self._lock:
+                if self._generation.get(worksheet, 0) == generation:
+                    self._store(worksheet, key, value)
+            return value
+
+    def contains(self, worksheet, key=None):
+        # Fresh entry present; not counted as a hit
+        with self._lock:
+            return self._lookup(worksheet, key)[0]
+
+    def generation(self, worksheet):
+        with self._lock:
+            return self._generation.get(worksheet, 0)
+
+    def put(self, worksheet, value, key=None, generation=None):
+        # With a generation from before the read, a value an invalidate has since overtaken is dropped
+        with self._lock:
+            if generation is None or self._generation.get(worksheet, 0) == generation:
+                self._store(worksheet, key, value)
+
+    def _store(self, worksheet, key, value):
+        _, max_entries = self._policy(worksheet)
+        entries = self._entries.setdefault(worksheet, OrderedDict())
+        entries[key] = (time.monotonic(), value)
+        entries.move_to_end(key)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+            self._count(worksheet, "evictions")
+
+    def invalidate(self, worksheet, key=None):
+        # key=None drops every snapshot of the worksheet
+        with self._lock:
+            self._generation[worksheet] = self._generation.get(worksheet, 0) + 1
+            entries = self._entries.get(worksheet)
+            if not entries:
+                return
+            if key is None:
+                entries.clear()
+            else:
+                entries.pop(key, None)
+            self._count(worksheet, "invalidations")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            report = {}
+            for worksheet in set(self._stats) | set(self._entries):
+                counts = dict(self._stats.get(worksheet, {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}))
+                counts["entries"] = len(self._entries.get(worksheet, ()))
+                counts["ttl"], counts["max_entries"] = self._policy(worksheet)
+                report[worksheet] = counts
+            return report
+
+
+@st.cache_resource(show_spinner=False)
+def get_cache(spreadsheet_name=SPREADSHEET_NAME):
+    return SnapshotCache()
+
+
+def frame_from_values(values, worksheet=None):
+    # Header row plus data rows padded to its width, typed by the worksheet's schema if it has one
+    if not values:
+        return typed(worksheet, pd.DataFrame())
+    header = values[0]
+    width = len(header)
+    with timed("dataframe", "snapshot", rows=len(values) - 1):
+        df = pd.DataFrame([row[:width] + [""] * (width - len(row)) for row in values[1:]], columns=header)
+        return typed(worksheet, df)
+
+
+def _load(worksheet, spreadsheet_name):
+    if worksheet in DELTA_SHEETS:
+        return frame_from_values(get_delta_snapshot(worksheet, spreadsheet_name).read(), worksheet)
+    return frame_from_values(get_pool(spreadsheet_name).worksheet(worksheet).get_all_values(), worksheet)
+
+
+def load_snapshot(worksheet, spreadsheet_name=SPREADSHEET_NAME):
+    # Whole-worksheet snapshot shared by every session in this process
+    return get_cache(spreadsheet_name).get(worksheet, lambda: _load(worksheet, spreadsheet_name))
+
+
+def load_keyed(worksheet, column, key, spreadsheet_name=SPREADSHEET_NAME):
+    # The rows of a delta-synced worksheet whose `column` equals `key`, cached per key.
+    # The sheet itself is re-read, appended rows only, at most once per TTL for all keys.
+    cache = get_cache(spreadsheet_name)
+
+    def load():
+        ttl, _ = cache.policies.get(worksheet, DEFAULT_POLICY)
+        values = get_delta_snapshot(worksheet, spreadsheet_name).read(max_age=ttl)
+        if not values:
+            return typed(worksheet, pd.DataFrame())
+        check_header(worksheet, values[0])
+        position = values[0].index(column)
+        return frame_from_values([values[0]] + [row for row in values[1:] if row[position:position + 1] == [key]], worksheet)
+    return cache.get(worksheet, load, key=key)
+
+
+def invalidate(worksheet, reread=False, key=None, spreadsheet_name=SPREADSHEET_NAME):
+    # reread: rows were deleted or edited in place, so the next load reads the whole sheet
+    get_cache(spreadsheet_name).invalidate(worksheet, key)
+    if reread and worksheet in DELTA_SHEETS:
+        get_delta_snapshot(worksheet, spreadsheet_name).reset()
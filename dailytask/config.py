@@ -0,0 +1,14 @@
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+SPREADSHEET_NAME = "dailytaskDB"
+TIMEZONE = "Europe/London"
+
+ROLES = {
+    "Operations Manager Inbound Night Shift": "OM-IB-NS",
+    "Operations Manager Inbound Day Shift": "OM-IB-DS",
+    "Operations Manager Outbound Night Shift": "OM-OB-NS",
+    "Operations Manager Outbound Day Shift": "OM-OB-DS",
+    "Area Manager Inbound Night Shift": "AM-IB-NS",
+    "Area Manager Inbound Day Shift": "AM-IB-DS",
+    "Area Manager Outbound Night Shift": "AM-OB-NS",
+    "Area Manager Outbound Day Shift": "AM-OB-DS",
+}
@@ -0,0 +1,179 @@
+import threading
+import time
+from datetime import datetime
+
+import gspread
+import streamlit as st
+from oauth2client.service_account import ServiceAccountCredentials
+
+from dailytask.config import SCOPE, SPREADSHEET_NAME
+from dailytask.metrics import timed
+from dailytask.quota import RequestScheduler
+
+# Google service account tokens live for an hour; re-authorize a little before that
+TOKEN_LIFETIME = 3600
+REFRESH_MARGIN = 300
+# Write calls whose first argument is the rows being sent
+_WRITE_PAYLOADS = {"append_row": 1, "append_rows": None, "update": None, "batch_update": None}
+
+
+def _payload_rows(method, args, kwargs, result):
+    if isinstance(result, list):
+        return len(result)
+    if method not in _WRITE_PAYLOADS:
+        return None
+    if _WRITE_PAYLOADS[method] is not None:
+        return _WRITE_PAYLOADS[method]
+    values = kwargs.get("values", args[-1] if args else None)
+    if method == "batch_update" and isinstance(values, list):
+        return sum(len(item.get("values", [])) for item in values if isinstance(item, dict))
+    return len(values) if isinstance(values, list) else None
+
+
+class TimedHandle:
+    """Wraps a worksheet or spreadsheet so every API call is paced, retried and lands in the metrics."""
+
+    def __init__(self, handle, label, scheduler):
+        self._handle = handle
+        self._label = label
+        self._scheduler = scheduler
+
+    def __getattr__(self, name):
+        attr = getattr(self._handle, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with timed("sheets", name, self._label) as t:
+                result = self._scheduler.call(name, attr, *args, **kwargs)
+                t["rows"] = _payload_rows(name, args, kwargs, result)
+            return result
+        return call
+
+
+class SheetsPool:
+    """One authorized gspread client, spreadsheet and worksheet handles shared by every session."""
+
+    def __init__(self, credentials_dict, spreadsheet_name=SPREADSHEET_NAME, scope=SCOPE, scheduler=None):
+        self.credentials_dict = dict(credentials_dict)
+        self.spreadsheet_name = spreadsheet_name
+        self.scope = scope
+        self.scheduler = scheduler or RequestScheduler()
+        self._lock = threading.RLock()
+        self._client = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        self._token_expiry = 0.0
+        self._last_error = None
+        self._stats = {
+            "authorizations": 0,
+            "token_refreshes": 0,
+            "spreadsheet_opens": 0,
+            "worksheet_hits": 0,
+            "worksheet_misses": 0,
+            "errors": 0,
+        }
+
+    def _authorize(self):
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(self.credentials_dict, self.scope)
+        client = gspread.authorize(creds)
+        self._stats["authorizations"] += 1
+
+        expiry = getattr(creds, "token_expiry", None)
+        if isinstance(expiry, datetime):
+            self._token_expiry = expiry.timestamp()
+        else:
+            self._token_expiry = time.time() + TOKEN_LIFETIME
+        return client
+
+    def _open(self):
+        with timed("sheets", "open"):
+            self.scheduler.call("open", self._open_spreadsheet)
+
+    def _open_spreadsheet(self):
+        try:
+            if self._client is not None:
+                self._stats["token_refreshes"] += 1
+            self._client = self._authorize()
+            if self._spreadsheet is None:
+                self._spreadsheet = self._client.open(self.spreadsheet_name)
+            else:
+                # Same spreadsheet, new token: skip the lookup by name
+                self._spreadsheet = self._client.open_by_key(self._spreadsheet.id)
+            self._stats["spreadsheet_opens"] += 1
+            # One metadata call returns every worksheet handle
+            self._worksheets = {ws.title: ws for ws in self._spreadsheet.worksheets()}
+            self._last_error = None
+        except Exception as e:
+            self._stats["errors"] += 1
+            self._last_error = f"{type(e).__name__}: {e}"
+            raise
+
+    def _ensure_fresh(self):
+        if self._client is None or time.time() >= self._token_expiry - REFRESH_MARGIN:
+            self._open()
+
+    @property
+    def client(self):
+        with self._lock:
+            self._ensure_fresh()
+            return self._client
+
+    @property
+    def spreadsheet(self):
+        with self._lock:
+            self._ensure_fresh()
+            return TimedHandle(self._spreadsheet, "(spreadsheet)", self.scheduler)
+
+    def worksheet(self, name):
+        with self._lock:
+            self._ensure_fresh()
+            ws = self._worksheets.get(name)
+            if ws is not None:
+                self._stats["worksheet_hits"] += 1
+                return TimedHandle(ws, name, self.scheduler)
+            self._stats["worksheet_misses"] += 1
+            try:
+                ws = self.scheduler.call("worksheet", self._spreadsheet.worksheet, name)
+            except Exception as e:
+                self._stats["errors"] += 1
+                self._last_error = f"{type(e).__name__}: {e}"
+                raise
+            self._worksheets[name] = ws
+            return TimedHandle(ws, name, self.scheduler)
+
+    def forget(self, name=None):
+        # Drop cached handles after a worksheet is renamed, added or removed
+        with self._lock:
+            if name is None:
+                self._worksheets.clear()
+            else:
+                self._worksheets.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, cached_worksheets=len(self._worksheets))
+
+    def health(self):
+        with self._lock:
+            authorized = self._client is not None
+            return {
+                "authorized": authorized,
+                "spreadsheet": self.spreadsheet_name,
+                "token_expires_in": round(self._token_expiry - time.time()) if authorized else None,
+                "worksheets": sorted(self._worksheets),
+                "last_error": self._last_error,
+                "healthy": authorized and self._last_error is None,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_scheduler():
+    # The Sheets quota is per service account, not per spreadsheet: every site's pool draws on this one
+    return RequestScheduler()
+
+
+@st.cache_resource(show_spinner=False)
+def get_pool(spreadsheet_name=SPREADSHEET_NAME):
+    # One pool per site spreadsheet, all under the same service account
+    return SheetsPool(st.secrets["thunder"], spreadsheet_name, scheduler=get_scheduler())
@@ -0,0 +1,198 @@
+import threading
+import time
+
+import streamlit as st
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+from dailytask.config import SPREADSHEET_NAME
+from dailytask.connection import get_pool
+
+# Appends are picked up by delta reads; rows edited in place elsewhere only by a full read
+FULL_EVERY = 900
+
+
+def _trim(row):
+    # The values API drops trailing empty cells; get_all_values pads them
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def _values(value_range):
+    return value_range.get("values", []) if value_range else []
+
+
+def quoted(worksheet_name):
+    return "'" + worksheet_name.replace("'", "''") + "'"
+
+
+def appended_at(response):
+    # First sheet row of an append_rows response, or None if it does not say
+    updated_range = ((response or {}).get("updates") or {}).get("updatedRange")
+    if not updated_range:
+        return None
+    return a1_to_rowcol(updated_range.split("!")[-1].split(":")[0])[0]
+
+
+class DeltaSync:
+    """Header, row count and last row of a worksheet as last read, to fetch only rows appended since.
+
+    A delta read asks for the header, the last row we know and everything
+    below it. If the header or that row differ, rows were deleted or moved
+    and the caller reads the whole sheet again.
+    """
+
+    def __init__(self, worksheet_name, full_every=FULL_EVERY):
+        self.worksheet_name = worksheet_name
+        self.full_every = full_every
+        self._lock = threading.Lock()
+        self.header = None
+        self.count = 0          # rows including the header
+        self.last_row = []
+        self.full_at = 0.0
+        self._stats = {"full_reads": 0, "delta_reads": 0, "delta_rows": 0, "fallbacks": 0}
+
+    @property
+    def needs_full(self):
+        with self._lock:
+            return not self.count or self.header is None or time.monotonic() - self.full_at > self.full_every
+
+    def reset(self):
+        with self._lock:
+            self.header = None
+
+    def plan(self, full=False):
+        # (ranges for values_batch_get, whether they read the whole sheet, row count they continue from)
+        if full or self.needs_full:
+            return [quoted(self.worksheet_name)], True, None
+        with self._lock:
+            last_col = rowcol_to_a1(1, max(len(self.header), 1)).rstrip("0123456789")
+            name = quoted(self.worksheet_name)
+            ranges = [f"{name}!1:1", f"{name}!{self.count}:{self.count}", f"{name}!A{self.count + 1}:{last_col}"]
+            return ranges, False, self.count
+
+    def seen(self, values):
+        # After a full read
+        with self._lock:
+            self.header = _trim(values[0]) if values else []
+            self.count = len(values)
+            self.last_row = _trim(values[-1]) if values else []
+            self.full_at = time.monotonic()
+            self._stats["full_reads"] += 1
+
+    def new_rows(self, value_ranges, count):
+        """Rows appended since `count`, or None if the sheet changed some other way."""
+        header, last, tail = (_values(vr) for vr in value_ranges)
+        with self._lock:
+            if (
+                count != self.count  # a write of ours or another read got in between
+                or _trim(header[0] if header else []) != self.header
+                or _trim(last[0] if last else []) != self.last_row
+            ):
+                self._stats["fallbacks"] += 1
+                self.header = None
+                return None
+            rows = list(tail)
+            while rows and not _trim(rows[-1]):
+                rows.pop()
+            self.count += len(rows)
+            if rows:
+                self.last_row = _trim(rows[-1])
+            self._stats["delta_reads"] += 1
+            self._stats["delta_rows"] += len(rows)
+            return rows
+
+    def appended(self, rows, start_row=None):
+        # Rows we appended ourselves; start_row is where append_rows says they landed
+        if not rows:
+            return
+        with self._lock:
+            if self.header is None:
+                return
+            if start_row is not None and start_row != self.count + 1:
+                # Someone else appended in between: the next read starts over
+                self.header = None
+                return
+            self.count += len(rows)
+            self.last_row = _trim(rows[-1])
+
+    def changed(self, row_number, row):
+        # A cell write of ours to the row delta reads compare against
+        with self._lock:
+            if row_number == self.count:
+                self.last_row = _trim(row)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, rows=self.count)
+
+
+class DeltaSnapshot:
+    """A worksheet's values kept between reads; later reads fetch only the rows appended since."""
+
+    def __init__(self, worksheet_name, full_every=FULL_EVERY, spreadsheet_name=SPREADSHEET_NAME):
+        self.sync = DeltaSync(worksheet_name, full_every)
+        self.spreadsheet_name = spreadsheet_name
+        self.values = []
+        self.read_at = 0.0
+        self._lock = threading.Lock()
+
+    def plan(self, full=False):
+        return self.sync.plan(full)
+
+    def apply(self, value_ranges, full, count=None):
+        # False when a delta did not line up and the sheet has to be read whole
+        with self._lock:
+            if full:
+                self.values = [list(row) for row in _values(value_ranges[0] if value_ranges else None)]
+                self.sync.seen(self.values)
+            else:
+                rows = self.sync.new_rows(value_ranges, count)
+                if rows is None:
+                    return False
+                self.values.extend(rows)
+            self.read_at = time.monotonic()
+            return True
+
+    def is_fresh(self, max_age):
+        return self.read_at and not self.sync.needs_full and time.monotonic() - self.read_at <= max_age
+
+    def read(self, max_age=None):
+        # max_age: seconds a previous read stays good enough to skip the request
+        if max_age is not None and self.is_fresh(max_age):
+            with self._lock:
+                return list(self.values)
+        spreadsheet = get_pool(self.spreadsheet_name).spreadsheet
+        ranges, full, count = self.plan()
+        if not self.apply(spreadsheet.values_batch_get(ranges).get("valueRanges", []), full, count):
+            ranges, full, count = self.plan(full=True)
+            self.apply(spreadsheet.values_batch_get(ranges).get("valueRanges", []), full, count)
+        with self._lock:
+            return list(self.values)
+
+    def appended(self, rows, start_row=None):
+        # Rows we appended ourselves, so the next read need not fetch them
+        with self._lock:
+            before = self.sync.count
+            self.sync.appended(rows, start_row)
+            if self.sync.count == before + len(rows) and self.sync.header is not None:
+                self.values.extend(list(row) for row in rows)
+
+    def changed(self, row_number, row):
+        # A row we overwrote ourselves
+        with self._lock:
+            if 0 < row_number <= len(self.values):
+                self.values[row_number - 1] = list(row)
+            self.sync.changed(row_number, row)
+
+    def reset(self):
+        self.sync.reset()
+
+    def stats(self):
+        return self.sync.stats()
+
+
+@st.cache_resource(show_spinner=False)
+def get_delta_snapshot(worksheet_name, spreadsheet_name=SPREADSHEET_NAME):
+    return DeltaSnapshot(worksheet_name, spreadsheet_name=spreadsheet_name)
@@ -0,0 +1,211 @@
+import argparse
+import gzip
+import io
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+from dailytask.archive import DATE_COLUMN
+from dailytask.quota import background
+from dailytask.storage.base import DAILY_TASK_COLUMNS, USER_TASK_COLUMNS
+
+# Exportable worksheets: their shift date column, the column the user filter matches, all columns
+SHEETS = {
+    "user-daily-task": (DATE_COLUMN, "Email", DAILY_TASK_COLUMNS),
+    "user-task": ("date", "login", USER_TASK_COLUMNS),
+}
+FORMATS = ["csv", "csv.gz", "parquet"]
+DEFAULT_CHUNK_ROWS = 5000
+# Streamlit holds a whole download in memory before serving it, so the admin app exports at most
+# this many shift days; longer ranges go through main() below, which stays one chunk at a time
+APP_MAX_DAYS = 92
+
+
+def parquet_available():
+    # pyarrow is optional: without it only CSV is offered
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _user_key(sheet, user):
+    # user-task rows are keyed by the lower-cased login, the part of the email before the @
+    return user.split("@")[0].lower() if sheet == "user-task" else user
+
+
+def filter_chunk(df, sheet, start=None, end=None, user=None, role=None):
+    date_column, user_column, _ = SHEETS[sheet]
+    if df.empty:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if start:
+        mask &= df[date_column].astype(str) >= str(start)
+    if end:
+        mask &= df[date_column].astype(str) <= str(end)
+    if user:
+        mask &= df[user_column] == _user_key(sheet, user)
+    if role:
+        mask &= df["role"] == role
+    return df[mask]
+
+
+def history_chunks(storage, sheet, start=None, end=None, user=None, role=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Filtered frames of at most `chunk_rows` rows: the archived months first, then the hot sheet."""
+    if sheet not in SHEETS:
+        raise ValueError(f"Unknown sheet: {sheet} (exportable: {', '.join(SHEETS)})")
+    sources = [storage.read_chunks(sheet, chunk_rows)]
+    if sheet == "user-daily-task":
+        # Only daily tasks are archived
+        sources.insert(0, storage.archive.iter_chunks(start, end, chunk_rows))
+    for chunks in sources:
+        chunks = iter(chunks)
+        while True:
+            # Each read yields to people using the dashboards; whatever the consumer does between
+            # chunks runs at its own priority
+            with background():
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            chunk = filter_chunk(chunk, sheet, start, end, user, role)
+            if not chunk.empty:
+                yield chunk
+
+
+class CSVSink:
+    def __init__(self, fileobj, compress=False):
+        self._gzip = gzip.GzipFile(fileobj=fileobj, mode="wb") if compress else None
+        self._text = io.TextIOWrapper(self._gzip or fileobj, encoding="utf-8", newline="")
+        self.columns = None
+
+    def write(self, chunk):
+        header = self.columns is None
+        if header:
+            self.columns = list(chunk.columns)
+        chunk.reindex(columns=self.columns).to_csv(self._text, index=False, header=header)
+
+    def close(self):
+        self._text.flush()
+        # Leave the caller's file open
+        self._text.detach()
+        if self._gzip:
+            self._gzip.close()
+
+
+class ParquetSink:
+    def __init__(self, fileobj):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow); use CSV instead") from None
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._fileobj = fileobj
+        self._writer = None
+        self.columns = None
+
+    def write(self, chunk):
+        if self._writer is None:
+            # Every column is a string, as the sheet shows it; each chunk becomes a row group
+            self.columns = list(chunk.columns)
+            schema = self._pa.schema([(name, self._pa.string()) for name in self.columns])
+            self._writer = self._pq.ParquetWriter(self._fileobj, schema, compression="snappy")
+        table = self._pa.Table.from_pandas(
+            chunk.reindex(columns=self.columns).astype(str), schema=self._writer.schema, preserve_index=False
+        )
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def sink_for(fileobj, fmt):
+    if fmt == "parquet":
+        return ParquetSink(fileobj)
+    if fmt in ("csv", "csv.gz"):
+        return CSVSink(fileobj, compress=fmt == "csv.gz")
+    raise ValueError(f"Unknown format: {fmt} (one of {', '.join(FORMATS)})")
+
+
+def export(storage, fileobj, fmt="csv", sheet="user-daily-task", start=None, end=None, user=None, role=None,
+           chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Stream the filtered rows of `sheet` into a binary file; returns how many rows were written.
+
+    Only one chunk is in memory at a time, whatever the date range.
+    """
+    sink = sink_for(fileobj, fmt)
+    rows = 0
+    for chunk in history_chunks(storage, sheet, start, end, user, role, chunk_rows):
+        sink.write(chunk)
+        rows += len(chunk)
+    if sink.columns is None:
+        # Nothing matched: still a valid file with the header
+        sink.write(pd.DataFrame(columns=SHEETS[sheet][2]))
+    sink.close()
+    return rows
+
+
+def export_file(storage, fmt="csv", **filters):
+    # A temporary file on disk rather than bytes in memory; the caller reads it once
+    fileobj = tempfile.TemporaryFile()
+    export(storage, fileobj, fmt, **filters)
+    fileobj.seek(0)
+    return fileobj
+
+
+def format_of(path):
+    for fmt in sorted(FORMATS, key=len, reverse=True):
+        if path.endswith("." + fmt):
+            return fmt
+    return "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export user-daily-task (with its archive) or user-task to CSV or Parquet, "
+                    "reading and writing one chunk of rows at a time."
+    )
+    parser.add_argument("--sheet", choices=list(SHEETS), default="user-daily-task")
+    parser.add_argument("--from", dest="start", help="first shift date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="last shift date, YYYY-MM-DD")
+    parser.add_argument("--user", help="only this user's rows (email)")
+    parser.add_argument("--role", help="only this role's rows")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the output file's extension, else csv")
+    parser.add_argument("--output", "-o", help="file to write (default: CSV to stdout)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"rows read and written at a time (default {DEFAULT_CHUNK_ROWS})")
+    parser.add_argument("--site", help="site code to export (default: this deployment's site)")
+    args = parser.parse_args(argv)
+
+    from dailytask.storage import create_storage
+
+    fmt = args.format or (format_of(args.output) if args.output else "csv")
+    if fmt == "parquet" and not args.output:
+        parser.error("Parquet needs --output")
+    storage = create_storage(site=args.site)
+    filters = dict(sheet=args.sheet, start=args.start, end=args.end, user=args.user, role=args.role,
+                   chunk_rows=args.chunk_rows)
+    if args.output:
+        tmp = f"{args.output}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                rows = export(storage, f, fmt, **filters)
+            # A failed export never leaves a half-written report behind
+            os.replace(tmp, args.output)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        print(f"{storage.site}: exported {rows} rows of {args.sheet} to {args.output}", file=sys.stderr)
+    else:
+        rows = export(storage, sys.stdout.buffer, fmt, **filters)
+        sys.stdout.flush()
+        print(f"{storage.site}: exported {rows} rows of {args.sheet}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
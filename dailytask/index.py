@@ -0,0 +1,220 @@
+import sys
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from dailytask.config import SPREADSHEET_NAME
+from dailytask.connection import get_pool
+from dailytask.delta import DeltaSync, appended_at
+from dailytask.metrics import timed
+from dailytask.schema import check_header, typed
+
+DAILY_TASK_SHEET = "user-daily-task"
+# Safety net for edits made directly in the spreadsheet; writes from the app keep the index current
+REBUILD_SECONDS = 900
+# Between rebuilds, pick up rows other processes appended (the materializer, other app instances)
+SYNC_SECONDS = 30
+# Columns whose few distinct values repeat on every row: one shared string each
+INTERNED_COLUMNS = ["Email", "Name", "task create Date", "role", "task", "done", "exempt", "locked", "missed", "due time"]
+
+
+def _cell(value):
+    # Match what get_all_values returns for values we wrote ourselves
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    return "" if value is None else str(value)
+
+
+class DailyTaskIndex:
+    """(Email, task create Date, role) -> absolute sheet rows of user-daily-task, built from one read."""
+
+    def __init__(self, worksheet_name=DAILY_TASK_SHEET, spreadsheet_name=SPREADSHEET_NAME):
+        self.worksheet_name = worksheet_name
+        self.spreadsheet_name = spreadsheet_name
+        self._lock = threading.RLock()
+        self.header = []
+        self._columns = {}
+        self._interned = []
+        self._rows = {}       # sheet row number -> list of cell strings
+        self._by_task = {}    # (email, date, role) -> [row numbers]
+        self._by_day = {}     # (email, date) -> [roles in first-seen order]
+        self._typed = {}      # (email, date, role) -> typed frame of its rows; None -> every row
+        self._next_row = 2
+        self.built_at = 0.0
+        self.synced_at = 0.0
+        self.delta = DeltaSync(worksheet_name, full_every=REBUILD_SECONDS)
+
+    def _key(self, row):
+        col = self._columns
+        return row[col["Email"]], row[col["task create Date"]], row[col["role"]]
+
+    def _add(self, row_number, row):
+        row = list(row) + [""] * (len(self.header) - len(row))
+        for i in self._interned:
+            row[i] = sys.intern(row[i])
+        self._rows[row_number] = row
+        email, date, role = self._key(row)
+        self._changed((email, date, role))
+        self._by_task.setdefault((email, date, role), []).append(row_number)
+        roles = self._by_day.setdefault((email, date), [])
+        if role not in roles:
+            roles.append(role)
+        self._next_row = max(self._next_row, row_number + 1)
+
+    def _changed(self, key):
+        self._typed.pop(key, None)
+        self._typed.pop(None, None)
+
+    def build(self):
+        with self._lock:
+            self.load(get_pool(self.spreadsheet_name).worksheet(self.worksheet_name).get_all_values())
+
+    def load(self, values):
+        # values as get_all_values returns them, header first
+        with self._lock, timed("dataframe", "index build", rows=len(values)):
+            check_header(self.worksheet_name, values[0] if values else [])
+            self.header = values[0] if values else []
+            self._columns = {name: i for i, name in enumerate(self.header)}
+            self._interned = [self._columns[name] for name in INTERNED_COLUMNS if name in self._columns]
+            self._rows, self._by_task, self._by_day, self._typed = {}, {}, {}, {}
+            self._next_row = 2
+            for row_number, row in enumerate(values[1:], start=2):
+                self._add(row_number, row)
+            self.delta.seen(values)
+            self.built_at = self.synced_at = time.monotonic()
+
+    def needs_sync(self):
+        return self.delta.needs_full or time.monotonic() - self.synced_at > SYNC_SECONDS
+
+    def plan(self, full=False):
+        return self.delta.plan(full or not self.built_at)
+
+    def apply(self, value_ranges, full, count=None):
+        # value_ranges as plan() asked for them; False when the delta did not line up
+        with self._lock:
+            if full:
+                self.load(value_ranges[0].get("values", []) if value_ranges else [])
+                return True
+            rows = self.delta.new_rows(value_ranges, count)
+            if rows is None:
+                return False
+            for row_number, row in enumerate(rows, start=count + 1):
+                self._add(row_number, row)
+            self.synced_at = time.monotonic()
+            return True
+
+    def sync(self):
+        # Appended rows only, unless the sheet changed some other way or a rebuild is due
+        with self._lock:
+            spreadsheet = get_pool(self.spreadsheet_name).spreadsheet
+            ranges, full, count = self.plan()
+            if not self.apply(spreadsheet.values_batch_get(ranges).get("valueRanges", []), full, count):
+                self.build()
+
+    def ensure_fresh(self):
+        with self._lock:
+            if self.needs_sync():
+                self.sync()
+
+    def invalidate(self):
+        # Rebuild from the sheet on next use
+        with self._lock:
+            self.built_at = 0.0
+            self.delta.reset()
+
+    def _frame(self, records, row_numbers):
+        with timed("dataframe", "index rows", rows=len(records)):
+            df = pd.DataFrame(records, columns=self.header, index=pd.Index(row_numbers, dtype="int64"))
+            return typed(self.worksheet_name, df)
+
+    def rows(self, email, shift_date, role):
+        # Typed DataFrame indexed by absolute sheet row number, typed once until one of its rows changes
+        key = (email, str(shift_date), role)
+        with self._lock:
+            if key not in self._typed:
+                row_numbers = self._by_task.get(key, [])
+                self._typed[key] = self._frame([self._rows[n] for n in row_numbers], row_numbers)
+            return self._typed[key]
+
+    def frame(self, shift_dates=None):
+        with self._lock:
+            if shift_dates is None:
+                # Every row, kept typed until any row changes
+                if None not in self._typed:
+                    row_numbers = sorted(self._rows)
+                    self._typed[None] = self._frame([self._rows[n] for n in row_numbers], row_numbers)
+                return self._typed[None]
+            dates = {str(d) for d in shift_dates}
+            row_numbers = sorted(
+                n for (_, date, _), numbers in self._by_task.items() if date in dates for n in numbers
+            )
+            records = [self._rows[n] for n in row_numbers]
+        return self._frame(records, row_numbers)
+
+    def keys(self, row_numbers):
+        # (email, date, role, task) of each row number still in the index
+        with self._lock:
+            task = self._columns.get("task")
+            return {
+                n: self._key(self._rows[n]) + (self._rows[n][task],)
+                for n in row_numbers if n in self._rows
+            }
+
+    def locate(self, key, exclude=()):
+        # (row number, cells) of the row now holding (email, date, role, task), skipping rows in `exclude`
+        email, date, role, task = key
+        with self._lock:
+            column = self._columns.get("task")
+            for n in self._by_task.get((email, date, role), []):
+                if n not in exclude and self._rows[n][column] == task:
+                    return n, list(self._rows[n])
+        return None
+
+    def role_for(self, email, shift_date):
+        with self._lock:
+            roles = self._by_day.get((email, str(shift_date)))
+            return roles[0] if roles else None
+
+    def appended(self, rows, response=None):
+        # append_rows reports where the rows landed; fall back to our own row count
+        reported = appended_at(response)
+        with self._lock:
+            start_row = reported or self._next_row
+            cells = [[_cell(v) for v in row] for row in rows]
+            for offset, row in enumerate(cells):
+                self._add(start_row + offset, row)
+            self.delta.appended(cells, reported)
+
+    def updated(self, row_number, values):
+        # values: {column name: new value}
+        with self._lock:
+            row = self._rows.get(row_number)
+            if row is None:
+                return
+            for name, value in values.items():
+                if name in self._columns:
+                    row[self._columns[name]] = _cell(value)
+            self._changed(self._key(row))
+            self.delta.changed(row_number, row)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": len(self._rows),
+                "keys": len(self._by_task),
+                "age_seconds": round(time.monotonic() - self.built_at) if self.built_at else None,
+                "delta": self.delta.stats(),
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_daily_task_index(spreadsheet_name=SPREADSHEET_NAME):
+    return DailyTaskIndex(spreadsheet_name=spreadsheet_name)
+
+
+def daily_task_index(spreadsheet_name=SPREADSHEET_NAME):
+    index = get_daily_task_index(spreadsheet_name)
+    index.ensure_fresh()
+    return index
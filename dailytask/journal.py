@@ -0,0 +1,356 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+import pandas as pd
+
+from dailytask import schema
+from dailytask.storage.base import USER_TASK_COLUMNS
+
+# Directory for the write-ahead journals; set it empty to write straight to the backend
+JOURNAL_DIR_ENV = "DAILYTASK_JOURNAL_DIR"
+DEFAULT_JOURNAL_DIR = "dailytask-journal"
+# A relative directory is taken from the checkout, not the working directory, so every process
+# of a deployment finds the journals the others left
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The flusher wakes on every save and at least this often; saves queued during a flush go in the next one
+FLUSH_SECONDS = 1.0
+# After a failed flush, wait this long, doubling up to the cap, before trying again
+RETRY_SECONDS = 5.0
+MAX_RETRY_SECONDS = 120.0
+# Start the file over once everything in it is flushed and it has grown past this
+COMPACT_BYTES = 1 << 20
+# Saves whose task was gone by the time they were flushed, kept for the admin dashboard
+DROPPED_KEPT = 50
+
+
+class Journal:
+    """Append-only JSON-lines log of writes, each with an idempotency key, until the backend has them.
+
+    Every entry is fsynced before the write counts as saved. An 'ack' line
+    records the keys the backend has taken. The file is locked for as long
+    as its process lives, so another process can tell an abandoned journal
+    from a live one and replay it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}  # key -> entry, in the order written
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a+", encoding="utf-8")
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._file.seek(0)
+        lines = self._file.readlines()
+        self._pending = _replay(lines)
+        if lines and not lines[-1].endswith("\n"):
+            # End a line cut short by a crash, or the next entry would be read as part of it
+            self._file.write("\n")
+
+    def _write(self, records):
+        self._file.seek(0, os.SEEK_END)
+        self._file.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, op, args, **extra):
+        entry = dict(extra, key=uuid.uuid4().hex, op=op, args=args, at=time.time())
+        with self._lock:
+            self._write([entry])
+            self._pending[entry["key"]] = entry
+        return entry
+
+    def adopt(self, entries):
+        # Entries from an abandoned journal keep their keys, so adopting twice replays once
+        with self._lock:
+            new = [e for e in entries if e["key"] not in self._pending]
+            if new:
+                self._write(new)
+                self._pending.update((e["key"], e) for e in new)
+        return len(new)
+
+    def ack(self, keys):
+        with self._lock:
+            keys = [k for k in keys if k in self._pending]
+            if not keys:
+                return
+            self._write([{"ack": keys}])
+            for key in keys:
+                self._pending.pop(key, None)
+            if not self._pending and self._file.tell() > COMPACT_BYTES:
+                self._file.truncate(0)
+                os.fsync(self._file.fileno())
+
+    def pending(self):
+        with self._lock:
+            return list(self._pending.values())
+
+    def close(self):
+        self._file.close()
+
+
+def _replay(lines):
+    # Entries without an ack line, in the order they were written
+    pending = {}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # A line cut short by a crash was never confirmed to anyone
+            continue
+        if "ack" in record:
+            for key in record["ack"]:
+                pending.pop(key, None)
+        else:
+            pending.setdefault(record["key"], record)
+    return pending
+
+
+def _closed_values(done, exempt, reason, closed_at):
+    return {
+        "task closed Date": closed_at, "done": done, "exempt": exempt,
+        "exempt reason": reason, "locked": True, "missed": not done and not exempt,
+    }
+
+
+def _rows(entry):
+    # The task key recorded for each row of a close entry; empty for journals written before they were
+    return entry.get("rows") or [()] * len(entry["args"][0])
+
+
+def _task(row_id, key):
+    # What a queued close is matched on: the task it was saved for, or the row id for entries
+    # journaled before keys were recorded
+    return tuple(key) if key and len(key) == 4 else row_id
+
+
+def _overlay(df, closes):
+    # Pending closes shown on a daily task frame: {task key or row id: column values}. By task, so a
+    # row moved by an archive or a deleted role since the save shows it on the task it was for
+    hits = [
+        (row_id, closes.get(key, closes.get(row_id)))
+        for row_id, key in schema.row_keys(df).items()
+        if key in closes or row_id in closes
+    ]
+    if not hits:
+        return df
+    df = df.copy()
+    for row_id, values in hits:
+        for column, value in values.items():
+            if pd.api.types.is_datetime64_any_dtype(df[column]):
+                value = pd.to_datetime(value, format=schema.DATETIME_FORMAT, errors="coerce")
+            elif isinstance(df[column].dtype, pd.CategoricalDtype) and value not in df[column].cat.categories:
+                df[column] = df[column].cat.add_categories([value])
+            df.loc[row_id, column] = value
+    return df
+
+
+class JournaledStorage:
+    """A storage whose task saves and Eisenhower saves return once they are on local disk.
+
+    A background thread sends them on in batches. Reads through this
+    storage show writes that are still queued. Everything else is passed
+    straight to the wrapped storage.
+    """
+
+    def __init__(self, storage, journal):
+        self.storage = storage
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._closes = {}    # task key or row id -> (journal key, column values) still queued
+        self._upserts = {}   # login -> (journal key, row) still queued
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._stats = {"queued": 0, "flushes": 0, "flushed": 0, "failures": 0, "moved": 0, "dropped": 0}
+        self._dropped = deque(maxlen=DROPPED_KEPT)
+        self.last_error = None
+        for entry in journal.pending():
+            self._track(entry)
+        self._thread = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+    def _track(self, entry):
+        with self._lock:
+            if entry["op"] == "close_daily_tasks":
+                for (row_id, done, exempt, reason, closed_at), key in zip(entry["args"][0], _rows(entry)):
+                    self._closes[_task(row_id, key)] = (entry["key"], _closed_values(done, exempt, reason, closed_at))
+            elif entry["op"] == "upsert_eisenhower_tasks":
+                login, row = entry["args"]
+                self._upserts[login] = (entry["key"], row)
+            self._stats["queued"] += 1
+
+    # --- Journaled writes ---
+    def close_daily_tasks(self, updates, keys=None):
+        if not updates:
+            return None
+        updates = [
+            [int(row_id), bool(done), bool(exempt), str(reason or ""), str(closed_at)]
+            for row_id, done, exempt, reason, closed_at in updates
+        ]
+        # What each row is, so a flush after rows have moved still finds it
+        keys = keys or self.storage.daily_task_keys([u[0] for u in updates])
+        entry = self.journal.append(
+            "close_daily_tasks", [updates], rows=[list(keys.get(u[0], ())) for u in updates]
+        )
+        self._track(entry)
+        self._wake.set()
+        # Only known once it is flushed
+        return None
+
+    def close_daily_task(self, row_id, done, exempt, reason, closed_at, key=None):
+        return self.close_daily_tasks([(row_id, done, exempt, reason, closed_at)], {row_id: key} if key else None)
+
+    def upsert_eisenhower_tasks(self, login, row):
+        # Whether the login already had a row is only known once it is flushed
+        entry = self.journal.append("upsert_eisenhower_tasks", [login, [str(v) for v in row]])
+        self._track(entry)
+        self._wake.set()
+        return None
+
+    # --- Reads that show queued writes ---
+    def daily_tasks(self, email, shift_date, role):
+        return self._with_closes(self.storage.daily_tasks(email, shift_date, role))
+
+    def daily_tasks_on(self, shift_dates):
+        return self._with_closes(self.storage.daily_tasks_on(shift_dates))
+
+    def _with_closes(self, df):
+        with self._lock:
+            closes = {row_id: values for row_id, (_, values) in self._closes.items()}
+        return _overlay(df, closes) if closes else df
+
+    def eisenhower_tasks(self, login):
+        with self._lock:
+            queued = self._upserts.get(login)
+        if queued is None:
+            return self.storage.eisenhower_tasks(login)
+        row = queued[1]
+        return schema.typed("user-task", pd.DataFrame([row], columns=USER_TASK_COLUMNS[:len(row)]))
+
+    # --- Flushing ---
+    def _run(self):
+        delay = 0.0
+        while not self._stop.is_set():
+            if delay:
+                # Backing off: writes queued meanwhile wait for the next attempt too
+                self._stop.wait(delay)
+            else:
+                self._wake.wait(FLUSH_SECONDS)
+            self._wake.clear()
+            try:
+                self.flush()
+                delay = 0.0
+            except Exception as e:
+                with self._lock:
+                    self._stats["failures"] += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                delay = min(max(delay * 2, RETRY_SECONDS), MAX_RETRY_SECONDS)
+
+    def flush(self):
+        """Send every queued write to the backend; returns how many journal entries it took."""
+        with self._flush_lock:
+            entries = self.journal.pending()
+            if not entries:
+                return 0
+            closes = [e for e in entries if e["op"] == "close_daily_tasks"]
+            if closes:
+                # Every queued save in one batch; a later save of the same row wins
+                updates, keys = {}, {}
+                for entry in closes:
+                    for update, key in zip(entry["args"][0], _rows(entry)):
+                        updates[update[0]] = update
+                        if key and len(key) == 4:
+                            keys[update[0]] = tuple(key)
+                # The backend checks each row still holds its task, and finds it again if it moved.
+                # Rows with no recorded key are checked against the backend's own index
+                summary = self.storage.close_daily_tasks(list(updates.values()), keys)
+                dropped = set(summary["dropped_rows"])
+                with self._lock:
+                    self._stats["moved"] += summary["moved"]
+                    self._stats["dropped"] += summary["dropped"]
+                    for row_id in dropped:
+                        # Acked all the same: retrying a save for a task that is gone would never succeed
+                        row_id, done, exempt, reason, closed_at = updates[row_id]
+                        self._dropped.append({
+                            "row": row_id, "task": list(keys.get(row_id, ())), "done": done,
+                            "exempt": exempt, "closed at": closed_at,
+                        })
+                self._done(closes)
+            upserts = {}
+            for e in entries:
+                if e["op"] == "upsert_eisenhower_tasks":
+                    upserts.setdefault(e["args"][0], []).append(e)
+            for login, login_entries in upserts.items():
+                # Only the last row matters; one write per login
+                self.storage.upsert_eisenhower_tasks(login, login_entries[-1]["args"][1])
+                self._done(login_entries)
+            with self._lock:
+                self._stats["flushes"] += 1
+                self.last_error = None
+            return len(entries)
+
+    def _done(self, entries):
+        keys = {e["key"] for e in entries}
+        self.journal.ack(keys)
+        with self._lock:
+            self._closes = {k: v for k, v in self._closes.items() if v[0] not in keys}
+            self._upserts = {k: v for k, v in self._upserts.items() if v[0] not in keys}
+            self._stats["flushed"] += len(entries)
+
+    def refresh(self):
+        self.storage.refresh()
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            journal = dict(
+                self._stats, queued_rows={"closes": len(self._closes), "upserts": len(self._upserts)},
+                last_error=self.last_error, dropped_saves=list(self._dropped),
+            )
+        return dict(self.storage.stats(), journal=dict(
+            journal, path=self.journal.path, pending=len(self.journal.pending()),
+        ))
+
+
+def journal_dir():
+    # '' when journaling is switched off
+    directory = os.environ.get(JOURNAL_DIR_ENV, DEFAULT_JOURNAL_DIR)
+    return os.path.join(ROOT_DIR, directory) if directory else ""
+
+
+def journaled(storage):
+    """The storage behind a write-ahead journal, or the storage itself when journaling is off.
+
+    Journals of processes that have exited are replayed through it.
+    """
+    directory = journal_dir()
+    if not directory:
+        return storage
+    prefix = str(storage.site or "default").lower()
+    # Unique per instance: a cleared resource cache builds a second one in the same process
+    journal = Journal(os.path.join(directory, f"{prefix}-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"))
+    for path in glob.glob(os.path.join(directory, f"{prefix}-*.jsonl")):
+        if os.path.abspath(path) == os.path.abspath(journal.path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue  # its process is still running
+            journal.adopt(list(_replay(f).values()))
+            # In our own journal now, fsynced, so the old file can go; removed while still locked
+            os.remove(path)
+    return JournaledStorage(storage, journal)
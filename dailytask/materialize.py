@@ -0,0 +1,111 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from dailytask.config import TIMEZONE
+from dailytask.shifts import get_shift_date
+
+# How far back to look for the role a manager usually works
+LOOKBACK_DAYS = 14
+# Shifts in a row in the same role before it counts as their usual one; a single shift may be cover
+MIN_STREAK = 2
+
+
+def usual_roles(history_df, min_streak=MIN_STREAK):
+    """email -> role of the manager's latest shift, if their last `min_streak` shifts were all that role."""
+    roles = {}
+    if history_df.empty:
+        return roles
+    shifts = (
+        history_df[["Email", "task create Date", "role"]]
+        .drop_duplicates()
+        .sort_values("task create Date", ascending=False, kind="stable")
+    )
+    for email, group in shifts.groupby("Email", sort=False, observed=True):
+        # One role per shift date; the first seen is the one the dashboard shows
+        latest = group.drop_duplicates("task create Date")["role"].tolist()[:min_streak]
+        if len(latest) == min_streak and len(set(latest)) == 1 and latest[0]:
+            roles[email] = latest[0]
+    return roles
+
+
+def plan(storage, templates, shift_date=None, min_streak=MIN_STREAK):
+    """Rows to append for every active user without tasks on `shift_date`, plus a summary.
+
+    By default the dashboard's shift date, so it finds these rows on the date it looks them up.
+    """
+    shift_date = shift_date or get_shift_date()
+    users = storage.users()
+    active = users[(users["Role"] == "user") & (users["Status"] == "active")]["Email"]
+    history = storage.daily_task_history(start=shift_date - timedelta(days=LOOKBACK_DAYS), end=shift_date)
+    roles = usual_roles(history, min_streak)
+
+    rows = []
+    summary = {"created": [], "already": [], "no_usual_role": []}
+    for email in active:
+        role = roles.get(email)
+        if role is None:
+            # They pick a role on the dashboard as before
+            summary["no_usual_role"].append(email)
+            continue
+        if storage.role_for_day(email, shift_date):
+            summary["already"].append(email)
+            continue
+        name = email.split("@")[0].capitalize()
+        rows.extend(templates.rows_for(role, email, name, shift_date, role))
+        summary["created"].append(f"{email} {role} {shift_date}")
+    return rows, summary
+
+
+def materialize(storage, templates, shift_date=None, min_streak=MIN_STREAK, dry_run=False):
+    rows, summary = plan(storage, templates, shift_date, min_streak)
+    if rows and not dry_run:
+        # Every user's rows in one append
+        storage.add_daily_tasks(rows)
+    summary["rows"] = len(rows)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Create today's daily task rows for every active manager in one append, "
+                    "using the role of their recent shifts. Safe to re-run: managers who already "
+                    "have tasks for their shift date are skipped."
+    )
+    parser.add_argument("--min-streak", type=int, default=MIN_STREAK,
+                        help=f"only pre-create for managers whose last N shifts were the same role (default {MIN_STREAK})")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="keep running and check every N seconds (default: run once and exit)")
+    parser.add_argument("--dry-run", action="store_true", help="show who would get rows without writing")
+    parser.add_argument("--site", action="append", help="site code to run for, repeatable (default: every site)")
+    args = parser.parse_args(argv)
+
+    from dailytask.sites import site_codes
+    from dailytask.storage import create_storage
+    from dailytask.templates import TemplateRegistry
+
+    shards = []
+    for code in site_codes(args.site):
+        storage = create_storage(site=code)
+        shards.append((storage, TemplateRegistry(storage)))
+    while True:
+        for storage, templates in shards:
+            # The dashboards write too, so plan from fresh data
+            storage.refresh()
+            templates.refresh()
+            summary = materialize(storage, templates, min_streak=args.min_streak, dry_run=args.dry_run)
+            stamp = f"{datetime.now(pytz.timezone(TIMEZONE)):%Y-%m-%d %H:%M:%S}"
+            verb = "would create" if args.dry_run else "created"
+            print(f"{stamp} {storage.site}: {verb} {summary['rows']} rows for {len(summary['created'])} managers; "
+                  f"{len(summary['already'])} already had tasks, {len(summary['no_usual_role'])} have no usual role")
+            for line in summary["created"]:
+                print(f"  {line}")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
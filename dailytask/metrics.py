@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf")]
+RING_SIZE = 5000
+# Set to a directory to have each app process dump its metrics there for the admin Performance tab
+METRICS_DIR_ENV = "DAILYTASK_METRICS_DIR"
+DUMP_EVERY_SECONDS = 10
+
+_local = threading.local()
+
+
+class Metrics:
+    """Latency histograms, per-worksheet call counts and a ring buffer of recent events."""
+
+    def __init__(self, ring_size=RING_SIZE):
+        self._lock = threading.Lock()
+        self.events = deque(maxlen=ring_size)  # (end time, rerun, kind, name, worksheet, ms, rows)
+        self.histograms = {}                   # (kind, name) -> [bucket counts..., count, total ms, max ms]
+        self.worksheet_calls = {}              # API calls only
+        self.reruns = deque(maxlen=500)        # (rerun id, app, started)
+        self.started = time.time()
+        self._rerun_seq = 0
+        self._last_dump = 0.0
+
+    def begin_rerun(self, app):
+        with self._lock:
+            self._rerun_seq += 1
+            rerun = f"{app}-{self._rerun_seq}"
+            self.reruns.append((rerun, app, time.time()))
+        _local.rerun = rerun
+        return rerun
+
+    def record(self, kind, name, ms, worksheet=None, rows=None):
+        rerun = getattr(_local, "rerun", None)
+        with self._lock:
+            self.events.append((time.time(), rerun, kind, name, worksheet, ms, rows))
+            hist = self.histograms.get((kind, name))
+            if hist is None:
+                hist = self.histograms[(kind, name)] = [0] * len(BUCKETS_MS) + [0, 0.0, 0.0]
+            hist[bisect_left(BUCKETS_MS, ms)] += 1
+            hist[-3] += 1
+            hist[-2] += ms
+            hist[-1] = max(hist[-1], ms)
+            if kind == "sheets" and worksheet is not None:
+                self.worksheet_calls[worksheet] = self.worksheet_calls.get(worksheet, 0) + 1
+
+    @contextmanager
+    def timed(self, kind, name, worksheet=None, rows=None):
+        # rows may be filled in by the caller: `with timed(...) as t: t["rows"] = len(df)`
+        info = {"rows": rows}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.record(kind, name, (time.perf_counter() - start) * 1000, worksheet, info["rows"])
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.histograms.clear()
+            self.worksheet_calls.clear()
+            self.reruns.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            events = list(self.events)
+            histograms = {k: list(v) for k, v in self.histograms.items()}
+            worksheet_calls = dict(self.worksheet_calls)
+            reruns = list(self.reruns)
+            started = self.started
+
+        latencies = {}
+        for _, _, kind, name, _, ms, _ in events:
+            latencies.setdefault((kind, name), []).append(ms)
+
+        operations = []
+        for (kind, name), hist in sorted(histograms.items()):
+            recent = sorted(latencies.get((kind, name), []))
+            operations.append({
+                "kind": kind,
+                "name": name,
+                "count": hist[-3],
+                "mean_ms": round(hist[-2] / hist[-3], 2) if hist[-3] else 0.0,
+                "p50_ms": round(recent[len(recent) // 2], 2) if recent else None,
+                "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 2) if recent else None,
+                "max_ms": round(hist[-1], 2),
+                "buckets": {
+                    ("inf" if bound == float("inf") else str(bound)): n
+                    for bound, n in zip(BUCKETS_MS, hist[:len(BUCKETS_MS)]) if n
+                },
+            })
+
+        per_rerun = {}
+        for end, rerun, kind, _, _, ms, rows in events:
+            if rerun is None:
+                continue
+            summary = per_rerun.setdefault(rerun, {"sheets_calls": 0, "sheets_ms": 0.0, "rows": 0, "last_event": end})
+            if kind in ("sheets", "sqlite"):
+                summary["sheets_calls"] += 1
+                summary["sheets_ms"] += ms
+                summary["rows"] += rows or 0
+            summary["last_event"] = max(summary["last_event"], end)
+        rerun_rows = []
+        for rerun, app, begun in reruns:
+            summary = per_rerun.get(rerun)
+            if summary is None:
+                continue
+            rerun_rows.append({
+                "rerun": rerun,
+                "app": app,
+                "started": begun,
+                "span_ms": round((summary["last_event"] - begun) * 1000, 1),
+                "sheets_calls": summary["sheets_calls"],
+                "sheets_ms": round(summary["sheets_ms"], 1),
+                "rows": summary["rows"],
+            })
+
+        return {
+            "pid": os.getpid(),
+            "since": started,
+            "taken": time.time(),
+            "operations": operations,
+            "worksheet_calls": worksheet_calls,
+            "reruns": rerun_rows,
+        }
+
+    def maybe_dump(self, app):
+        directory = os.environ.get(METRICS_DIR_ENV)
+        if not directory or time.time() - self._last_dump < DUMP_EVERY_SECONDS:
+            return
+        self._last_dump = time.time()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{app}-{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+
+# Module level so the hot path skips Streamlit's resource cache lookup
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def timed(kind, name, worksheet=None, rows=None):
+    return _metrics.timed(kind, name, worksheet, rows)
+
+
+def load_dumps():
+    # {file name: snapshot} for every process that dumped into METRICS_DIR
+    directory = os.environ.get(METRICS_DIR_ENV)
+    if not directory or not os.path.isdir(directory):
+        return {}
+    dumps = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    dumps[name[:-len(".json")]] = json.load(f)
+            except (OSError, ValueError):
+                continue
+    return dumps
@@ -0,0 +1,177 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from gspread.exceptions import APIError
+from requests.exceptions import ConnectionError, Timeout
+
+from dailytask.metrics import get_metrics
+
+# Sheets API default: 60 read and 60 write requests per minute per user (the service account)
+READS_PER_MINUTE_ENV = "DAILYTASK_READS_PER_MINUTE"
+WRITES_PER_MINUTE_ENV = "DAILYTASK_WRITES_PER_MINUTE"
+DEFAULT_PER_MINUTE = 60
+# Share of each bucket background work may not touch, kept for people clicking Save
+INTERACTIVE_RESERVE = 0.2
+
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 32.0
+
+WRITE_METHODS = {
+    "add_worksheet", "append_row", "append_rows", "batch_clear", "batch_update", "clear",
+    "delete_rows", "insert_row", "insert_rows", "update", "update_acell", "update_cell",
+    "update_cells", "values_append", "values_batch_update", "values_update",
+}
+
+# A 5xx or dropped connection may hide a request that did go through; only a 429 is safe to repeat
+NOT_IDEMPOTENT = {"add_worksheet", "append_row", "append_rows", "delete_rows", "insert_row", "insert_rows", "values_append"}
+# Spreadsheet batch_update requests that move rows or columns: repeating one that went through
+# deletes or shifts whatever has since moved into those positions
+STRUCTURAL_REQUESTS = {"deleteDimension", "insertDimension", "moveDimension", "deleteRange", "insertRange", "addSheet"}
+
+_local = threading.local()
+
+
+@contextmanager
+def background():
+    # Requests made inside yield to interactive ones, e.g. the overdue sweeper
+    previous = getattr(_local, "background", False)
+    _local.background = True
+    try:
+        yield
+    finally:
+        _local.background = previous
+
+
+def is_idempotent(method, args=(), kwargs=None):
+    if method in NOT_IDEMPOTENT:
+        return False
+    if method == "batch_update":
+        # A worksheet's batch_update takes value ranges; the spreadsheet's takes a {"requests": [...]} body
+        body = args[0] if args else (kwargs or {}).get("body")
+        if isinstance(body, dict):
+            return not any(STRUCTURAL_REQUESTS & set(request) for request in body.get("requests", []))
+    return True
+
+
+def is_retryable(error, idempotent=True):
+    if isinstance(error, (ConnectionError, Timeout)):
+        return idempotent
+    if isinstance(error, APIError):
+        response = getattr(error, "response", None)
+        code = getattr(response, "status_code", None) or getattr(error, "code", None)
+        return code == 429 or (idempotent and isinstance(code, int) and code >= 500)
+    return False
+
+
+class TokenBucket:
+    """Refills `per_minute` tokens a minute; background callers leave a reserve for interactive ones."""
+
+    def __init__(self, per_minute, reserve=INTERACTIVE_RESERVE):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.reserve = self.capacity * reserve
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+        self._granted = deque()   # monotonic times of the last minute's grants
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        while self._granted and now - self._granted[0] > 60:
+            self._granted.popleft()
+
+    def acquire(self, interactive=True):
+        # Blocks until a token is free; returns the seconds spent waiting
+        start = time.monotonic()
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    floor = 0.0 if interactive else self.reserve
+                    if self.tokens - floor >= 1 and (interactive or not self._interactive_waiting):
+                        self.tokens -= 1
+                        self._granted.append(now)
+                        return now - start
+                    self._cond.wait(max((floor + 1 - self.tokens) / self.rate, 0.05))
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def penalize(self):
+        # The API said no: drain the bucket so everyone slows down, not just this caller
+        with self._cond:
+            self._refill(time.monotonic())
+            self.tokens = 0.0
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            used = len(self._granted)
+            return {
+                "per_minute": int(self.capacity),
+                "available": round(self.tokens, 1),
+                "used_last_minute": used,
+                "used_pct": round(100 * used / self.capacity, 1) if self.capacity else None,
+            }
+
+
+class RequestScheduler:
+    """Paces Sheets calls against the read/write quotas and retries 429s and 5xx with jittered backoff."""
+
+    def __init__(self, reads_per_minute=None, writes_per_minute=None, max_retries=MAX_RETRIES):
+        reads_per_minute = reads_per_minute or int(os.environ.get(READS_PER_MINUTE_ENV, DEFAULT_PER_MINUTE))
+        writes_per_minute = writes_per_minute or int(os.environ.get(WRITES_PER_MINUTE_ENV, DEFAULT_PER_MINUTE))
+        self.buckets = {"read": TokenBucket(reads_per_minute), "write": TokenBucket(writes_per_minute)}
+        self.max_retries = max_retries
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "throttled": 0, "wait_seconds": 0.0, "retries": 0, "failures": 0}
+
+    def _count(self, field, n=1):
+        with self._lock:
+            self._stats[field] += n
+
+    def call(self, method, fn, *args, **kwargs):
+        bucket = self.buckets["write" if method in WRITE_METHODS else "read"]
+        interactive = not getattr(_local, "background", False)
+        idempotent = is_idempotent(method, args, kwargs)
+        attempt = 0
+        while True:
+            waited = bucket.acquire(interactive)
+            self._count("requests")
+            if waited > 0.001:
+                self._count("throttled")
+                self._count("wait_seconds", waited)
+                get_metrics().record("quota", "wait", waited * 1000)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                retryable = is_retryable(e, idempotent)
+                if not retryable or attempt >= self.max_retries:
+                    if retryable:
+                        self._count("failures")
+                    raise
+                bucket.penalize()
+                # Full jitter: sleep anywhere up to the exponential step
+                delay = self._random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                attempt += 1
+                self._count("retries")
+                get_metrics().record("quota", "backoff", delay * 1000)
+                time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, wait_seconds=round(self._stats["wait_seconds"], 2))
+        stats.update({name: bucket.stats() for name, bucket in self.buckets.items()})
+        return stats
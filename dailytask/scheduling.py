@@ -0,0 +1,88 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from dailytask.config import TIMEZONE
+
+BOOL_COLUMNS = ["done", "exempt", "locked", "missed"]
+# Night shift tasks due 00:00-06:59 fall on the day after the shift date
+NIGHT_ROLLOVER_MINUTES = 7 * 60
+
+
+@lru_cache(maxsize=512)
+def parse_due_time(due_time_str):
+    # '8.00AM' -> minutes after midnight, None if it does not parse
+    try:
+        t = datetime.strptime(str(due_time_str), "%I.%M%p").time()
+    except ValueError:
+        return None
+    return t.hour * 60 + t.minute
+
+
+@lru_cache(maxsize=512)
+def due_time_24hr(due_time_str):
+    # '8.00AM' -> '08:00', unparseable strings are shown as they are
+    minutes = parse_due_time(due_time_str)
+    return due_time_str if minutes is None else f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def to_bool(series):
+    # Sheets gives 'TRUE'/'FALSE' strings; SQLite and typed frames may already hold bools
+    return series.astype(str).str.upper().eq("TRUE")
+
+
+def schedule_tasks(tasks_df, shift_date, is_night_shift, now=None):
+    """Add due time, editability and sort order to a day's tasks in one pass.
+
+    Adds bool done/exempt/locked/missed, 'due minutes', 'task_datetime',
+    'due_24hr', 'is_editable' and 'past_locked', and sorts open tasks
+    first by due time.
+    """
+    tz = pytz.timezone(TIMEZONE)
+    now = now or datetime.now(tz)
+    df = tasks_df.copy()
+    if df.empty:
+        for col in ["due minutes", "task_datetime", "due_24hr", "is_editable", "past_locked"]:
+            df[col] = pd.Series(dtype=object)
+        return df
+
+    for col in BOOL_COLUMNS:
+        # Typed frames already hold bools
+        if df[col].dtype != bool:
+            df[col] = to_bool(df[col])
+
+    due = df["due time"].astype(str)
+    distinct = due.unique()
+    if "due minutes" in df:
+        # Parsed once when the frame was loaded
+        minutes = df["due minutes"].astype("float64")
+    else:
+        # Parse each distinct time string once; the memo carries over between renders
+        minutes = due.map({s: parse_due_time(s) for s in distinct}).astype("float64")
+
+    day_offset = np.where(is_night_shift & (minutes < NIGHT_ROLLOVER_MINUTES), 1, 0)
+    naive = (
+        pd.Timestamp(shift_date)
+        + pd.to_timedelta(day_offset, unit="D")
+        + pd.to_timedelta(minutes, unit="m")
+    )
+    task_datetime = pd.Series(naive, index=df.index).dt.tz_localize(
+        tz, ambiguous=False, nonexistent="shift_forward"
+    )
+
+    now_ts = pd.Timestamp(now)
+    locked = df["locked"].to_numpy()
+    # Unparseable times are NaT: never editable, sorted last
+    before_due = (task_datetime > now_ts).to_numpy()
+    past_due = (task_datetime < now_ts).to_numpy()
+
+    df["due minutes"] = minutes
+    df["task_datetime"] = task_datetime
+    df["due_24hr"] = due.map({s: due_time_24hr(s) for s in distinct})
+    df["is_editable"] = before_due & ~locked
+    df["past_locked"] = (past_due | locked).astype(int)
+
+    return df.sort_values(["past_locked", "task_datetime"], kind="stable", na_position="last")
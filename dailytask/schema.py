@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from dailytask.scheduling import BOOL_COLUMNS, parse_due_time, to_bool
+from dailytask.storage.base import DAILY_TASK_COLUMNS, USER_TASK_COLUMNS, USERS_COLUMNS
+
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SchemaError(ValueError):
+    """A worksheet's header is missing columns the app reads."""
+
+
+class Schema:
+    """Column types for one worksheet, applied once when its values are loaded.
+
+    Repeated text becomes categorical, TRUE/FALSE cells bools, dates
+    datetime64 (blank or malformed cells NaT) and due times gain a parsed
+    'due minutes' column. Columns not named here stay strings.
+    """
+
+    def __init__(self, worksheet, columns, categories=(), bools=(), dates=None, due_time=None):
+        self.worksheet = worksheet
+        self.columns = list(columns)
+        self.categories = list(categories)
+        self.bools = list(bools)
+        self.dates = dict(dates or {})  # column -> strptime format
+        self.due_time = due_time
+
+    def check(self, header):
+        missing = [c for c in self.columns if c not in header]
+        if missing:
+            raise SchemaError(f"{self.worksheet} is missing columns: {', '.join(missing)} (found: {', '.join(header)})")
+
+    def apply(self, df):
+        # Already-typed columns pass through, so frames can be typed again after a concat
+        if df.columns.empty:
+            df = pd.DataFrame(columns=self.columns)
+        self.check(list(df.columns))
+        df = df.copy()
+        for column in self.categories:
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(str).astype("category")
+        for column in self.bools:
+            if df[column].dtype != bool:
+                df[column] = to_bool(df[column])
+        for column, fmt in self.dates.items():
+            if not pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = pd.to_datetime(df[column].astype(str), format=fmt, errors="coerce")
+        if self.due_time and "due minutes" not in df:
+            due = df[self.due_time]
+            # Each distinct time string once
+            df["due minutes"] = due.map({s: parse_due_time(s) for s in due.unique()}).astype("float32")
+        return df
+
+
+SCHEMAS = {
+    # Emails are unique here, so only the repeated Role and Status are worth categories
+    "Users": Schema("Users", USERS_COLUMNS, categories=["Role", "Status"]),
+    "user-task": Schema("user-task", USER_TASK_COLUMNS, categories=["login", "role"], dates={"date": DATE_FORMAT}),
+    "user-daily-task": Schema(
+        "user-daily-task", DAILY_TASK_COLUMNS,
+        categories=["Email", "Name", "role", "task", "exempt reason", "due time"],
+        bools=BOOL_COLUMNS,
+        dates={"task create Date": DATE_FORMAT, "task closed Date": DATETIME_FORMAT},
+        due_time="due time",
+    ),
+}
+
+
+def typed(worksheet, df):
+    # Worksheets without a schema (the role templates) come back as they are
+    schema = SCHEMAS.get(worksheet)
+    return schema.apply(df) if schema else df
+
+
+def check_header(worksheet, header):
+    schema = SCHEMAS.get(worksheet)
+    if schema and header:
+        schema.check(header)
+
+
+def concat(worksheet, frames):
+    # Categoricals with different categories concat to object; typing again restores them
+    frames = [typed(worksheet, f) for f in frames if not f.empty]
+    if not frames:
+        return typed(worksheet, pd.DataFrame())
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    return typed(worksheet, pd.concat(frames, ignore_index=True))
+
+
+def row_keys(df):
+    # {row id: (email, shift date, role, task)} of daily task rows: the task each row id held when read
+    dates = df["task create Date"]
+    dates = date_strings(dates) if pd.api.types.is_datetime64_any_dtype(dates) else dates.astype(str)
+    return {
+        row_id: (str(email), date, str(role), str(task))
+        for row_id, email, date, role, task in zip(df.index, df["Email"], dates, df["role"], df["task"])
+    }
+
+
+def date_strings(series, fmt=DATE_FORMAT):
+    # Each distinct date formatted once; NaT becomes ''
+    codes, uniques = pd.factorize(series)
+    labels = np.append(pd.DatetimeIndex(uniques).strftime(fmt).to_numpy(dtype=object), "")
+    return pd.Series(labels[codes], index=series.index)
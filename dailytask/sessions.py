@@ -0,0 +1,176 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+import streamlit as st
+
+# Cookie that carries each app's token, so a browser reload keeps the session. Never in the URL:
+# a copied link logs nobody in
+COOKIE_PREFIX = "dailytask-session-"
+SECRET_ENV = "DAILYTASK_SESSION_SECRET"
+DEFAULT_LIFETIME = 600
+# Re-sign at most this often; the token's expiry trails the last interaction by the lifetime
+REISSUE_AFTER = 60
+_CLAIMS = "session_claims"
+_PENDING = "session_cookie_pending"
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def fingerprint(password_hash):
+    # Changes whenever the password is reset or set again, which ends every session issued before
+    return _b64(hashlib.sha256(str(password_hash).encode()).digest()[:12])
+
+
+class SessionSigner:
+    """HMAC-signed, expiring login tokens checked without a bcrypt round or a Sheets read."""
+
+    def __init__(self, secret):
+        self._key = hashlib.sha256(secret.encode() if isinstance(secret, str) else secret).digest()
+
+    def _sign(self, body):
+        return _b64(hmac.new(self._key, body.encode(), hashlib.sha256).digest())
+
+    def issue(self, email, role, password_fingerprint, lifetime=DEFAULT_LIFETIME, now=None):
+        now = time.time() if now is None else now
+        claims = {"email": email, "role": role, "pwd": password_fingerprint, "iat": now, "exp": now + lifetime}
+        body = _b64(json.dumps(claims, separators=(",", ":")).encode())
+        return f"{body}.{self._sign(body)}"
+
+    def claims(self, token, role, now=None):
+        # The token's claims if it is genuine, unexpired and for this app; otherwise None
+        if not token or token.count(".") != 1:
+            return None
+        body, signature = token.split(".")
+        if not hmac.compare_digest(signature, self._sign(body)):
+            return None
+        try:
+            claims = json.loads(_unb64(body))
+        except ValueError:
+            return None
+        now = time.time() if now is None else now
+        if claims.get("role") != role or claims.get("exp", 0) < now:
+            return None
+        return claims
+
+
+def still_valid(claims, users):
+    """Whether the user behind `claims` is still as they were when it was issued.
+
+    Both apps read the same Users sheet, so deleting a user, setting them
+    inactive, changing their role or resetting their password revokes their
+    sessions in either app, with no store of its own.
+    """
+    user = users[users["Email"].astype(str).str.lower() == str(claims.get("email", "")).lower()]
+    if user.empty:
+        return False
+    user = user.iloc[0]
+    return (
+        str(user["Role"]).lower() == claims.get("role")
+        and str(user["Status"]).lower() == "active"
+        and fingerprint(user["Password"]) == claims.get("pwd")
+    )
+
+
+def _secret():
+    if os.environ.get(SECRET_ENV):
+        return os.environ[SECRET_ENV]
+    try:
+        return st.secrets.get("session_secret")
+    except Exception:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_signer():
+    # Without a configured secret there are no tokens: a login lasts as long as its browser session
+    secret = _secret()
+    return SessionSigner(secret) if secret else None
+
+
+def _cookie(role):
+    return f"{COOKIE_PREFIX}{role}"
+
+
+def _restored(role):
+    return f"session_restored_{role}"
+
+
+def _set_cookie(name, value, max_age):
+    # Streamlit has no response to put a Set-Cookie header on; the page sets it instead
+    st.html(
+        "<script>document.cookie = "
+        f"{json.dumps(f'{name}={value}; path=/; max-age={int(max_age)}; SameSite=Strict')}"
+        " + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True,
+    )
+
+
+def restore(role, users_for):
+    """Email from a valid session cookie, checked once as the browser session starts; otherwise None.
+
+    Called at the top of every run. users_for(email) returns the Users frame of that user's site.
+    """
+    # A login or logout ends in st.rerun before its page draws, so its cookie is set on the next run
+    pending = st.session_state.pop(_PENDING, None)
+    if pending:
+        _set_cookie(_cookie(role), *pending)
+    if st.session_state.get(_restored(role)):
+        return None
+    st.session_state[_restored(role)] = True
+    signer = get_signer()
+    if signer is None:
+        return None
+    claims = signer.claims(st.context.cookies.get(_cookie(role)), role)
+    if claims and still_valid(claims, users_for(claims["email"])):
+        st.session_state[_CLAIMS] = claims
+        return claims["email"]
+    return None
+
+
+def valid(users):
+    # Checked on every rerun, so an admin's change ends a live session too
+    claims = st.session_state.get(_CLAIMS)
+    return claims is None or still_valid(claims, users)
+
+
+def remember(email, role, password_hash=None, lifetime=DEFAULT_LIFETIME):
+    # With password_hash after a successful login; without it on every authenticated rerun, re-signing
+    # the cookie at most every REISSUE_AFTER seconds
+    signer = get_signer()
+    if signer is None:
+        return
+    if password_hash is not None:
+        st.session_state[_PENDING] = (_issue(signer, email, role, fingerprint(password_hash), lifetime), lifetime)
+        return
+    claims = st.session_state.get(_CLAIMS)
+    if not claims or claims["email"] != email or claims["role"] != role:
+        return
+    if time.time() - claims["iat"] >= REISSUE_AFTER:
+        _set_cookie(_cookie(role), _issue(signer, email, role, claims["pwd"], lifetime), lifetime)
+
+
+def _issue(signer, email, role, password_fingerprint, lifetime):
+    token = signer.issue(email, role, password_fingerprint, lifetime)
+    st.session_state[_CLAIMS] = signer.claims(token, role)
+    return token
+
+
+def forget(role):
+    # Call after any st.session_state.clear(): the browser still sends the old cookie until the
+    # session ends, so restoring from it is switched off as well as the cookie being cleared
+    st.session_state.pop(_CLAIMS, None)
+    st.session_state[_restored(role)] = True
+    if get_signer() is not None:
+        # Set now for a page that draws, and again on the next run in case this one ends in st.rerun
+        _set_cookie(_cookie(role), "", 0)
+        st.session_state[_PENDING] = ("", 0)
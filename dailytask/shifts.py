@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from dailytask.config import TIMEZONE
+
+
+def get_shift_date(role=None):
+    tz = pytz.timezone(TIMEZONE)
+    now = datetime.now(tz)
+    today = now.date()
+    
+    if role and "NS" in role:
+        return today - timedelta(days=1) if now.time() < datetime.strptime("07:00", "%H:%M").time() else today
+    return today
+
+
+def hot_from_date(today=None):
+    # Earliest shift date the hot worksheet keeps: the previous shift date of a night shift
+    today = today or datetime.now(pytz.timezone(TIMEZONE)).date()
+    return today - timedelta(days=2)
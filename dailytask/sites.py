@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from dailytask.config import SPREADSHEET_NAME
+
+# "LCY3=dailytaskDB,MAN1=dailytaskDB-MAN1": each site code and its own spreadsheet.
+# The first site is the original shard; the others get their own SQLite file and archive.
+SITES_ENV = "DAILYTASK_SITES"
+# The site this deployment opens before anyone logs in; the first site by default
+SITE_ENV = "DAILYTASK_SITE"
+DEFAULT_SITE = "LCY3"
+# An email no site knows re-reads every site's Users at most this often
+DIRECTORY_REFRESH_SECONDS = 60
+MAX_FAN_OUT = 8
+
+Site = namedtuple("Site", ["code", "spreadsheet"])
+
+
+def parse_sites(text):
+    sites = OrderedDict()
+    for item in (text or "").split(","):
+        code, _, spreadsheet = item.partition("=")
+        code = code.strip().upper()
+        if code:
+            sites[code] = Site(code, spreadsheet.strip() or f"{SPREADSHEET_NAME}-{code}")
+    return sites
+
+
+def registry():
+    # A single LCY3 site on the original spreadsheet unless sites are configured
+    return parse_sites(os.environ.get(SITES_ENV)) or OrderedDict([(DEFAULT_SITE, Site(DEFAULT_SITE, SPREADSHEET_NAME))])
+
+
+def is_primary(site):
+    return site.code == next(iter(registry()))
+
+
+def site_codes(selected=None):
+    # The CLIs' --site arguments, or every registered site
+    return [get_site(code).code for code in selected] if selected else list(registry())
+
+
+def get_site(code=None):
+    sites = registry()
+    if code is None:
+        code = os.environ.get(SITE_ENV) or next(iter(sites))
+    code = code.strip().upper()
+    if code not in sites:
+        raise ValueError(f"Unknown site: {code} (known: {', '.join(sites)})")
+    return sites[code]
+
+
+class SiteRouter:
+    """Which site's shard each user lives in, and calls fanned out across every shard."""
+
+    def __init__(self, storage_for, sites=None):
+        self.storage_for = storage_for  # site code -> Storage
+        self.sites = list(sites or registry())
+        self._lock = threading.Lock()
+        self._directory = {}  # lower-cased email -> site code
+        self._built_at = 0.0
+        self._stats = {"lookups": 0, "directory_builds": 0, "errors": {}}
+
+    def site_for(self, email):
+        # The first site whose Users sheet has the email; None if no site has it
+        if len(self.sites) == 1:
+            return self.sites[0]
+        email = email.lower()
+        with self._lock:
+            self._stats["lookups"] += 1
+            site = self._directory.get(email)
+            if site is None and time.monotonic() - self._built_at > DIRECTORY_REFRESH_SECONDS:
+                self._build()
+                site = self._directory.get(email)
+            return site
+
+    def _build(self):
+        # Every Users sheet at once; each is the cached snapshot the login then checks
+        emails, errors = self.fan_out(lambda storage: storage.users()["Email"].tolist())
+        directory = {}
+        for code in self.sites:
+            for email in emails.get(code, []):
+                directory.setdefault(email.lower(), code)
+        self._directory = directory
+        self._built_at = time.monotonic()
+        self._stats["directory_builds"] += 1
+        self._stats["errors"] = errors
+
+    def fan_out(self, fn, sites=None):
+        """fn(storage) for every site in parallel: ({site: result}, {site: error}).
+
+        A shard that fails is reported rather than failing the others.
+        """
+        codes = list(sites or self.sites)
+        # Resolved on the calling thread, where Streamlit's resource cache lives
+        storages = {code: self.storage_for(code) for code in codes}
+        results, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=min(len(codes), MAX_FAN_OUT) or 1) as executor:
+            futures = {code: executor.submit(fn, storages[code]) for code in codes}
+            for code, future in futures.items():
+                try:
+                    results[code] = future.result()
+                except Exception as e:
+                    errors[code] = f"{type(e).__name__}: {e}"
+        return results, errors
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, sites=self.sites, directory=len(self._directory))
+
+
+@st.cache_resource(show_spinner=False)
+def get_router():
+    from dailytask.storage import get_storage
+
+    return SiteRouter(get_storage)
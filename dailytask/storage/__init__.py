@@ -0,0 +1,57 @@
+import os
+
+import streamlit as st
+
+from dailytask.archive import ARCHIVE_DIR_ENV, LocalArchive
+from dailytask.sites import get_site, is_primary
+from dailytask.storage.base import Storage
+
+# "sheets" (default) or "sqlite" for offline runs, tests and benchmarks
+BACKEND_ENV = "DAILYTASK_BACKEND"
+SQLITE_PATH_ENV = "DAILYTASK_SQLITE_PATH"
+
+
+def _site_archive(site):
+    # Sites after the first keep their archive in a subdirectory of their own
+    directory = os.environ.get(ARCHIVE_DIR_ENV)
+    if directory and not is_primary(site):
+        return LocalArchive(os.path.join(directory, site.code))
+    return None
+
+
+def create_storage(backend=None, site=None):
+    """Storage for one site's shard; site=None is this deployment's own site."""
+    backend = (backend or os.environ.get(BACKEND_ENV) or "sheets").lower()
+    site = get_site(site)
+    if backend == "sqlite":
+        from dailytask.storage.sqlite import SQLiteStorage
+
+        path = os.environ.get(SQLITE_PATH_ENV, "dailytask.db")
+        if not is_primary(site):
+            root, ext = os.path.splitext(path)
+            path = f"{root}-{site.code.lower()}{ext}"
+        storage = SQLiteStorage(path, archive=_site_archive(site))
+    elif backend == "sheets":
+        from dailytask.storage.sheets import SheetsStorage
+
+        storage = SheetsStorage(archive=_site_archive(site), spreadsheet_name=site.spreadsheet)
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    storage.site = site.code
+    return storage
+
+
+@st.cache_resource(show_spinner=False)
+def _storage_for(site_code):
+    from dailytask.journal import journaled
+
+    # The apps' saves go through a local write-ahead journal; the CLIs write straight through
+    return journaled(create_storage(site=site_code))
+
+
+def get_storage(site=None):
+    # One storage per site and process, whether asked for by code or as the default
+    return _storage_for(get_site(site).code)
+
+
+__all__ = ["Storage", "create_storage", "get_storage"]
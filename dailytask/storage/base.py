@@ -0,0 +1,177 @@
+import hashlib
+import json
+
+import numpy as np
+
+USERS_COLUMNS = ["Email", "Password", "Role", "Status"]
+USER_TASK_COLUMNS = (
+    ["login", "date", "role"]
+    + [f"task {n}" for n in range(1, 17)]
+    + [f"task {n} emoji" for n in range(1, 17)]
+)
+DAILY_TASK_COLUMNS = [
+    "Email", "Name", "task create Date", "task closed Date", "role", "task",
+    "done", "exempt", "exempt reason", "locked", "missed", "due time",
+]
+TEMPLATE_COLUMNS = ["task", "time"]
+
+
+class TemplateConflict(RuntimeError):
+    """A role template was saved by someone else after it was fetched for editing."""
+
+
+def template_frame(frame):
+    # Just the task and time columns, as text, whatever the frame came from
+    return frame.reindex(columns=TEMPLATE_COLUMNS).fillna("").astype(str)
+
+
+def template_rows(frame):
+    # [[task, time], ...] without blank rows: what a template holds, however its sheet is laid out
+    text = template_frame(frame)
+    return text[(text != "").any(axis=1)].to_numpy().tolist()
+
+
+def template_version(rows):
+    # Content hash of a template, taken when an admin fetches it and checked again on save
+    return hashlib.sha1(json.dumps(rows).encode("utf-8")).hexdigest()[:16]
+
+
+def template_writes(current, rows):
+    """(position, [task, time]) for every stored row that differs from `rows`, compared in one pass.
+
+    Positions past the end of `rows` come back blank; the caller blanks or drops them.
+    """
+    before = template_frame(current).to_numpy(dtype=object)
+    after = np.array(rows, dtype=object).reshape(-1, len(TEMPLATE_COLUMNS))
+    length = max(len(before), len(after))
+    before = np.vstack([before, np.full((length - len(before), len(TEMPLATE_COLUMNS)), "", dtype=object)])
+    after = np.vstack([after, np.full((length - len(after), len(TEMPLATE_COLUMNS)), "", dtype=object)])
+    changed = np.flatnonzero((before != after).any(axis=1))
+    return [(int(position), after[position].tolist()) for position in changed]
+
+
+class Storage:
+    """Everything the two apps read and write.
+
+    Users, user-task and user-daily-task frames come back typed by
+    dailytask.schema: categorical text, bool flags, datetime64 dates.
+    Other frames hold the strings the spreadsheet shows. Daily task frames
+    are indexed by a row id that close_daily_tasks accepts back, along with
+    the row's key so a row that has moved since it was read is not
+    overwritten.
+    """
+
+    name = "base"
+    # Site code of the shard this storage serves; set by create_storage
+    site = None
+
+    # --- Users ---
+    def users(self):
+        raise NotImplementedError
+
+    def add_user(self, email, role, status=""):
+        raise NotImplementedError
+
+    def set_password(self, email, password_hash):
+        raise NotImplementedError
+
+    def set_status(self, email, status):
+        raise NotImplementedError
+
+    def delete_user(self, email):
+        raise NotImplementedError
+
+    # Bulk versions: one read and one write however many users; they return how many were touched
+    def add_users(self, users):
+        # users: [(email, role, status)]; emails already present are skipped
+        raise NotImplementedError
+
+    def set_passwords(self, emails, password_hash):
+        raise NotImplementedError
+
+    def set_statuses(self, emails, status):
+        raise NotImplementedError
+
+    def delete_users(self, emails):
+        raise NotImplementedError
+
+    # --- Eisenhower matrix (user-task) ---
+    def eisenhower_tasks(self, login):
+        raise NotImplementedError
+
+    def add_eisenhower_tasks(self, row):
+        raise NotImplementedError
+
+    def upsert_eisenhower_tasks(self, login, row):
+        # Overwrite the login's row in place or append it; True if it already existed
+        raise NotImplementedError
+
+    # --- Daily task instances (user-daily-task) ---
+    def role_for_day(self, email, shift_date):
+        raise NotImplementedError
+
+    def daily_tasks(self, email, shift_date, role):
+        raise NotImplementedError
+
+    def daily_tasks_on(self, shift_dates):
+        # Every user's rows for these shift dates, indexed by row id
+        raise NotImplementedError
+
+    def add_daily_tasks(self, rows):
+        raise NotImplementedError
+
+    def close_daily_tasks(self, updates, keys=None):
+        # updates: [(row id, done, exempt, reason, closed at)], written in one batch.
+        # keys: {row id: (email, shift date, role, task)} as the caller read the row (schema.row_keys).
+        # A row id that no longer holds its task is found again by key or skipped, never overwritten.
+        # Ids the caller has no key for are checked against the backend's own idea of the row.
+        # Returns {"closed": ..., "moved": ..., "dropped": ..., "dropped_rows": [row ids not written]}
+        raise NotImplementedError
+
+    def delete_daily_tasks(self, row_ids, keys=None):
+        # Remove rows, checked against keys as close_daily_tasks does; returns how many were deleted
+        raise NotImplementedError
+
+    def lock_daily_tasks(self, row_ids, keys=None):
+        # Lock rows whose due time has passed, marking missed the ones neither done nor exempt as
+        # stored now. Rows already locked (saved meanwhile) are left alone; returns how many were locked
+        raise NotImplementedError
+
+    def daily_task_keys(self, row_ids):
+        # {row id: (email, shift date, role, task)} for the ids still present, without a round trip
+        raise NotImplementedError
+
+    def close_daily_task(self, row_id, done, exempt, reason, closed_at, key=None):
+        return self.close_daily_tasks([(row_id, done, exempt, reason, closed_at)], {row_id: key} if key else None)
+
+    def archive_daily_tasks(self, before):
+        # Move rows with a shift date before `before` to the archive; returns how many moved
+        raise NotImplementedError
+
+    def daily_task_history(self, start=None, end=None, email=None, role=None):
+        # Hot rows and archived rows in one frame
+        raise NotImplementedError
+
+    def read_chunks(self, sheet_name, chunk_rows=5000):
+        # A hot sheet (user-daily-task or user-task) as string frames of at most chunk_rows rows, uncached
+        raise NotImplementedError
+
+    # --- Role templates ---
+    def role_template(self, sheet_name):
+        raise NotImplementedError
+
+    def save_role_template(self, sheet_name, rows, version):
+        # rows: the whole template as [[task, time], ...]. Raises TemplateConflict unless the
+        # stored template still has `version`; returns the version of the saved one.
+        raise NotImplementedError
+
+    def prefetch(self, worksheets):
+        # Load everything a render is about to read in one go; backends with cheap reads skip it
+        pass
+
+    def refresh(self):
+        # Drop any cached reads so the next render sees the latest users and tasks
+        pass
+
+    def stats(self):
+        return {"backend": self.name}
@@ -0,0 +1,419 @@
+import os
+
+from gspread.utils import rowcol_to_a1
+
+from dailytask import schema
+from dailytask.archive import (
+    ARCHIVE_DIR_ENV, DATE_COLUMN, LocalArchive, SheetArchive, archivable, filter_history, worksheet_chunks,
+)
+from dailytask.batching import WriteBatch, get_coalescer
+from dailytask.cache import DEFAULT_POLICY, DELTA_SHEETS, frame_from_values, get_cache, invalidate, load_keyed, load_snapshot
+from dailytask.config import SPREADSHEET_NAME
+from dailytask.connection import get_pool
+from dailytask.delta import appended_at, get_delta_snapshot, quoted
+from dailytask.index import DAILY_TASK_SHEET, daily_task_index, get_daily_task_index
+from dailytask.storage.base import (
+    TEMPLATE_COLUMNS, Storage, TemplateConflict, template_rows, template_version, template_writes,
+)
+
+USERS_SHEET = "Users"
+USER_TASK_SHEET = "user-task"
+# What a daily task row holds, as schema.row_keys gives it: rows are found by these, not by position
+KEY_COLUMNS = ("Email", DATE_COLUMN, "role", "task")
+
+
+def _is_true(cell):
+    return str(cell).upper() == "TRUE"
+
+
+def _runs(row_numbers):
+    # [2, 3, 4, 9, 10] -> [(2, 4), (9, 10)]
+    runs = []
+    for n in sorted(row_numbers):
+        if runs and n == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], n)
+        else:
+            runs.append((n, n))
+    return runs
+
+
+class SheetsStorage(Storage):
+    name = "sheets"
+
+    def __init__(self, pool=None, archive=None, spreadsheet_name=SPREADSHEET_NAME):
+        self._pool = pool
+        self._archive = archive
+        # Caches, index and snapshots are kept per spreadsheet, so sites never share them
+        self.spreadsheet_name = pool.spreadsheet_name if pool is not None else spreadsheet_name
+
+    @property
+    def pool(self):
+        return self._pool or get_pool(self.spreadsheet_name)
+
+    def worksheet(self, name):
+        return self.pool.worksheet(name)
+
+    @property
+    def archive(self):
+        if self._archive is None:
+            directory = os.environ.get(ARCHIVE_DIR_ENV)
+            self._archive = LocalArchive(directory) if directory else SheetArchive(self.pool)
+        return self._archive
+
+    # --- Users ---
+    def users(self):
+        return load_snapshot(USERS_SHEET, self.spreadsheet_name)
+
+    def _user_rows(self, sheet):
+        # One column read instead of get_all_records: lower-cased email -> sheet row
+        emails = sheet.col_values(1)
+        rows = {}
+        for row_number, value in enumerate(emails[1:], start=2):  # row 1 is the header
+            rows.setdefault(value.lower(), row_number)
+        return rows
+
+    def add_user(self, email, role, status=""):
+        sheet = self.worksheet(USERS_SHEET)
+        sheet.append_row([email, "", role] + ([status] if status else []))
+        invalidate(USERS_SHEET, spreadsheet_name=self.spreadsheet_name)
+
+    def add_users(self, users):
+        sheet = self.worksheet(USERS_SHEET)
+        existing = self._user_rows(sheet)
+        rows = []
+        for email, role, status in users:
+            if email.lower() not in existing:
+                existing[email.lower()] = None
+                rows.append([email, "", role, status])
+        if rows:
+            sheet.append_rows(rows)
+            invalidate(USERS_SHEET, spreadsheet_name=self.spreadsheet_name)
+        return len(rows)
+
+    def _set_user_cells(self, emails, col, value):
+        sheet = self.worksheet(USERS_SHEET)
+        existing = self._user_rows(sheet)
+        row_numbers = {existing[e.lower()] for e in emails if e.lower() in existing}
+        if not row_numbers:
+            return 0
+        batch = WriteBatch(sheet)
+        for row_number in row_numbers:
+            batch.update_cell(row_number, col, value)
+        batch.flush()
+        invalidate(USERS_SHEET, spreadsheet_name=self.spreadsheet_name)
+        return len(row_numbers)
+
+    def set_password(self, email, password_hash):
+        return self.set_passwords([email], password_hash) > 0
+
+    def set_passwords(self, emails, password_hash):
+        return self._set_user_cells(emails, 2, password_hash)
+
+    def set_status(self, email, status):
+        return self.set_statuses([email], status) > 0
+
+    def set_statuses(self, emails, status):
+        return self._set_user_cells(emails, 4, status)
+
+    def delete_user(self, email):
+        return self.delete_users([email]) > 0
+
+    def delete_users(self, emails):
+        sheet = self.worksheet(USERS_SHEET)
+        existing = self._user_rows(sheet)
+        row_numbers = {existing[e.lower()] for e in emails if e.lower() in existing}
+        if not row_numbers:
+            return 0
+        self._delete_rows(sheet, row_numbers)
+        invalidate(USERS_SHEET, spreadsheet_name=self.spreadsheet_name)
+        return len(row_numbers)
+
+    def _delete_rows(self, sheet, row_numbers):
+        # Bottom-up so earlier deletes do not shift the later ranges, all in one request
+        self.pool.spreadsheet.batch_update({"requests": [
+            {"deleteDimension": {"range": {
+                "sheetId": sheet.id, "dimension": "ROWS", "startIndex": start - 1, "endIndex": end,
+            }}}
+            for start, end in reversed(_runs(row_numbers))
+        ]})
+
+    # --- Eisenhower matrix ---
+    def eisenhower_tasks(self, login):
+        return load_keyed(USER_TASK_SHEET, "login", login, self.spreadsheet_name)
+
+    def add_eisenhower_tasks(self, row):
+        response = self.worksheet(USER_TASK_SHEET).append_row(row)
+        get_delta_snapshot(USER_TASK_SHEET, self.spreadsheet_name).appended([[str(v) for v in row]], appended_at(response))
+        invalidate(USER_TASK_SHEET, key=row[0], spreadsheet_name=self.spreadsheet_name)
+
+    def _user_task_rows(self):
+        # login -> sheet row of its first row, from a delta read so rows deleted elsewhere are noticed
+        values = get_delta_snapshot(USER_TASK_SHEET, self.spreadsheet_name).read(max_age=0)
+        rows = {}
+        for row_number, row in enumerate(values[1:], start=2):  # row 1 is the header
+            if row:
+                rows.setdefault(row[0], row_number)  # login is in the first column
+        return rows
+
+    def upsert_eisenhower_tasks(self, login, row):
+        row_number = self._user_task_rows().get(login)
+        if row_number is None:
+            self.add_eisenhower_tasks(row)
+            return False
+        # The whole row in place with one range update; the row keeps its position
+        self.worksheet(USER_TASK_SHEET).update(
+            values=[row], range_name=f"A{row_number}:{rowcol_to_a1(row_number, len(row))}"
+        )
+        get_delta_snapshot(USER_TASK_SHEET, self.spreadsheet_name).changed(row_number, [str(v) for v in row])
+        invalidate(USER_TASK_SHEET, key=login, spreadsheet_name=self.spreadsheet_name)
+        return True
+
+    # --- Daily task instances ---
+    def role_for_day(self, email, shift_date):
+        return daily_task_index(self.spreadsheet_name).role_for(email, shift_date)
+
+    def daily_tasks(self, email, shift_date, role):
+        # Indexed by absolute sheet row number
+        return daily_task_index(self.spreadsheet_name).rows(email, shift_date, role)
+
+    def daily_tasks_on(self, shift_dates):
+        return daily_task_index(self.spreadsheet_name).frame(shift_dates)
+
+    def add_daily_tasks(self, rows):
+        if not rows:
+            return
+        response = self.worksheet(DAILY_TASK_SHEET).append_rows(rows)
+        daily_task_index(self.spreadsheet_name).appended(rows, response)
+        invalidate(DAILY_TASK_SHEET, spreadsheet_name=self.spreadsheet_name)
+
+    def daily_task_keys(self, row_ids):
+        # From the index as last synced, so it answers while Sheets is unreachable
+        return get_daily_task_index(self.spreadsheet_name).keys(row_ids)
+
+    def _current_rows(self, row_ids, keys=None):
+        """{row id: (sheet row, cells)} for rows still holding the task `keys` says, plus a summary.
+
+        Row ids are sheet rows, which archiving in any process shifts, and the
+        index of another process can be up to SYNC_SECONDS behind. So the rows
+        are read back just before writing; one no longer holding its task is
+        looked up by key in a full re-read, and left out if it is gone.
+        """
+        index = daily_task_index(self.spreadsheet_name)
+        row_ids = list(dict.fromkeys(row_ids))
+        keys = dict(keys or {})
+        unknown = [row_id for row_id in row_ids if row_id not in keys]
+        if unknown:
+            # Ids the caller recorded no key for are taken as this process's index has them now
+            keys.update(index.keys(unknown))
+        key_columns = [index.header.index(c) for c in KEY_COLUMNS]
+        last_col = rowcol_to_a1(1, len(index.header)).rstrip("0123456789")
+        name = quoted(DAILY_TASK_SHEET)
+        value_ranges = self.pool.spreadsheet.values_batch_get(
+            [f"{name}!A{n}:{last_col}{n}" for n in row_ids]
+        ).get("valueRanges", [])
+        rows, missing = {}, []
+        for row_id, value_range in zip(row_ids, value_ranges):
+            cells = (value_range.get("values") or [[]])[0]
+            cells = cells + [""] * (len(index.header) - len(cells))
+            key = keys.get(row_id)
+            if key is not None and tuple(cells[c] for c in key_columns) == tuple(key):
+                rows[row_id] = (row_id, cells)
+            else:
+                missing.append(row_id)
+        summary = {"moved": 0, "dropped": 0, "dropped_rows": []}
+        if missing:
+            # Rows moved since these ids were handed out: start over from the whole sheet
+            index.build()
+            invalidate(DAILY_TASK_SHEET, spreadsheet_name=self.spreadsheet_name)
+            claimed = {row_number for row_number, _ in rows.values()}
+            for row_id in missing:
+                found = index.locate(keys[row_id], claimed) if row_id in keys else None
+                if found is None:
+                    summary["dropped"] += 1
+                    summary["dropped_rows"].append(row_id)
+                    continue
+                rows[row_id] = found
+                claimed.add(found[0])
+                summary["moved"] += 1
+        return rows, summary
+
+    def close_daily_tasks(self, updates, keys=None):
+        if not updates:
+            return {"closed": 0, "moved": 0, "dropped": 0, "dropped_rows": []}
+        rows, summary = self._current_rows([u[0] for u in updates], keys)
+        closed = [
+            (rows[row_id][0], done, exempt, reason, closed_at)
+            for row_id, done, exempt, reason, closed_at in updates if row_id in rows
+        ]
+        batch = WriteBatch(self.worksheet(DAILY_TASK_SHEET))
+        for row_number, done, exempt, reason, closed_at in closed:
+            missed = not done and not exempt
+            batch.update_cell(row_number, 4, closed_at)
+            batch.update(f"G{row_number}:K{row_number}", [[done, exempt, reason, True, missed]])
+        batch.flush(get_coalescer(self.spreadsheet_name))
+
+        index = get_daily_task_index(self.spreadsheet_name)
+        for row_number, done, exempt, reason, closed_at in closed:
+            index.updated(row_number, {
+                "task closed Date": closed_at, "done": done, "exempt": exempt,
+                "exempt reason": reason, "locked": True, "missed": not done and not exempt,
+            })
+        invalidate(DAILY_TASK_SHEET, spreadsheet_name=self.spreadsheet_name)
+        return dict(summary, closed=len(closed))
+
+    def delete_daily_tasks(self, row_ids, keys=None):
+        if not row_ids:
+            return 0
+        rows, _ = self._current_rows(row_ids, keys)
+        if not rows:
+            return 0
+        self._delete_rows(self.worksheet(DAILY_TASK_SHEET), [row_number for row_number, _ in rows.values()])
+        # Row numbers shifted
+        get_daily_task_index(self.spreadsheet_name).build()
+        invalidate(DAILY_TASK_SHEET, spreadsheet_name=self.spreadsheet_name)
+        return len(rows)
+
+    def lock_daily_tasks(self, row_ids, keys=None):
+        if not row_ids:
+            return 0
+        rows, _ = self._current_rows(row_ids, keys)
+        index = get_daily_task_index(self.spreadsheet_name)
+        column = {name: index.header.index(name) for name in ("done", "exempt", "locked")}
+        batch = WriteBatch(self.worksheet(DAILY_TASK_SHEET))
+        locked = []
+        for row_number, cells in rows.values():
+            # Read back just now: a save that landed since the sweep read the shift is kept
+            if _is_true(cells[column["locked"]]):
+                continue
+            missed = not _is_true(cells[column["done"]]) and not _is_true(cells[column["exempt"]])
+            # Only locked and missed: done, exempt and the reason stay as the manager left them
+            batch.update(f"J{row_number}:K{row_number}", [[True, missed]])
+            locked.append((row_number, missed))
+        batch.flush(get_coalescer(self.spreadsheet_name))
+        for row_number, missed in locked:
+            index.updated(row_number, {"locked": True, "missed": missed})
+        invalidate(DAILY_TASK_SHEET, spreadsheet_name=self.spreadsheet_name)
+        return len(locked)
+
+    def archive_daily_tasks(self, before):
+        sheet = self.worksheet(DAILY_TASK_SHEET)
+        values = sheet.get_all_values()
+        if len(values) < 2:
+            return 0
+        header = values[0]
+        date_col = header.index(DATE_COLUMN)
+        old = [row for row in values[1:] if archivable(row[date_col], before)]
+        if not old:
+            return 0
+
+        self.archive.append(header, old)
+        # Writing the archive takes a while, and a role change or another archive may have deleted
+        # rows meanwhile. So, like every other write by row, the rows are found again by key just
+        # before the delete rather than trusted to be where they were read
+        key_columns = [header.index(c) for c in KEY_COLUMNS]
+        positions = {}
+        for row_number, row in enumerate(sheet.get_all_values()[1:], start=2):
+            positions.setdefault(tuple(row[c] for c in key_columns), []).append(row_number)
+        targets = []
+        for row in old:
+            found = positions.get(tuple(row[c] for c in key_columns))
+            if found:
+                targets.append(found.pop(0))
+        if targets:
+            self._delete_rows(sheet, targets)
+        # Row numbers shifted: this process's index starts over, others find rows by key on write
+        get_daily_task_index(self.spreadsheet_name).build()
+        invalidate(DAILY_TASK_SHEET, spreadsheet_name=self.spreadsheet_name)
+        return len(targets)
+
+    def daily_task_history(self, start=None, end=None, email=None, role=None):
+        hot = filter_history(daily_task_index(self.spreadsheet_name).frame(), start, end, email, role)
+        archived = self.archive.read(start, end, email, role)
+        return schema.concat(DAILY_TASK_SHEET, [archived, hot])
+
+    def read_chunks(self, sheet_name, chunk_rows=5000):
+        # Row ranges straight from the sheet, bypassing the cache and index so only one chunk is held
+        return worksheet_chunks(self.worksheet(sheet_name), chunk_rows)
+
+    # --- Role templates ---
+    def role_template(self, sheet_name):
+        return load_snapshot(sheet_name, self.spreadsheet_name)
+
+    def save_role_template(self, sheet_name, rows, version):
+        sheet = self.worksheet(sheet_name)
+        # Past the cache: the check is against what the sheet holds now
+        values = sheet.get_all_values()
+        current = frame_from_values(values)
+        if template_version(template_rows(current)) != version:
+            invalidate(sheet_name, spreadsheet_name=self.spreadsheet_name)
+            raise TemplateConflict(f"{sheet_name} was changed after it was fetched")
+        header = values[0] if values else TEMPLATE_COLUMNS
+        columns = [header.index(column) + 1 for column in TEMPLATE_COLUMNS]
+        batch = WriteBatch(sheet)
+        if not values:
+            batch.update("A1", [TEMPLATE_COLUMNS])
+        # Rows past the new end are blanked rather than deleted, so this stays one values request
+        for position, row in template_writes(current, rows):
+            for column, value in zip(columns, row):
+                batch.update_cell(position + 2, column, value)
+        batch.flush()
+        invalidate(sheet_name, spreadsheet_name=self.spreadsheet_name)
+        return template_version(rows)
+
+    def prefetch(self, worksheets):
+        # Every stale worksheet in one values_batch_get: one round trip and one quota token.
+        # Sheets that only grow contribute their appended rows rather than the whole sheet.
+        cache = get_cache(self.spreadsheet_name)
+        index = get_daily_task_index(self.spreadsheet_name)
+        readers = []
+        for name in dict.fromkeys(worksheets):
+            if name == DAILY_TASK_SHEET:
+                if index.needs_sync():
+                    readers.append((name, index))
+            elif name in DELTA_SHEETS:
+                # Cached per key and built from the snapshot, so only the snapshot needs reading
+                snapshot = get_delta_snapshot(name, self.spreadsheet_name)
+                if not snapshot.is_fresh(cache.policies.get(name, DEFAULT_POLICY)[0]):
+                    readers.append((name, snapshot))
+            elif not cache.contains(name):
+                readers.append((name, None))
+        if not readers:
+            return
+        generations = {name: cache.generation(name) for name, _ in readers}
+        retry = self._batch_read(readers, generations)
+        if retry:
+            # Deltas that did not line up: read those sheets whole
+            self._batch_read(retry, generations, full=True)
+
+    def _batch_read(self, readers, generations, full=False):
+        cache = get_cache(self.spreadsheet_name)
+        plans = [reader.plan(full) if reader else ([quoted(name)], True, None) for name, reader in readers]
+        response = self.pool.spreadsheet.values_batch_get([r for ranges, _, _ in plans for r in ranges])
+        value_ranges = response.get("valueRanges", [])
+        retry = []
+        for (name, reader), (ranges, is_full, count) in zip(readers, plans):
+            part, value_ranges = value_ranges[:len(ranges)], value_ranges[len(ranges):]
+            if reader is None:
+                cache.put(name, frame_from_values(part[0].get("values", []) if part else [], name),
+                          generation=generations[name])
+            elif not reader.apply(part, is_full, count):
+                retry.append((name, reader))
+        return retry
+
+    def refresh(self):
+        invalidate(USERS_SHEET, spreadsheet_name=self.spreadsheet_name)
+        invalidate(USER_TASK_SHEET, reread=True, spreadsheet_name=self.spreadsheet_name)
+        get_daily_task_index(self.spreadsheet_name).invalidate()
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "site": self.site,
+            "connection": self.pool.health(),
+            "pool": self.pool.stats(),
+            "cache": get_cache(self.spreadsheet_name).stats(),
+            "daily_task_index": get_daily_task_index(self.spreadsheet_name).stats(),
+            "delta": {name: get_delta_snapshot(name, self.spreadsheet_name).stats() for name in sorted(DELTA_SHEETS)},
+            "write_coalescer": get_coalescer(self.spreadsheet_name).stats(),
+            "quota": self.pool.scheduler.stats(),
+        }
@@ -0,0 +1,380 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from dailytask import schema
+from dailytask.archive import ARCHIVE_DIR_ENV, LocalArchive, filter_history
+from dailytask.config import ROLES
+from dailytask.metrics import timed
+from dailytask.storage.base import (
+    DAILY_TASK_COLUMNS,
+    TEMPLATE_COLUMNS,
+    USER_TASK_COLUMNS,
+    USERS_COLUMNS,
+    Storage,
+    TemplateConflict,
+    template_rows,
+    template_version,
+    template_writes,
+)
+
+# Rows archive_daily_tasks moves: a well-formed shift date before the cutoff, as archive.archivable
+_ARCHIVABLE = (
+    '"task create Date" GLOB \'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]\' AND "task create Date" < ?'
+)
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _cols(names):
+    return ", ".join(_q(n) for n in names)
+
+
+def _text(value):
+    # Stored the way the spreadsheet displays it
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    return "" if value is None else str(value)
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    {", ".join(f"{_q(c)} TEXT NOT NULL DEFAULT ''" for c in USERS_COLUMNS)},
+    PRIMARY KEY ("Email" COLLATE NOCASE)
+);
+CREATE TABLE IF NOT EXISTS user_task (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {", ".join(f"{_q(c)} TEXT NOT NULL DEFAULT ''" for c in USER_TASK_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS user_task_login ON user_task ("login");
+CREATE TABLE IF NOT EXISTS user_daily_task (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {", ".join(f"{_q(c)} TEXT NOT NULL DEFAULT ''" for c in DAILY_TASK_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS user_daily_task_lookup ON user_daily_task ("Email", "task create Date", "role");
+CREATE TABLE IF NOT EXISTS role_template (
+    sheet TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    {", ".join(f"{_q(c)} TEXT NOT NULL DEFAULT ''" for c in TEMPLATE_COLUMNS)},
+    PRIMARY KEY (sheet, position)
+);
+"""
+
+# Worksheet name -> table and columns, for read_chunks
+CHUNK_TABLES = {
+    "user-daily-task": ("user_daily_task", DAILY_TASK_COLUMNS),
+    "user-task": ("user_task", USER_TASK_COLUMNS),
+}
+
+
+class SQLiteStorage(Storage):
+    """Local single-file backend with the same contract as the spreadsheet."""
+
+    name = "sqlite"
+
+    def __init__(self, path="dailytask.db", archive=None):
+        self.path = path
+        self.archive = archive or LocalArchive(os.environ.get(ARCHIVE_DIR_ENV) or f"{path}-archive")
+        self._lock = threading.RLock()
+        # Streamlit serves sessions from several threads; the lock serializes access
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _frame(self, sql, params=(), index=None, sheet=None):
+        with self._lock, timed("sqlite", "select") as t:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchall()
+            names = [d[0] for d in cursor.description]
+            t["rows"] = len(rows)
+        with timed("dataframe", "sqlite rows", rows=len(rows)):
+            df = pd.DataFrame(rows, columns=names)
+            if index:
+                df = df.set_index(index)
+                df.index.name = None
+            # Typed the same way the spreadsheet backend types the worksheet
+            return schema.typed(sheet, df)
+
+    def _write(self, sql, params=()):
+        with self._lock, self._conn, timed("sqlite", "write", rows=1):
+            return self._conn.execute(sql, params).rowcount
+
+    def _write_many(self, sql, seq):
+        seq = list(seq)
+        with self._lock, self._conn, timed("sqlite", "write", rows=len(seq)):
+            return self._conn.executemany(sql, seq).rowcount
+
+    # --- Users ---
+    def users(self):
+        return self._frame(f"SELECT {_cols(USERS_COLUMNS)} FROM users ORDER BY rowid", sheet="Users")
+
+    def add_user(self, email, role, status=""):
+        self._write('INSERT INTO users ("Email", "Password", "Role", "Status") VALUES (?, \'\', ?, ?)', (email, role, status))
+
+    def set_password(self, email, password_hash):
+        return self._write('UPDATE users SET "Password" = ? WHERE "Email" = ? COLLATE NOCASE', (password_hash, email)) > 0
+
+    def set_status(self, email, status):
+        return self._write('UPDATE users SET "Status" = ? WHERE "Email" = ? COLLATE NOCASE', (status, email)) > 0
+
+    def delete_user(self, email):
+        return self._write('DELETE FROM users WHERE "Email" = ? COLLATE NOCASE', (email,)) > 0
+
+    def add_users(self, users):
+        with self._lock:
+            before = self._conn.total_changes
+            self._write_many(
+                'INSERT OR IGNORE INTO users ("Email", "Password", "Role", "Status") VALUES (?, \'\', ?, ?)',
+                [(email, role, status) for email, role, status in users],
+            )
+            return self._conn.total_changes - before
+
+    def _update_users(self, sql, value, emails):
+        with self._lock:
+            before = self._conn.total_changes
+            self._write_many(sql, [(value, email) for email in set(emails)])
+            return self._conn.total_changes - before
+
+    def set_passwords(self, emails, password_hash):
+        return self._update_users('UPDATE users SET "Password" = ? WHERE "Email" = ? COLLATE NOCASE', password_hash, emails)
+
+    def set_statuses(self, emails, status):
+        return self._update_users('UPDATE users SET "Status" = ? WHERE "Email" = ? COLLATE NOCASE', status, emails)
+
+    def delete_users(self, emails):
+        with self._lock:
+            before = self._conn.total_changes
+            self._write_many('DELETE FROM users WHERE "Email" = ? COLLATE NOCASE', [(email,) for email in set(emails)])
+            return self._conn.total_changes - before
+
+    # --- Eisenhower matrix ---
+    def eisenhower_tasks(self, login):
+        return self._frame(
+            f'SELECT {_cols(USER_TASK_COLUMNS)} FROM user_task WHERE "login" = ? ORDER BY id', (login,), sheet="user-task"
+        )
+
+    def add_eisenhower_tasks(self, row):
+        values = [_text(v) for v in row][:len(USER_TASK_COLUMNS)]
+        self._write(
+            f"INSERT INTO user_task ({_cols(USER_TASK_COLUMNS[:len(values)])}) VALUES ({', '.join('?' * len(values))})",
+            values,
+        )
+
+    def upsert_eisenhower_tasks(self, login, row):
+        values = [_text(v) for v in row][:len(USER_TASK_COLUMNS)]
+        columns = USER_TASK_COLUMNS[:len(values)]
+        with self._lock, self._conn, timed("sqlite", "write", rows=1):
+            updated = self._conn.execute(
+                f"UPDATE user_task SET {', '.join(f'{_q(c)} = ?' for c in columns)} "
+                'WHERE id = (SELECT MIN(id) FROM user_task WHERE "login" = ?)',
+                values + [login],
+            ).rowcount
+            if not updated:
+                self._conn.execute(
+                    f"INSERT INTO user_task ({_cols(columns)}) VALUES ({', '.join('?' * len(values))})", values
+                )
+        return bool(updated)
+
+    # --- Daily task instances ---
+    def role_for_day(self, email, shift_date):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT "role" FROM user_daily_task WHERE "Email" = ? AND "task create Date" = ? ORDER BY id LIMIT 1',
+                (email, str(shift_date)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def daily_tasks(self, email, shift_date, role):
+        return self._frame(
+            f'SELECT id, {_cols(DAILY_TASK_COLUMNS)} FROM user_daily_task '
+            'WHERE "Email" = ? AND "task create Date" = ? AND "role" = ? ORDER BY id',
+            (email, str(shift_date), role),
+            index="id",
+            sheet="user-daily-task",
+        )
+
+    def daily_tasks_on(self, shift_dates):
+        dates = [str(d) for d in shift_dates]
+        return self._frame(
+            f'SELECT id, {_cols(DAILY_TASK_COLUMNS)} FROM user_daily_task '
+            f'WHERE "task create Date" IN ({", ".join("?" * len(dates))}) ORDER BY id',
+            dates,
+            index="id",
+            sheet="user-daily-task",
+        )
+
+    def add_daily_tasks(self, rows):
+        self._write_many(
+            f"INSERT INTO user_daily_task ({_cols(DAILY_TASK_COLUMNS)}) VALUES ({', '.join('?' * len(DAILY_TASK_COLUMNS))})",
+            [[_text(v) for v in row] for row in rows],
+        )
+
+    def daily_task_keys(self, row_ids):
+        ids = [int(i) for i in row_ids]
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, "Email", "task create Date", "role", "task" FROM user_daily_task '
+                f'WHERE id IN ({", ".join("?" * len(ids))})',
+                ids,
+            ).fetchall() if ids else []
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def close_daily_tasks(self, updates, keys=None):
+        # Row ids are never reused here, so a row archived since it was read just matches nothing
+        if not updates:
+            return {"closed": 0, "moved": 0, "dropped": 0, "dropped_rows": []}
+        # Frames index rows with numpy ints, which sqlite3 does not bind as integers
+        updates = [(int(row_id), *values) for row_id, *values in updates]
+        with self._lock:
+            present = self.daily_task_keys([u[0] for u in updates])
+            closed = self._write_many(
+                'UPDATE user_daily_task SET "task closed Date" = ?, "done" = ?, "exempt" = ?, '
+                '"exempt reason" = ?, "locked" = \'TRUE\', "missed" = ? WHERE id = ?',
+                [
+                    (closed_at, _text(done), _text(exempt), reason, _text(not done and not exempt), row_id)
+                    for row_id, done, exempt, reason, closed_at in updates if row_id in present
+                ],
+            )
+        dropped = [u[0] for u in updates if u[0] not in present]
+        return {"closed": closed, "moved": 0, "dropped": len(dropped), "dropped_rows": dropped}
+
+    def delete_daily_tasks(self, row_ids, keys=None):
+        if not row_ids:
+            return 0
+        return self._write_many("DELETE FROM user_daily_task WHERE id = ?", [(int(row_id),) for row_id in row_ids])
+
+    def lock_daily_tasks(self, row_ids, keys=None):
+        if not row_ids:
+            return 0
+        # One statement per row, each checking the row as stored at that moment
+        return self._write_many(
+            'UPDATE user_daily_task SET "locked" = \'TRUE\', '
+            '"missed" = CASE WHEN "done" = \'TRUE\' OR "exempt" = \'TRUE\' THEN \'FALSE\' ELSE \'TRUE\' END '
+            'WHERE id = ? AND "locked" != \'TRUE\'',
+            [(int(row_id),) for row_id in row_ids],
+        )
+
+    def archive_daily_tasks(self, before):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f'SELECT {_cols(DAILY_TASK_COLUMNS)} FROM user_daily_task WHERE {_ARCHIVABLE} ORDER BY id',
+                (str(before),),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+            # Archive first: if it fails the transaction rolls back and nothing is lost
+            self.archive.append(DAILY_TASK_COLUMNS, rows)
+            self._conn.execute(
+                f'DELETE FROM user_daily_task WHERE {_ARCHIVABLE}',
+                (str(before),),
+            )
+        return len(rows)
+
+    def daily_task_history(self, start=None, end=None, email=None, role=None):
+        hot = filter_history(
+            self._frame(f"SELECT {_cols(DAILY_TASK_COLUMNS)} FROM user_daily_task ORDER BY id", sheet="user-daily-task"),
+            start, end, email, role,
+        )
+        archived = self.archive.read(start, end, email, role)
+        return schema.concat("user-daily-task", [archived, hot])
+
+    def read_chunks(self, sheet_name, chunk_rows=5000):
+        table, columns = CHUNK_TABLES[sheet_name]
+        last_id = 0
+        while True:
+            # Keyset pages: each is one indexed range scan, and the lock is released in between
+            df = self._frame(
+                f"SELECT id, {_cols(columns)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, chunk_rows),
+            )
+            if df.empty:
+                return
+            last_id = int(df["id"].iloc[-1])
+            yield df.drop(columns="id")
+            if len(df) < chunk_rows:
+                return
+
+    # --- Role templates ---
+    def role_template(self, sheet_name):
+        return self._frame(
+            f"SELECT {_cols(TEMPLATE_COLUMNS)} FROM role_template WHERE sheet = ? ORDER BY position",
+            (sheet_name,),
+        )
+
+    def save_role_template(self, sheet_name, rows, version):
+        with self._lock, self._conn:
+            # Write-locked before the check, so a save from another process cannot slip in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            current = pd.DataFrame(self._conn.execute(
+                f"SELECT {_cols(TEMPLATE_COLUMNS)} FROM role_template WHERE sheet = ? ORDER BY position",
+                (sheet_name,),
+            ).fetchall(), columns=TEMPLATE_COLUMNS)
+            if template_version(template_rows(current)) != version:
+                raise TemplateConflict(f"{sheet_name} was changed after it was fetched")
+            self._conn.executemany(
+                f"INSERT INTO role_template (sheet, position, {_cols(TEMPLATE_COLUMNS)}) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT (sheet, position) DO UPDATE SET "
+                + ", ".join(f"{_q(c)} = excluded.{_q(c)}" for c in TEMPLATE_COLUMNS),
+                [(sheet_name, position, *row) for position, row in template_writes(current, rows) if position < len(rows)],
+            )
+            self._conn.execute("DELETE FROM role_template WHERE sheet = ? AND position >= ?", (sheet_name, len(rows)))
+        return template_version(rows)
+
+    def load_role_template(self, sheet_name, records):
+        # records: [{"task": ..., "time": ...}] replacing the whole template
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM role_template WHERE sheet = ?", (sheet_name,))
+            self._conn.executemany(
+                f"INSERT INTO role_template (sheet, position, {_cols(TEMPLATE_COLUMNS)}) VALUES (?, ?, ?, ?)",
+                [(sheet_name, i, _text(r.get("task")), _text(r.get("time"))) for i, r in enumerate(records)],
+            )
+
+    def stats(self):
+        with self._lock:
+            counts = {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("users", "user_task", "user_daily_task", "role_template")
+            }
+        return {"backend": self.name, "site": self.site, "path": self.path, "rows": counts}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create a local dailytask database for offline runs.")
+    parser.add_argument("path", nargs="?", default="dailytask.db")
+    parser.add_argument("--admin", action="append", default=[], help="admin email, password set on first login")
+    parser.add_argument("--user", action="append", default=[], help="user email, password set on first login")
+    parser.add_argument("--template", action="append", default=[], metavar="SHEET=CSV",
+                        help="load a role template (task,time columns) from a CSV file")
+    parser.add_argument("--copy-templates-from-sheets", action="store_true",
+                        help="copy the eight role template sheets from dailytaskDB")
+    args = parser.parse_args(argv)
+
+    storage = SQLiteStorage(args.path)
+    existing = set(storage.users()["Email"].str.lower())
+    for role, emails in (("admin", args.admin), ("user", args.user)):
+        for email in emails:
+            if email.lower() not in existing:
+                storage.add_user(email.lower(), role, "active")
+
+    for spec in args.template:
+        sheet_name, _, csv_path = spec.partition("=")
+        storage.load_role_template(sheet_name, pd.read_csv(csv_path, dtype=str).fillna("").to_dict("records"))
+
+    if args.copy_templates_from_sheets:
+        from dailytask.storage.sheets import SheetsStorage
+
+        sheets = SheetsStorage()
+        for sheet_name in ROLES.values():
+            storage.load_role_template(sheet_name, sheets.worksheet(sheet_name).get_all_records())
+
+    print(storage.stats())
+
+
+if __name__ == "__main__":
+    main()
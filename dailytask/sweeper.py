@@ -0,0 +1,121 @@
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+import streamlit as st
+
+from dailytask.config import TIMEZONE
+from dailytask.quota import background
+from dailytask.schema import row_keys
+from dailytask.scheduling import schedule_tasks
+
+# In-process sweep interval; 0 turns the background thread off
+SWEEP_SECONDS_ENV = "DAILYTASK_SWEEP_SECONDS"
+DEFAULT_SWEEP_SECONDS = 60
+
+
+def current_shift_dates(now):
+    # A night shift started yesterday is still running until 07:00
+    today = now.date()
+    return [today - timedelta(days=1), today]
+
+
+def find_overdue(tasks_df, now):
+    """Row ids of tasks past their due time that nobody has locked yet."""
+    row_ids = []
+    if tasks_df.empty:
+        return row_ids
+    # Rows without a valid shift date (NaT) form no group
+    for (shift_date, role), group in tasks_df.groupby(["task create Date", "role"], sort=False, observed=True):
+        shift_date = shift_date.date()
+        scheduled = schedule_tasks(group, shift_date, "NS" in str(role), now)
+        row_ids.extend(scheduled.index[(scheduled["task_datetime"] < now) & ~scheduled["locked"]])
+    return row_ids
+
+
+def sweep(storage, now=None):
+    # One read of the current shift dates, one batched write; returns how many tasks were locked.
+    # The read can be a sync interval old, so the storage checks each row again and only locks it
+    now = now or datetime.now(pytz.timezone(TIMEZONE))
+    tasks_df = storage.daily_tasks_on(current_shift_dates(now))
+    row_ids = find_overdue(tasks_df, now)
+    if not row_ids:
+        return 0
+    return storage.lock_daily_tasks(row_ids, row_keys(tasks_df.loc[row_ids]))
+
+
+class OverdueSweeper(threading.Thread):
+    def __init__(self, storage, interval=DEFAULT_SWEEP_SECONDS):
+        super().__init__(name="overdue-sweeper", daemon=True)
+        self.storage = storage
+        self.interval = interval
+        self.runs = 0
+        self.locked = 0
+        self.last_run = None
+        self.last_error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                # Sessions' saves go first when the quota runs short
+                with background():
+                    self.locked += sweep(self.storage)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            self.runs += 1
+            self.last_run = time.time()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "locked": self.locked,
+            "last_run_age": round(time.time() - self.last_run) if self.last_run else None,
+            "last_error": self.last_error,
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def start_sweeper(_storage, site=None):
+    # One sweeper per site this process serves
+    interval = float(os.environ.get(SWEEP_SECONDS_ENV, DEFAULT_SWEEP_SECONDS))
+    if interval <= 0:
+        return None
+    sweeper = OverdueSweeper(_storage, interval)
+    sweeper.start()
+    return sweeper
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lock and mark missed every overdue task of the current shift.")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="keep running and sweep every N seconds (default: sweep once and exit)")
+    parser.add_argument("--site", action="append", help="site code to sweep, repeatable (default: every site)")
+    args = parser.parse_args(argv)
+
+    from dailytask.sites import site_codes
+    from dailytask.storage import create_storage
+
+    storages = [create_storage(site=code) for code in site_codes(args.site)]
+    while True:
+        for storage in storages:
+            # Other processes write too, so start every sweep from fresh data
+            storage.refresh()
+            locked = sweep(storage)
+            print(f"{datetime.now(pytz.timezone(TIMEZONE)):%Y-%m-%d %H:%M:%S} {storage.site}: "
+                  f"locked {locked} overdue tasks")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
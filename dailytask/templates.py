@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+import streamlit as st
+
+from dailytask.config import ROLES
+from dailytask.scheduling import NIGHT_ROLLOVER_MINUTES, parse_due_time
+from dailytask.storage.base import TEMPLATE_COLUMNS, template_frame, template_rows, template_version
+
+# minutes: due time after midnight (None if it does not parse); day_offset: days after the shift date
+TemplateTask = namedtuple("TemplateTask", ["position", "task", "time", "minutes", "day_offset"])
+
+# An admin's edit of a template: the rows to save and how many were added, removed and changed
+TemplateEdit = namedtuple("TemplateEdit", ["rows", "inserted", "deleted", "modified"])
+
+
+def diff_template(original, edited):
+    """Compare the fetched frame with the editor's frame, matching rows on the index the editor keeps.
+
+    Labels only in `original` were deleted, labels only in `edited` inserted.
+    Rows left blank count as deleted.
+    """
+    before = template_frame(original)
+    after = template_frame(edited)
+    after = after[(after != "").any(axis=1)]
+    kept = after.index.intersection(before.index)
+    modified = (before.loc[kept] != after.loc[kept]).any(axis=1)
+    return TemplateEdit(
+        rows=after.to_numpy().tolist(),
+        inserted=len(after.index.difference(before.index)),
+        deleted=len(before.index.difference(after.index)),
+        modified=int(modified.sum()),
+    )
+
+
+class RoleTemplate:
+    """One role sheet parsed once: the raw frame for the editor and the tasks ready to instantiate."""
+
+    def __init__(self, role, frame):
+        self.role = role
+        self.frame = frame
+        # What the editor shows: task and time without the blank rows a shorter save leaves behind
+        self.rows = template_rows(frame)
+        # Checked on save, so an edit of a template someone else has since saved is refused
+        self.version = template_version(self.rows)
+        self.tasks = []
+        self.problems = []
+        self._rows = []
+        night = "NS" in role
+        if frame.empty or not {"task", "time"} <= set(frame.columns):
+            if not frame.empty:
+                self.problems.append(f"{role}: expected 'task' and 'time' columns, found {list(frame.columns)}")
+            return
+        for position, (task, due) in enumerate(zip(frame["task"], frame["time"])):
+            task, due = str(task).strip(), str(due).strip()
+            if not task:
+                continue
+            minutes = parse_due_time(due)
+            if minutes is None:
+                self.problems.append(f"{role} row {position + 2}: due time '{due}' is not like 8.00AM")
+            day_offset = 1 if night and minutes is not None and minutes < NIGHT_ROLLOVER_MINUTES else 0
+            self.tasks.append(TemplateTask(position, task, due, minutes, day_offset))
+        # Prototype user-daily-task rows; instantiating is a copy plus the user's own columns
+        self._rows = [
+            [None, None, None, "", None, t.task, False, False, "", False, False, t.time] for t in self.tasks
+        ]
+
+    def rows_for(self, email, name, shift_date, role_code):
+        rows = []
+        for prototype in self._rows:
+            row = list(prototype)
+            row[0], row[1], row[2], row[4] = email, name, str(shift_date), role_code
+            rows.append(row)
+        return rows
+
+
+class TemplateRegistry:
+    """Every role template compiled once per process, and again whenever its sheet's snapshot changes.
+
+    The snapshot is the worksheet cache's, re-read on its TTL, so a save from
+    the admin app reaches the user app as soon as that process re-reads the
+    sheet; compiling is skipped while the content is the same.
+    """
+
+    def __init__(self, storage, roles=ROLES):
+        self.storage = storage
+        self.role_codes = list(roles.values())
+        self._lock = threading.Lock()
+        self._templates = {}
+        self._loaded_at = 0.0
+        self._stats = {"loads": 0, "refreshes": 0, "recompiles": 0}
+
+    def _compile(self, role):
+        return RoleTemplate(role, self.storage.role_template(role))
+
+    def _ensure_loaded(self):
+        if self._templates:
+            return
+        # All eight sheets in one batch read on backends that support it
+        self.storage.prefetch(self.role_codes)
+        self._templates = {role: self._compile(role) for role in self.role_codes}
+        self._loaded_at = time.monotonic()
+        self._stats["loads"] += 1
+
+    def get(self, role):
+        with self._lock:
+            self._ensure_loaded()
+            template = self._templates.get(role)
+            # A cache hit while the snapshot is fresh; a read once its TTL has passed
+            frame = self.storage.role_template(role)
+            if template is None or frame is not template.frame:
+                if template is None or template_version(template_rows(frame)) != template.version:
+                    # New to this process, or saved elsewhere since it was compiled
+                    template = self._templates[role] = RoleTemplate(role, frame)
+                    self._stats["recompiles"] += 1
+                else:
+                    # Same content re-read: remember this snapshot so the next check is a lookup
+                    template.frame = frame
+            return template
+
+    def rows_for(self, role, email, name, shift_date, role_code=None):
+        return self.get(role).rows_for(email, name, shift_date, role_code or role)
+
+    def refresh(self, role=None):
+        # Called after a save; role=None reloads everything on next use
+        with self._lock:
+            self._stats["refreshes"] += 1
+            if role is None:
+                self._templates = {}
+            elif self._templates:
+                self._templates[role] = self._compile(role)
+
+    def saved(self, role, rows):
+        # Apply an admin save (save_role_template rows) without reading the sheet back
+        with self._lock:
+            self._stats["refreshes"] += 1
+            if self._templates:
+                self._templates[role] = RoleTemplate(role, pd.DataFrame(rows, columns=TEMPLATE_COLUMNS))
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                templates={role: len(t.tasks) for role, t in self._templates.items()},
+                problems=[p for t in self._templates.values() for p in t.problems],
+                age_seconds=round(time.monotonic() - self._loaded_at) if self._templates else None,
+            )
+
+
+@st.cache_resource(show_spinner=False)
+def get_template_registry(_storage, site=None):
+    # site keys the cache: each site's shard has its own role sheets
+    return TemplateRegistry(_storage)
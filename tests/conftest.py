@@ -0,0 +1,26 @@
+from unittest import mock
+
+import pytest
+import streamlit as st
+
+import dailytask.cache
+import dailytask.delta
+import dailytask.index
+from benchmarks.fake_gspread import CallRecorder, patched_gspread, seed_spreadsheet
+from dailytask.connection import SheetsPool
+from dailytask.storage.sheets import SheetsStorage
+
+
+@pytest.fixture
+def fake_sheets():
+    """A SheetsStorage on benchmarks.fake_gspread: (storage, fake spreadsheet, call recorder)."""
+    st.cache_resource.clear()
+    recorder = CallRecorder()
+    book = seed_spreadsheet(recorder, users=2, days=1, tasks_per_role=2)
+    with patched_gspread(book):
+        pool = SheetsPool({"type": "service_account"})
+        with mock.patch.object(dailytask.cache, "get_pool", lambda *a: pool), \
+                mock.patch.object(dailytask.index, "get_pool", lambda *a: pool), \
+                mock.patch.object(dailytask.delta, "get_pool", lambda *a: pool):
+            yield SheetsStorage(pool), book, recorder
+    st.cache_resource.clear()
@@ -0,0 +1,64 @@
+import threading
+import time
+from datetime import date
+
+from dailytask.analytics import CompletionRollup, rates
+from dailytask.storage.sqlite import SQLiteStorage
+
+
+def daily_task(shift, task, done=False, exempt=False, locked=False):
+    closed = f"{shift} 07:00:00" if done or exempt else ""
+    return ["m@example.com", "M", shift, closed, "OM-IB-DS", task, done, exempt, "", locked, locked and not done,
+            "8.00AM"]
+
+
+class SlowHistory:
+    # Counts full-history reads and holds each long enough for other sessions to arrive
+    def __init__(self, storage):
+        self.storage = storage
+        self.history_reads = 0
+
+    def daily_task_history(self):
+        self.history_reads += 1
+        time.sleep(0.2)
+        return self.storage.daily_task_history()
+
+    def daily_tasks_on(self, shift_dates):
+        return self.storage.daily_tasks_on(shift_dates)
+
+
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "dailytask.db"))
+    storage.add_daily_tasks([
+        daily_task("2030-01-01", "a", done=True, locked=True),
+        daily_task("2030-01-01", "b", exempt=True, locked=True),
+        daily_task("2030-01-01", "c", locked=True),
+        daily_task("2030-01-02", "a"),
+    ])
+    return storage
+
+
+def test_concurrent_first_updates_seed_once(tmp_path):
+    rollup, slow = CompletionRollup(), SlowHistory(storage(tmp_path))
+    threads = [threading.Thread(target=rollup.update, args=(slow, date(2030, 1, 2))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert slow.history_reads == 1
+    summary = rates(rollup.frame(), ["task create Date"]).set_index("task create Date")
+    assert summary.loc["2030-01-01", ["total", "done", "exempt", "missed"]].tolist() == [3, 1, 1, 1]
+    assert summary.loc["2030-01-02", ["total", "open"]].tolist() == [1, 1]
+
+
+def test_refolding_only_counts_changes(tmp_path):
+    s = storage(tmp_path)
+    rollup = CompletionRollup()
+    rollup.update(s, date(2030, 1, 2))
+    rollup.update(s, date(2030, 1, 2))
+    assert rollup.stats()["changed_rows"] == 4
+    row_id = s.daily_tasks("m@example.com", "2030-01-02", "OM-IB-DS").index[0]
+    s.close_daily_tasks([(row_id, True, False, "", "2030-01-02 07:00:00")])
+    rollup.update(s, date(2030, 1, 2))
+    assert rollup.stats()["changed_rows"] == 5
+    assert rollup.frame(start="2030-01-02")[["total", "done", "open"]].values.tolist() == [[1, 1, 0]]
@@ -0,0 +1,78 @@
+import pandas as pd
+
+from dailytask.archive import LocalArchive, archivable
+from dailytask.schema import row_keys
+from dailytask.storage.sheets import SheetsStorage
+from dailytask.storage.sqlite import SQLiteStorage
+
+
+def daily_task(shift, task, email="m@example.com"):
+    return [email, "M", shift, "", "OM-IB-DS", task, False, False, "", False, False, "8.00AM"]
+
+
+ROWS = [
+    daily_task("2020-01-01", "old 0"),
+    daily_task("2020-01-05", "hot 0"),
+    daily_task("2020-01-01", "old 1"),
+    daily_task("1/2/2020", "malformed"),
+    daily_task("2020-01-02", "old 2"),
+]
+
+
+def tasks(worksheet):
+    return [row[5] for row in worksheet.rows[1:] if row[0] == "m@example.com"]
+
+
+def test_archivable():
+    assert archivable("2020-01-01", "2020-01-03")
+    assert not archivable("2020-01-03", "2020-01-03")
+    assert not archivable("1/2/2020", "2020-01-03")
+    assert not archivable("", "2020-01-03")
+
+
+def test_sheets_archive_deletes_the_rows_it_archived_after_others_moved(tmp_path, fake_sheets):
+    storage, book, _ = fake_sheets
+    storage = SheetsStorage(storage.pool, archive=LocalArchive(str(tmp_path)))
+    storage.add_daily_tasks(ROWS)
+    worksheet = book._sheets["user-daily-task"]
+    others = len(worksheet.rows) - 1 - len(ROWS)
+    append = storage.archive.append
+
+    def append_while_another_process_deletes(header, rows):
+        # A role change deletes a row above, and another archive has already taken "old 1"
+        del worksheet.rows[1]
+        del worksheet.rows[[row[5] for row in worksheet.rows].index("old 1")]
+        return append(header, rows)
+
+    storage.archive.append = append_while_another_process_deletes
+    assert storage.archive_daily_tasks("2020-01-03") == 2
+    assert tasks(worksheet) == ["hot 0", "malformed"]
+    assert len(worksheet.rows) - 1 - 2 == others - 1
+    assert sorted(storage.archive.read()["task"]) == ["old 0", "old 1", "old 2"]
+    # This process's index was rebuilt from the sheet as it is now
+    history = storage.daily_task_history(start="2020-01-05", email="m@example.com")
+    assert history["task"].tolist() == ["hot 0"]
+
+
+def test_sweeper_lock_finds_rows_that_moved(fake_sheets):
+    storage, book, _ = fake_sheets
+    storage.add_daily_tasks(ROWS)
+    worksheet = book._sheets["user-daily-task"]
+    df = storage.daily_tasks("m@example.com", "2020-01-01", "OM-IB-DS")
+    keys = row_keys(df)
+    # Another instance archived rows above since this one's index last synced
+    del worksheet.rows[1:3]
+    assert storage.lock_daily_tasks(list(df.index), keys) == 2
+    locked = {row[5]: row[9] for row in worksheet.rows[1:] if row[0] == "m@example.com"}
+    assert {task: str(value).upper() for task, value in locked.items()} == {
+        "old 0": "TRUE", "hot 0": "FALSE", "old 1": "TRUE", "malformed": "FALSE", "old 2": "FALSE",
+    }
+
+
+def test_sqlite_archive_leaves_malformed_dates(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "dailytask.db"), LocalArchive(str(tmp_path / "archive")))
+    storage.add_daily_tasks(ROWS)
+    assert storage.archive_daily_tasks("2020-01-03") == 3
+    hot = pd.concat(storage.read_chunks("user-daily-task"))
+    assert hot["task"].tolist() == ["hot 0", "malformed"]
+    assert sorted(storage.archive.read()["task"]) == ["old 0", "old 1", "old 2"]
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+from gspread.utils import ValueInputOption
+
+from dailytask.batching import WriteBatch, WriteCoalescer
+
+
+class Worksheet:
+    """Records batch_update calls instead of sending them."""
+
+    def __init__(self, title="user-daily-task", error=None):
+        self.title = title
+        self.error = error
+        self.calls = []
+
+    def batch_update(self, data, value_input_option=None):
+        self.calls.append((list(data), value_input_option))
+        if self.error:
+            raise self.error
+        return {"totalUpdatedCells": len(data)}
+
+
+def test_neighbouring_cells_go_out_as_one_range():
+    batch = WriteBatch(Worksheet())
+    batch.update_cell(2, 7, True).update_cell(2, 8, False).update_cell(2, 9, "old")
+    batch.update_cell(2, 9, "no scanner")   # later edits win
+    batch.update_cell(2, 4, "2030-01-01 09:00:00")
+    batch.update_cell(3, 7, True)
+    batch.update("J2:K2", [[True, False]])
+    assert len(batch) == 6
+    assert batch.data() == [
+        {"range": "J2:K2", "values": [[True, False]]},
+        {"range": "D2", "values": [["2030-01-01 09:00:00"]]},
+        {"range": "G2:I2", "values": [[True, False, "no scanner"]]},
+        {"range": "G3", "values": [[True]]},
+    ]
+
+
+def test_flush_sends_one_request_raw_by_default():
+    worksheet = Worksheet()
+    batch = WriteBatch(worksheet)
+    assert batch.flush() is None
+    batch.update_cell(2, 9, "=HYPERLINK(\"x\")").update_cell(2, 4, "1/2")
+    batch.flush()
+    [(data, value_input_option)] = worksheet.calls
+    assert [d["range"] for d in data] == ["D2", "I2"]
+    assert value_input_option == ValueInputOption.raw
+    # Emptied by the flush
+    assert len(batch) == 0
+    batch.flush()
+    assert len(worksheet.calls) == 1
+
+
+def test_user_entered_when_asked():
+    worksheet = Worksheet()
+    WriteBatch(worksheet, ValueInputOption.user_entered).update_cell(2, 4, "1/2").flush()
+    assert worksheet.calls[0][1] == ValueInputOption.user_entered
+
+
+def submit_later(coalescer, worksheet, data, value_input_option=ValueInputOption.raw):
+    # Submits on a thread and waits until the batch is queued
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(coalescer.submit(worksheet, data, value_input_option)), daemon=True
+    )
+    thread.start()
+    deadline = time.monotonic() + 1
+    while not coalescer._pending and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return thread, results
+
+
+def test_coalescer_merges_sessions_within_the_window():
+    worksheet = Worksheet()
+    coalescer = WriteCoalescer(window=0.2)
+    first = [{"range": "G2", "values": [[True]]}]
+    second = [{"range": "G5", "values": [[False]]}]
+    thread, results = submit_later(coalescer, worksheet, first)
+    response = coalescer.submit(worksheet, second)
+    thread.join(1)
+
+    assert worksheet.calls == [(first + second, ValueInputOption.raw)]
+    assert results == [response]
+    assert coalescer.stats() == {"batches": 2, "requests": 1, "ranges": 2}
+
+
+def test_coalescer_keeps_value_input_options_apart():
+    worksheet = Worksheet()
+    coalescer = WriteCoalescer(window=0.1)
+    thread, _ = submit_later(coalescer, worksheet, [{"range": "I2", "values": [["=1+1"]]}])
+    coalescer.submit(worksheet, [{"range": "D2", "values": [["1/2"]]}], ValueInputOption.user_entered)
+    thread.join(1)
+
+    assert sorted(option for _, option in worksheet.calls) == sorted([ValueInputOption.raw, ValueInputOption.user_entered])
+    assert coalescer.stats()["requests"] == 2
+
+
+def test_coalescer_raises_the_error_in_every_session():
+    worksheet = Worksheet(error=RuntimeError("quota"))
+    coalescer = WriteCoalescer(window=0.2)
+    errors = []
+
+    def submit():
+        try:
+            coalescer.submit(worksheet, [{"range": "G2", "values": [[True]]}])
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=submit, daemon=True)
+    thread.start()
+    while not coalescer._pending:
+        time.sleep(0.005)
+    with pytest.raises(RuntimeError):
+        coalescer.submit(worksheet, [{"range": "G3", "values": [[True]]}])
+    thread.join(1)
+    assert len(errors) == 1 and len(worksheet.calls) == 1
+
+
+def test_saved_reasons_are_written_as_typed(fake_sheets):
+    storage, book, recorder = fake_sheets
+    worksheet = book._sheets["user-daily-task"]
+    sent = []
+    batch_update = worksheet.batch_update
+    worksheet.batch_update = lambda data, **kwargs: sent.append(kwargs) or batch_update(data, **kwargs)
+
+    storage.close_daily_task(2, False, True, "=IMPORTXML(\"x\")", "2030-01-01 09:00:00")
+    assert sent == [{"value_input_option": ValueInputOption.raw}]
+    assert worksheet.rows[1][8] == "=IMPORTXML(\"x\")"
@@ -0,0 +1,78 @@
+import pytest
+
+from dailytask.delta import DeltaSnapshot, appended_at
+
+SHEET = "user-task"
+
+
+@pytest.fixture
+def snapshot(fake_sheets):
+    storage, book, recorder = fake_sheets
+    snapshot = DeltaSnapshot(SHEET, spreadsheet_name=storage.spreadsheet_name)
+    snapshot.read()
+    recorder.reset()
+    return snapshot, book._sheets[SHEET], recorder
+
+
+def row(login):
+    return [login, "2030-01-01", "", "todo 1"]
+
+
+def test_appended_rows_are_read_as_a_delta(snapshot):
+    snapshot, worksheet, recorder = snapshot
+    worksheet.rows.append(row("late"))
+    assert snapshot.read() == worksheet.rows
+    stats = snapshot.stats()
+    assert (stats["full_reads"], stats["delta_reads"], stats["delta_rows"]) == (1, 1, 1)
+    # Header, last known row and the tail in a single request
+    assert recorder.by_method() == {"values_batch_get": 1}
+
+    # Nothing new: still a delta, with nothing to add
+    assert snapshot.read() == worksheet.rows
+    assert snapshot.stats()["delta_reads"] == 2
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        pytest.param(lambda rows: rows.pop(), id="truncated"),
+        pytest.param(lambda rows: rows.pop(1), id="row-deleted-above"),
+        pytest.param(lambda rows: rows[-1].__setitem__(3, "edited"), id="last-row-rewritten"),
+        pytest.param(lambda rows: rows[0].__setitem__(0, "user"), id="header-rewritten"),
+    ],
+)
+def test_other_changes_fall_back_to_a_full_read(snapshot, change):
+    snapshot, worksheet, recorder = snapshot
+    change(worksheet.rows)
+    worksheet.rows.append(row("late"))
+    assert snapshot.read() == worksheet.rows
+    stats = snapshot.stats()
+    assert (stats["fallbacks"], stats["full_reads"]) == (1, 2)
+    assert recorder.by_method() == {"values_batch_get": 2}
+    # Lined up again: the next read is a delta
+    worksheet.rows.append(row("later"))
+    assert snapshot.read()[-1][0] == "later"
+    assert snapshot.stats()["delta_reads"] == 1
+
+
+def test_our_own_appends_are_not_fetched_again(snapshot):
+    snapshot, worksheet, recorder = snapshot
+    worksheet.rows.append(row("ours"))
+    snapshot.appended([row("ours")], len(worksheet.rows))
+    assert snapshot.read()[-1] == row("ours")
+    assert snapshot.stats()["delta_rows"] == 0
+
+
+def test_an_append_elsewhere_in_between_forces_a_full_read(snapshot):
+    snapshot, worksheet, _ = snapshot
+    worksheet.rows.append(row("theirs"))
+    worksheet.rows.append(row("ours"))
+    snapshot.appended([row("ours")], len(worksheet.rows))
+    assert [r[0] for r in snapshot.read()[-2:]] == ["theirs", "ours"]
+    assert snapshot.stats()["full_reads"] == 2
+
+
+def test_appended_at():
+    assert appended_at({"updates": {"updatedRange": "'user-task'!A41:AI42"}}) == 41
+    assert appended_at({}) is None
+    assert appended_at(None) is None
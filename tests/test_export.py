@@ -0,0 +1,46 @@
+import io
+
+import pandas as pd
+
+from dailytask import quota
+from dailytask.export import export, history_chunks
+from dailytask.storage.sqlite import SQLiteStorage
+
+
+def in_background():
+    return getattr(quota._local, "background", False)
+
+
+def daily_task(shift, task):
+    return ["m@example.com", "M", shift, "", "OM-IB-DS", task, False, False, "", False, False, "8.00AM"]
+
+
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "dailytask.db"))
+    storage.add_daily_tasks([daily_task(f"2030-01-{day:02d}", f"t{day}") for day in range(1, 8)])
+    return storage
+
+
+def test_reads_are_background_but_the_consumer_is_not(tmp_path):
+    seen = []
+    real = SQLiteStorage.read_chunks
+
+    def read_chunks(self, sheet_name, chunk_rows=5000):
+        for chunk in real(self, sheet_name, chunk_rows):
+            seen.append(in_background())
+            yield chunk
+
+    s = storage(tmp_path)
+    s.read_chunks = read_chunks.__get__(s)
+    chunks = []
+    for chunk in history_chunks(s, "user-daily-task", start="2030-01-02", end="2030-01-06", chunk_rows=2):
+        assert not in_background()
+        chunks.append(chunk)
+    assert seen and all(seen)
+    assert pd.concat(chunks)["task"].tolist() == ["t2", "t3", "t4", "t5", "t6"]
+
+
+def test_export_writes_the_header_when_nothing_matches(tmp_path):
+    out = io.BytesIO()
+    assert export(storage(tmp_path), out, "csv", start="2031-01-01") == 0
+    assert out.getvalue().decode().startswith("Email,")
@@ -0,0 +1,78 @@
+import pytest
+
+from dailytask.index import get_daily_task_index
+
+SHIFT = "2030-01-01"
+ROLE = "OM-IB-DS"
+
+
+def daily_task(task, email="m@example.com", shift=SHIFT, role=ROLE):
+    return [email, "M", shift, "", role, task, "FALSE", "FALSE", "", "FALSE", "FALSE", "8.00AM"]
+
+
+@pytest.fixture
+def sheets(fake_sheets):
+    storage, book, recorder = fake_sheets
+    storage.add_daily_tasks([daily_task(f"Live {i}") for i in range(3)])
+    index = get_daily_task_index(storage.spreadsheet_name)
+    index.ensure_fresh()
+    return index, book._sheets["user-daily-task"], recorder
+
+
+def sheet_row(worksheet, task):
+    return next(n for n, row in enumerate(worksheet.rows, start=1) if row[5] == task)
+
+
+def key(task):
+    return ("m@example.com", SHIFT, ROLE, task)
+
+
+def test_lookup_by_task_and_row(sheets):
+    index, worksheet, _ = sheets
+    n = sheet_row(worksheet, "Live 1")
+    assert index.locate(key("Live 1"))[0] == n
+    assert index.locate(key("Live 1"), exclude={n}) is None
+    assert index.locate(key("Gone")) is None
+    assert index.keys([n, 999]) == {n: key("Live 1")}
+    assert index.role_for("m@example.com", SHIFT) == ROLE
+    assert list(index.rows("m@example.com", SHIFT, ROLE)["task"]) == ["Live 0", "Live 1", "Live 2"]
+
+
+def test_sync_picks_up_rows_appended_elsewhere(sheets):
+    index, worksheet, recorder = sheets
+    # Another process appends, e.g. the materializer
+    worksheet.rows.append(daily_task("Live 3"))
+    recorder.reset()
+    index.synced_at = 0.0
+
+    index.ensure_fresh()
+    assert index.locate(key("Live 3"))[0] == len(worksheet.rows)
+    assert index.stats()["delta"]["delta_rows"] == 1
+    # Only the new rows were fetched, no whole-sheet read
+    assert recorder.by_method() == {"values_batch_get": 1}
+
+
+def test_sync_rebuilds_after_rows_are_removed(sheets):
+    index, worksheet, _ = sheets
+    before = sheet_row(worksheet, "Live 2")
+    # Archived in another process: every row below moves up
+    del worksheet.rows[1:3]
+    index.synced_at = 0.0
+
+    index.ensure_fresh()
+    assert index.locate(key("Live 2"))[0] == before - 2 == sheet_row(worksheet, "Live 2")
+    assert index.stats()["rows"] == len(worksheet.rows) - 1
+    assert index.stats()["delta"]["fallbacks"] == 1
+
+
+def test_writes_of_ours_keep_the_index_current(sheets, fake_sheets):
+    index, worksheet, recorder = sheets
+    storage = fake_sheets[0]
+    recorder.reset()
+    storage.add_daily_tasks([daily_task("Live 3")])
+    n = sheet_row(worksheet, "Live 3")
+    assert index.locate(key("Live 3"))[0] == n
+
+    index.updated(n, {"done": True})
+    assert index.rows("m@example.com", SHIFT, ROLE).set_index("task").loc["Live 3", "done"]
+    assert "get_all_values" not in recorder.by_method()
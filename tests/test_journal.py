@@ -0,0 +1,213 @@
+import json
+
+import pytest
+
+from dailytask import journal, schema
+from dailytask.index import get_daily_task_index
+from dailytask.journal import Journal, JournaledStorage, journaled
+from dailytask.storage.sqlite import SQLiteStorage
+
+SHIFT = "2030-01-01"
+ROLE = "OM-IB-DS"
+
+
+def daily_task(task, email="m@example.com", shift=SHIFT, role=ROLE):
+    return [email, "M", shift, "", role, task, False, False, "", False, False, "8.00AM"]
+
+
+@pytest.fixture(autouse=True)
+def no_flusher(monkeypatch):
+    # Tests flush by hand; the background thread would race them
+    monkeypatch.setattr(JournaledStorage, "_run", lambda self: None)
+
+
+@pytest.fixture
+def sqlite(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "dailytask.db"))
+    storage.site = "LCY3"
+    storage.add_daily_tasks([daily_task(f"t{i}") for i in range(3)])
+    return storage
+
+
+def lines(path):
+    return path.read_text().splitlines()
+
+
+def test_replay_skips_acked_entries_and_a_torn_line(tmp_path):
+    path = tmp_path / "lcy3-1.jsonl"
+    j = Journal(str(path))
+    first = j.append("upsert_eisenhower_tasks", ["a", ["a"]])
+    second = j.append("upsert_eisenhower_tasks", ["b", ["b"]])
+    j.ack([first["key"]])
+    j.close()
+    # The process died halfway through writing an entry
+    with open(path, "a") as f:
+        f.write('{"key":"torn","op":"upsert_eisenhower_tasks","ar')
+
+    j = Journal(str(path))
+    assert [e["key"] for e in j.pending()] == [second["key"]]
+    third = j.append("upsert_eisenhower_tasks", ["c", ["c"]])
+    j.close()
+    assert [e["key"] for e in Journal(str(path)).pending()] == [second["key"], third["key"]]
+
+
+def test_queued_close_survives_a_crash(tmp_path, sqlite):
+    path = str(tmp_path / "lcy3-1.jsonl")
+    storage = JournaledStorage(sqlite, Journal(path))
+    storage.close_daily_task(2, True, False, "", f"{SHIFT} 09:00:00")
+    assert not sqlite.daily_tasks("m@example.com", SHIFT, ROLE).loc[2, "done"]
+    storage.journal.close()
+
+    restarted = JournaledStorage(sqlite, Journal(path))
+    # Shown before it is flushed, then written once
+    assert restarted.daily_tasks("m@example.com", SHIFT, ROLE).loc[2, "done"]
+    assert restarted.flush() == 1
+    assert restarted.flush() == 0
+    df = sqlite.daily_tasks("m@example.com", SHIFT, ROLE)
+    assert df.loc[2, "done"] and df.loc[2, "locked"]
+    restarted.journal.close()
+    assert Journal(path).pending() == []
+
+
+def test_ack_compacts_a_fully_flushed_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "COMPACT_BYTES", 300)
+    path = tmp_path / "lcy3-1.jsonl"
+    j = Journal(str(path))
+    entries = [j.append("upsert_eisenhower_tasks", [f"u{i}", ["x" * 40]]) for i in range(4)]
+    j.ack([entries[0]["key"]])
+    # Still holding unflushed entries, so it keeps growing
+    assert len(lines(path)) == 5
+    j.ack([e["key"] for e in entries[1:]])
+    assert path.read_text() == ""
+    after = j.append("upsert_eisenhower_tasks", ["v", ["v"]])
+    assert [json.loads(line)["key"] for line in lines(path)] == [after["key"]]
+
+
+def test_ack_keeps_a_small_journal(tmp_path):
+    path = tmp_path / "lcy3-1.jsonl"
+    j = Journal(str(path))
+    entry = j.append("upsert_eisenhower_tasks", ["u", ["u"]])
+    j.ack([entry["key"]])
+    j.ack([entry["key"]])
+    assert len(lines(path)) == 2
+    j.close()
+    assert Journal(str(path)).pending() == []
+
+
+def test_journal_dir_does_not_depend_on_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(journal.JOURNAL_DIR_ENV, "journals")
+    assert journal.journal_dir() == str(journal.ROOT_DIR) + "/journals"
+    monkeypatch.setenv(journal.JOURNAL_DIR_ENV, str(tmp_path / "elsewhere"))
+    assert journal.journal_dir() == str(tmp_path / "elsewhere")
+    monkeypatch.setenv(journal.JOURNAL_DIR_ENV, "")
+    assert journal.journal_dir() == ""
+
+
+def test_adopts_only_journals_of_exited_processes(tmp_path, monkeypatch, sqlite):
+    directory = tmp_path / "journal"
+    monkeypatch.setenv(journal.JOURNAL_DIR_ENV, str(directory))
+    live = Journal(str(directory / "lcy3-100-live.jsonl"))
+    live.append("close_daily_tasks", [[[2, True, False, "", f"{SHIFT} 08:00:00"]]])
+    # Written by a process that has exited, so nothing holds its lock
+    dead = Journal(str(directory / "lcy3-200-dead.jsonl"))
+    entry = dead.append("close_daily_tasks", [[[1, False, True, "no scanner", f"{SHIFT} 09:00:00"]]])
+    dead.close()
+    other_site = Journal(str(directory / "man1-300-dead.jsonl"))
+    other_site.append("upsert_eisenhower_tasks", ["u", ["u"]])
+    other_site.close()
+
+    storage = journaled(sqlite)
+    assert not (directory / "lcy3-200-dead.jsonl").exists()
+    assert (directory / "lcy3-100-live.jsonl").exists()
+    assert (directory / "man1-300-dead.jsonl").exists()
+    assert [e["key"] for e in storage.journal.pending()] == [entry["key"]]
+    # The same entries adopted again are not queued twice
+    assert storage.journal.adopt([entry]) == 0
+
+    assert storage.flush() == 1
+    df = sqlite.daily_tasks("m@example.com", SHIFT, ROLE)
+    assert df.loc[1, "exempt reason"] == "no scanner"
+    assert not df.loc[2, "done"]
+
+
+@pytest.fixture
+def sheets(fake_sheets):
+    storage, book, _ = fake_sheets
+    storage.add_daily_tasks([daily_task(f"Live {i}") for i in range(3)])
+    return storage, book._sheets["user-daily-task"]
+
+
+def test_flush_finds_rows_that_moved_and_drops_deleted_ones(tmp_path, sheets):
+    inner, worksheet = sheets
+    storage = JournaledStorage(inner, Journal(str(tmp_path / "lcy3-1.jsonl")))
+    ids = storage.daily_tasks("m@example.com", SHIFT, ROLE).index.tolist()
+    storage.close_daily_task(ids[1], True, False, "", f"{SHIFT} 09:00:00")
+    storage.close_daily_task(ids[2], False, True, "no scanner", f"{SHIFT} 09:05:00")
+
+    # Before the flush another process archives the rows above them and deletes the last one
+    del worksheet.rows[ids[2] - 1]
+    del worksheet.rows[1:3]
+
+    assert storage.flush() == 2
+    stats = storage.stats()["journal"]
+    assert (stats["moved"], stats["dropped"], stats["pending"]) == (1, 1, 0)
+    closed = {row[5]: row for row in worksheet.rows[1:] if row[0] == "m@example.com"}
+    assert set(closed) == {"Live 0", "Live 1"}
+    assert str(closed["Live 1"][6]).upper() == "TRUE"
+    assert str(closed["Live 0"][6]).upper() != "TRUE"
+
+
+def test_flush_writes_closes_journaled_without_row_keys(tmp_path, sheets):
+    inner, worksheet = sheets
+    ids = inner.daily_tasks("m@example.com", SHIFT, ROLE).index.tolist()
+    path = tmp_path / "lcy3-1.jsonl"
+    # One entry from before row keys were recorded, one with a key for only one of its rows
+    j = Journal(str(path))
+    j.append("close_daily_tasks", [[[ids[0], True, False, "", f"{SHIFT} 09:00:00"]]])
+    j.append(
+        "close_daily_tasks",
+        [[[ids[1], False, True, "no scanner", f"{SHIFT} 09:05:00"], [ids[2], True, False, "", f"{SHIFT} 09:10:00"]]],
+        rows=[[], ["m@example.com", SHIFT, ROLE, "Live 2"]],
+    )
+    storage = JournaledStorage(inner, j)
+
+    assert storage.flush() == 2
+    stats = storage.stats()["journal"]
+    assert (stats["dropped"], stats["dropped_saves"], stats["pending"]) == (0, [], 0)
+    closed = {row[5]: row for row in worksheet.rows[1:] if row[0] == "m@example.com"}
+    assert [str(closed[f"Live {i}"][6]).upper() for i in range(3)] == ["TRUE", "FALSE", "TRUE"]
+    assert closed["Live 1"][8] == "no scanner"
+
+
+def test_flush_reports_saves_whose_task_is_gone(tmp_path, sheets):
+    inner, worksheet = sheets
+    storage = JournaledStorage(inner, Journal(str(tmp_path / "lcy3-1.jsonl")))
+    ids = storage.daily_tasks("m@example.com", SHIFT, ROLE).index.tolist()
+    storage.close_daily_task(ids[2], True, False, "", f"{SHIFT} 09:00:00")
+    del worksheet.rows[ids[2] - 1]
+
+    assert storage.flush() == 1
+    stats = storage.stats()["journal"]
+    assert stats["dropped"] == 1
+    assert stats["dropped_saves"] == [{
+        "row": ids[2], "task": ["m@example.com", SHIFT, ROLE, "Live 2"], "done": True,
+        "exempt": False, "closed at": f"{SHIFT} 09:00:00",
+    }]
+
+
+def test_queued_close_stays_on_its_task_when_rows_shift(tmp_path, sheets):
+    inner, worksheet = sheets
+    storage = JournaledStorage(inner, Journal(str(tmp_path / "lcy3-1.jsonl")))
+    df = storage.daily_tasks("m@example.com", SHIFT, ROLE)
+    storage.close_daily_task(df.index[2], True, False, "", f"{SHIFT} 09:00:00")
+
+    # Another manager's role change deletes rows above before the save is flushed
+    above = get_daily_task_index(inner.spreadsheet_name).frame()
+    above = above[above["Email"] != "m@example.com"].head(2)
+    assert storage.delete_daily_tasks(list(above.index), schema.row_keys(above)) == 2
+
+    df = storage.daily_tasks("m@example.com", SHIFT, ROLE)
+    assert df.set_index("task")["done"].to_dict() == {"Live 0": False, "Live 1": False, "Live 2": True}
+    assert storage.flush() == 1
+    assert inner.daily_tasks("m@example.com", SHIFT, ROLE).set_index("task")["done"].to_dict()["Live 2"]
@@ -0,0 +1,45 @@
+from datetime import date
+
+from dailytask.materialize import materialize, usual_roles
+from dailytask.storage.sqlite import SQLiteStorage
+
+
+class Templates:
+    def rows_for(self, role, email, name, shift_date, role_name):
+        return [[email, name, str(shift_date), "", role_name, f"{role} task", False, False, "", False, False, "8.00AM"]]
+
+
+def daily_task(email, shift, role):
+    return [email, "M", shift, "", role, "t", False, False, "", False, False, "8.00AM"]
+
+
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "dailytask.db"))
+    for email in ("a@example.com", "b@example.com", "c@example.com"):
+        storage.add_user(email, "user", "active")
+    storage.add_daily_tasks([
+        daily_task("a@example.com", "2030-01-08", "OM-IB-DS"),
+        daily_task("a@example.com", "2030-01-09", "OM-IB-DS"),
+        # Covered a different role last shift
+        daily_task("b@example.com", "2030-01-08", "OM-IB-DS"),
+        daily_task("b@example.com", "2030-01-09", "AM-OB-NS"),
+        daily_task("c@example.com", "2030-01-09", "OM-OB-DS"),
+        daily_task("c@example.com", "2030-01-10", "OM-OB-DS"),
+    ])
+    return storage
+
+
+def test_usual_roles_need_the_streak(tmp_path):
+    history = storage(tmp_path).daily_task_history()
+    assert usual_roles(history, min_streak=2) == {"a@example.com": "OM-IB-DS", "c@example.com": "OM-OB-DS"}
+    assert usual_roles(history, min_streak=1)["b@example.com"] == "AM-OB-NS"
+
+
+def test_creates_rows_for_the_given_shift_date_once(tmp_path):
+    s = storage(tmp_path)
+    summary = materialize(s, Templates(), shift_date=date(2030, 1, 10))
+    assert summary["created"] == ["a@example.com OM-IB-DS 2030-01-10"]
+    assert summary["already"] == ["c@example.com"]
+    assert summary["no_usual_role"] == ["b@example.com"]
+    assert s.role_for_day("a@example.com", date(2030, 1, 10)) == "OM-IB-DS"
+    assert materialize(s, Templates(), shift_date=date(2030, 1, 10))["rows"] == 0
@@ -0,0 +1,147 @@
+import time
+
+import pytest
+from gspread.exceptions import APIError
+from requests.exceptions import ConnectionError
+
+from dailytask import quota
+from dailytask.quota import RequestScheduler, TokenBucket, background, is_idempotent
+
+
+class Response:
+    def __init__(self, code):
+        self.status_code = code
+        self.text = f"HTTP {code}"
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self.text, "status": ""}}
+
+
+def failing(*errors, result="ok"):
+    # Raises each error in turn, then returns `result`
+    errors = list(errors)
+    calls = []
+
+    def fn(*args, **kwargs):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    fn.calls = calls
+    return fn
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(quota.time, "sleep", slept.append)
+    return slept
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RequestScheduler(reads_per_minute=6000, writes_per_minute=6000, max_retries=3)
+    scheduler._random.seed(0)
+    return scheduler
+
+
+def test_bucket_paces_once_empty():
+    bucket = TokenBucket(1200)   # 20 a second
+    assert bucket.acquire() < 0.01
+    bucket.tokens = 0.0
+    assert bucket.acquire() >= 0.04
+    assert bucket.stats()["used_last_minute"] == 2
+    bucket.penalize()
+    assert bucket.stats()["available"] < 1
+
+
+def test_background_calls_leave_the_reserve_to_interactive_ones():
+    bucket = TokenBucket(1200, reserve=0.2)
+    bucket.tokens = bucket.reserve + 0.5
+    assert bucket.acquire(interactive=True) < 0.01
+    # Below the reserve now: a background caller waits for the bucket to refill past it
+    start = time.monotonic()
+    bucket.acquire(interactive=False)
+    assert time.monotonic() - start >= 0.05
+
+
+def test_429_is_retried_with_growing_backoff(scheduler, sleeps, monkeypatch):
+    penalized = []
+    monkeypatch.setattr(scheduler.buckets["read"], "penalize", lambda: penalized.append(1))
+    fn = failing(APIError(Response(429)), APIError(Response(429)))
+    assert scheduler.call("get_all_values", fn) == "ok"
+    assert len(fn.calls) == 3
+    assert len(sleeps) == 2
+    for attempt, delay in enumerate(sleeps):
+        assert 0 <= delay <= quota.BACKOFF_BASE * 2 ** attempt
+    stats = scheduler.stats()
+    assert (stats["requests"], stats["retries"], stats["failures"]) == (3, 2, 0)
+    # Everyone slows down after a 429, not just this caller
+    assert len(penalized) == 2
+
+
+def test_gives_up_after_max_retries(scheduler, sleeps):
+    fn = failing(*[APIError(Response(429)) for _ in range(5)])
+    with pytest.raises(APIError):
+        scheduler.call("update", fn)
+    assert len(fn.calls) == 4
+    assert scheduler.stats()["failures"] == 1
+
+
+@pytest.mark.parametrize("error", [APIError(Response(503)), ConnectionError()], ids=["5xx", "dropped"])
+def test_5xx_is_retried_only_when_repeating_is_safe(scheduler, sleeps, error):
+    fn = failing(error)
+    assert scheduler.call("update", fn) == "ok"
+    fn = failing(error)
+    with pytest.raises(type(error)):
+        scheduler.call("append_rows", fn, [["row"]])
+    assert len(fn.calls) == 1
+
+
+def test_other_errors_are_not_retried(scheduler, sleeps):
+    fn = failing(APIError(Response(400)))
+    with pytest.raises(APIError):
+        scheduler.call("get_all_values", fn)
+    assert len(fn.calls) == 1 and sleeps == []
+
+
+STRUCTURAL = {"requests": [{"deleteDimension": {"range": {"sheetId": 1, "dimension": "ROWS", "startIndex": 1, "endIndex": 2}}}]}
+FORMAT = {"requests": [{"repeatCell": {"range": {"sheetId": 1}, "fields": "userEnteredFormat"}}]}
+
+
+def test_structural_batch_update_is_retried_only_on_429(scheduler, sleeps):
+    fn = failing(APIError(Response(429)))
+    assert scheduler.call("batch_update", fn, STRUCTURAL) == "ok"
+    assert len(fn.calls) == 2
+
+    fn = failing(APIError(Response(503)))
+    with pytest.raises(APIError):
+        scheduler.call("batch_update", fn, STRUCTURAL)
+    assert len(fn.calls) == 1
+
+
+@pytest.mark.parametrize(
+    "method, args, kwargs, expected",
+    [
+        ("get_all_values", (), {}, True),
+        ("update", ("A1", [["x"]]), {}, True),
+        ("append_rows", ([["x"]],), {}, False),
+        ("delete_rows", (2,), {}, False),
+        ("batch_update", ([{"range": "A1", "values": [["x"]]}],), {}, True),
+        ("batch_update", (FORMAT,), {}, True),
+        ("batch_update", (STRUCTURAL,), {}, False),
+        ("batch_update", (), {"body": STRUCTURAL}, False),
+    ],
+)
+def test_is_idempotent(method, args, kwargs, expected):
+    assert is_idempotent(method, args, kwargs) is expected
+
+
+def test_background_flag_is_per_block():
+    with background():
+        assert quota._local.background
+        with background():
+            pass
+        assert quota._local.background
+    assert not quota._local.background
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from dailytask.sessions import SessionSigner, fingerprint, still_valid
+
+HASH = "$2b$04$abcdefghijklmnopqrstuuJ0Qm4kGZ6t0w5k8QmVn8bW9o1yZbq1W"
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def signer():
+    return SessionSigner("test-secret")
+
+
+def users(**row):
+    user = {"Email": "a@example.com", "Password": HASH, "Role": "user", "Status": "active"}
+    user.update(row)
+    return pd.DataFrame([user])
+
+
+def issue(signer, lifetime=600):
+    return signer.issue("a@example.com", "user", fingerprint(HASH), lifetime, now=NOW)
+
+
+def test_round_trip(signer):
+    claims = signer.claims(issue(signer), "user", now=NOW + 1)
+    assert claims["email"] == "a@example.com"
+    assert claims["exp"] == NOW + 600
+
+
+def test_tampered_token_is_rejected(signer):
+    body, signature = issue(signer).split(".")
+    assert signer.claims(f"{body}.{signature[:-1]}A", "user", now=NOW) is None
+    other = SessionSigner("other-secret").issue("a@example.com", "user", fingerprint(HASH), now=NOW)
+    assert signer.claims(other, "user", now=NOW) is None
+    assert signer.claims("not-a-token", "user", now=NOW) is None
+    assert signer.claims(None, "user", now=NOW) is None
+
+
+def test_token_is_only_valid_for_its_app(signer):
+    assert signer.claims(issue(signer), "admin", now=NOW) is None
+
+
+def test_token_expires(signer):
+    token = issue(signer, lifetime=60)
+    assert signer.claims(token, "user", now=NOW + 60) is not None
+    assert signer.claims(token, "user", now=NOW + 61) is None
+
+
+def test_valid_while_user_is_unchanged(signer):
+    assert still_valid(signer.claims(issue(signer), "user", now=NOW), users(Email="A@Example.com"))
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"Status": "inactive"},
+        {"Role": "admin"},
+        {"Password": ""},
+        {"Password": HASH.replace("abc", "xyz")},
+        {"Email": "b@example.com"},
+    ],
+)
+def test_users_sheet_change_revokes(signer, change):
+    claims = signer.claims(issue(signer), "user", now=NOW)
+    assert not still_valid(claims, users(**change))
@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+
+from dailytask.storage.base import TemplateConflict, template_rows, template_version
+from dailytask.storage.sqlite import SQLiteStorage
+from dailytask.templates import diff_template
+
+ROLE = "OM-IB-DS"
+TASKS = [["Check docks", "8.00AM"], ["Walk the floor", "10.00AM"], ["Handover", "5.00PM"]]
+
+
+def frame(rows, index=None):
+    return pd.DataFrame(rows, columns=["task", "time"], index=index)
+
+
+def test_diff_template_counts_each_kind_of_edit():
+    original = frame(TASKS)
+    # The editor keeps the index: row 1 deleted, row 2 changed, one row added under a new label
+    edited = frame([TASKS[0], ["Handover", "6.00PM"], ["Close out", "7.00PM"]], index=[0, 2, 3])
+    edit = diff_template(original, edited)
+    assert (edit.inserted, edit.deleted, edit.modified) == (1, 1, 1)
+    assert edit.rows == [TASKS[0], ["Handover", "6.00PM"], ["Close out", "7.00PM"]]
+
+
+def test_diff_template_treats_blanked_rows_as_deleted():
+    edited = frame([TASKS[0], ["", ""], TASKS[2], [None, None]], index=[0, 1, 2, 3])
+    edit = diff_template(frame(TASKS), edited)
+    assert (edit.inserted, edit.deleted, edit.modified) == (0, 1, 0)
+    assert edit.rows == [TASKS[0], TASKS[2]]
+
+
+def test_unchanged_template_is_no_edit():
+    edit = diff_template(frame(TASKS), frame(TASKS))
+    assert (edit.inserted, edit.deleted, edit.modified) == (0, 0, 0)
+
+
+@pytest.fixture
+def sqlite(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "dailytask.db"))
+    storage.load_role_template(ROLE, [{"task": task, "time": due} for task, due in TASKS])
+    return storage
+
+
+@pytest.fixture
+def sheets(fake_sheets):
+    storage, book, _ = fake_sheets
+    worksheet = book._sheets[ROLE]
+    worksheet.rows = [["task", "time"]] + [list(row) for row in TASKS]
+    return storage
+
+
+@pytest.fixture(params=["sqlite", "sheets"])
+def storage(request):
+    return request.getfixturevalue(request.param)
+
+
+def fetched_version(storage):
+    return template_version(template_rows(storage.role_template(ROLE)))
+
+
+def test_save_checks_the_fetched_version(storage):
+    version = fetched_version(storage)
+    rows = [TASKS[0], ["Handover", "6.00PM"]]
+    new_version = storage.save_role_template(ROLE, rows, version)
+    assert template_rows(storage.role_template(ROLE)) == rows
+    assert new_version == fetched_version(storage) != version
+
+    # Saved again from the editor that still holds the old version
+    with pytest.raises(TemplateConflict):
+        storage.save_role_template(ROLE, TASKS, version)
+    assert template_rows(storage.role_template(ROLE)) == rows
+
+
+def test_save_refuses_a_template_changed_since_it_was_fetched(storage):
+    version = fetched_version(storage)
+    # Another admin saves first
+    storage.save_role_template(ROLE, TASKS + [["Close out", "7.00PM"]], version)
+
+    with pytest.raises(TemplateConflict):
+        storage.save_role_template(ROLE, TASKS[:1], version)
+    assert len(template_rows(storage.role_template(ROLE))) == 4
+
+
+def test_sheets_save_checks_the_sheet_not_the_cache(fake_sheets, sheets):
+    version = fetched_version(sheets)
+    # Edited straight in the spreadsheet; the cached frame still has the old row
+    fake_sheets[1]._sheets[ROLE].rows[1][1] = "9.00AM"
+
+    with pytest.raises(TemplateConflict):
+        sheets.save_role_template(ROLE, TASKS[:1], version)
+    # The refused save dropped the stale copy, so a fetch now shows the edit
+    assert template_rows(sheets.role_template(ROLE))[0] == ["Check docks", "9.00AM"]